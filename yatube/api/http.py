@@ -0,0 +1,184 @@
+"""Общая обвязка view API: JSON, аутентификация и ошибки."""
+import base64
+import binascii
+import json
+import math
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, QueryDict
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.views.decorators.csrf import csrf_exempt
+
+from core import ratelimit
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.extra = extra
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, encoder=DjangoJSONEncoder, safe=False,
+        json_dumps_params={'ensure_ascii': False},
+    )
+
+
+def error_response(status, message, **extra):
+    return json_response({'detail': message, **extra}, status=status)
+
+
+def throttle(request, scope):
+    """Взять токен области ``scope`` (core/ratelimit.py) или ответить 429."""
+    wait = ratelimit.check(request, scope)
+    if wait:
+        raise ApiError(
+            429, 'Слишком много запросов.', retry_after=math.ceil(wait))
+
+
+def _credentials_key(credentials):
+    # В кеше только HMAC заголовка: сам пароль туда не попадает.
+    return 'api:basic:' + salted_hmac('api.basic', credentials).hexdigest()
+
+
+def _remembered_user(key):
+    """Пользователь, чей пароль из заголовка недавно проверен."""
+    remembered = cache.get(key)
+    if remembered is None:
+        return None
+    user_id, auth_hash = remembered
+    user = get_user_model().objects.filter(pk=user_id).first()
+    # Хеш сессии меняется вместе с паролем, как и у входа на сайт.
+    if user is None or not user.is_active or not constant_time_compare(
+            user.get_session_auth_hash(), auth_hash):
+        return None
+    return user
+
+
+def _basic_auth(request):
+    """Пользователь из заголовка ``Authorization: Basic``; иначе ``None``.
+
+    Проверка пароля (PBKDF2) дорогая, поэтому удачная проверка помнится
+    ``API_BASIC_AUTH_CACHE_TIMEOUT`` секунд.
+    """
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, credentials = header.partition(' ')
+    if scheme.lower() != 'basic':
+        return None
+    key = _credentials_key(credentials)
+    user = _remembered_user(key)
+    if user is not None:
+        return user
+    try:
+        decoded = base64.b64decode(credentials).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ApiError(401, 'Неверный заголовок Authorization.')
+    username, _, password = decoded.partition(':')
+    user = authenticate(request, username=username, password=password)
+    if user is None:
+        raise ApiError(401, 'Неверное имя пользователя или пароль.')
+    cache.set(
+        key, (user.pk, user.get_session_auth_hash()),
+        settings.API_BASIC_AUTH_CACHE_TIMEOUT)
+    return user
+
+
+def _authenticate(request):
+    user = _basic_auth(request)
+    if user is not None:
+        # Клиент с Basic-аутентификацией не опирается на cookie, поэтому
+        # CSRF ему не грозит.
+        request.user = user
+        return
+    if request.user.is_authenticated and request.method not in SAFE_METHODS:
+        # Сессия — это cookie: изменяющие запросы проверяются на CSRF,
+        # как формы сайта.
+        rejected = CsrfViewMiddleware().process_view(request, None, (), {})
+        if rejected is not None:
+            raise ApiError(403, 'Ошибка проверки CSRF.')
+
+
+def _parse_body(request):
+    """Данные запроса: JSON-тело или обычная форма (для картинок)."""
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            raise ApiError(400, 'Тело запроса — не JSON.')
+        if not isinstance(payload, dict):
+            raise ApiError(400, 'Ожидается JSON-объект.')
+        data = QueryDict(mutable=True)
+        for key, value in payload.items():
+            data[key] = '' if value is None else value
+        return data, {}
+    if request.method == 'POST':
+        return request.POST, request.FILES
+    # Django разбирает multipart только для POST.
+    if request.content_type == 'multipart/form-data':
+        return request.parse_file_upload(request.META, request)
+    return QueryDict(request.body, encoding=request.encoding), {}
+
+
+def _prepare(request, login_required):
+    """Проверить вход и разобрать тело в ``request.data``/``files``."""
+    _authenticate(request)
+    if login_required or request.method not in SAFE_METHODS:
+        if not request.user.is_authenticated:
+            raise ApiError(401, 'Требуется вход.')
+    request.data, request.files = (
+        _parse_body(request)
+        if request.method not in SAFE_METHODS
+        else (QueryDict(), {})
+    )
+
+
+def _api_error_response(error, methods):
+    response = error_response(error.status, error.message, **error.extra)
+    if error.status == 405:
+        response['Allow'] = ', '.join(methods)
+    if error.status == 401:
+        response['WWW-Authenticate'] = 'Basic realm="api"'
+    if error.status == 429:
+        response['Retry-After'] = str(error.extra['retry_after'])
+    return response
+
+
+def api_view(*methods, login_required=False, upload_handlers=()):
+    """Декоратор view API: допустимые методы, вход, разбор тела, ошибки.
+
+    View получает данные запроса в ``request.data`` и ``request.files``
+    и может вернуть ``dict``/``list`` или ``HttpResponse``. Файлы
+    принимают классы ``upload_handlers``, если они заданы.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if upload_handlers:
+                # До проверки CSRF: она первой читает тело запроса.
+                request.upload_handlers = [
+                    handler(request) for handler in upload_handlers]
+            try:
+                if request.method not in methods:
+                    raise ApiError(405, 'Метод не поддерживается.')
+                _prepare(request, login_required)
+                result = view(request, *args, **kwargs)
+            except ApiError as error:
+                return _api_error_response(error, methods)
+            except Http404:
+                return error_response(404, 'Не найдено.')
+            if isinstance(result, (dict, list)):
+                return json_response(result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,81 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность JSON API и HTML-страниц на '
+        'одних и тех же данных. Тестовые посты создаются внутри '
+        'транзакции, которая в конце откатывается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument('--requests', type=int, default=300)
+        parser.add_argument(
+            '--no-cache', action='store_true',
+            help='Очищать кеш перед каждым запросом (без кеша фрагментов).')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            group, post = self.seed(options['posts'])
+            self.run(group, post, options['requests'], options['no_cache'])
+            transaction.set_rollback(True)
+
+    def seed(self, total):
+        author, _ = User.objects.get_or_create(username='bench_api')
+        group, _ = Group.objects.get_or_create(
+            slug='bench-api', defaults={'title': 'bench_api'})
+        missing = total - Post.objects.count()
+        if missing > 0:
+            self.stdout.write(f'Создаём {missing} постов...')
+            Post.objects.bulk_create(
+                Post(author=author, group=group, text=f'Пост {i}')
+                for i in range(missing)
+            )
+        return group, Post.objects.filter(group=group).first()
+
+    def measure(self, client, url, requests, no_cache):
+        sizes = 0
+        start = time.perf_counter()
+        for _ in range(requests):
+            if no_cache:
+                cache.clear()
+            response = client.get(url)
+            sizes += len(response.content)
+        elapsed = time.perf_counter() - start
+        return requests / elapsed, sizes / requests
+
+    def run(self, group, post, requests, no_cache):
+        pairs = (
+            ('лента', reverse('posts:index'),
+             reverse('api:posts') + '?limit=10'),
+            ('группа', reverse('posts:group_list', args=[group.slug]),
+             reverse('api:posts') + f'?limit=10&group={group.slug}'),
+            ('пост', reverse('posts:post_detail', args=[post.pk]),
+             reverse('api:post_detail', args=[post.pk])),
+        )
+        client = Client()
+        self.stdout.write(
+            f'{"страница":<10}{"HTML, зап/с":>14}{"байт":>9}'
+            f'{"API, зап/с":>14}{"байт":>9}'
+        )
+        for name, html_url, api_url in pairs:
+            html_rate, html_size = self.measure(
+                client, html_url, requests, no_cache)
+            api_rate, api_size = self.measure(
+                client, api_url, requests, no_cache)
+            self.stdout.write(
+                f'{name:<10}{html_rate:>14.0f}{html_size:>9.0f}'
+                f'{api_rate:>14.0f}{api_size:>9.0f}'
+            )
@@ -0,0 +1,91 @@
+"""Сериализация через ``values()``.
+
+Ресурс описывается словарём «поле ответа → путь в ``values()``».
+Запрос выбирает только нужные столбцы (с учётом ``?fields=``) и
+отдаёт словари, без создания экземпляров моделей.
+"""
+from django.core.files.storage import default_storage
+
+from .http import ApiError
+
+
+def _image_url(name):
+    return default_storage.url(name) if name else None
+
+
+class Resource:
+    def __init__(self, fields, always=(), converters=None):
+        self.fields = fields
+        # Столбцы, без которых не построить курсор пагинации.
+        self.always = always
+        self.converters = converters or {}
+
+    def parse_fields(self, request):
+        """Поля ответа из ``?fields=a,b``; без параметра — все поля."""
+        requested = request.GET.get('fields')
+        if not requested:
+            return list(self.fields)
+        names = [name.strip() for name in requested.split(',') if name]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(
+                400, 'Неизвестные поля.', unknown=unknown,
+                allowed=list(self.fields))
+        return names
+
+    def values(self, queryset, names):
+        paths = {self.fields[name] for name in names} | set(self.always)
+        return queryset.values(*paths)
+
+    def serialize(self, row, names):
+        item = {}
+        for name in names:
+            value = row[self.fields[name]]
+            convert = self.converters.get(name)
+            item[name] = convert(value) if convert else value
+        return item
+
+
+POST = Resource(
+    fields={
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'updated': 'updated',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+        'comments_count': 'comments_count',
+    },
+    always=('pub_date', 'id'),
+    converters={'image': _image_url},
+)
+
+GROUP = Resource(
+    fields={
+        'id': 'id',
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+    },
+    always=('id',),
+)
+
+COMMENT = Resource(
+    fields={
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    },
+    always=('created', 'id'),
+)
+
+FOLLOW = Resource(
+    fields={
+        'id': 'id',
+        'author': 'author__username',
+    },
+    always=('id',),
+)
@@ -0,0 +1,208 @@
+import base64
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from api import http
+from posts import comment_queue
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def basic_auth(username, password):
+    token = base64.b64encode(f'{username}:{password}'.encode()).decode()
+    return {'HTTP_AUTHORIZATION': f'Basic {token}'}
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', password='secret')
+        cls.reader = User.objects.create_user(
+            username='reader', password='secret')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group)
+            for i in range(5)
+        ]
+
+    def setUp(self):
+        self.auth = basic_auth('author', 'secret')
+
+    def post_json(self, url, data, method='post', **extra):
+        return getattr(self.client, method)(
+            url, json.dumps(data), content_type='application/json',
+            **{**self.auth, **extra})
+
+    def test_posts_cursor_pagination(self):
+        url = reverse('api:posts')
+        seen = []
+        response = self.client.get(url, {'limit': 2})
+        while True:
+            data = response.json()
+            seen += [item['id'] for item in data['results']]
+            if not data['next']:
+                break
+            response = self.client.get(data['next'])
+        self.assertEqual(
+            seen, [post.pk for post in reversed(self.posts)])
+
+    def test_sparse_fields(self):
+        response = self.client.get(
+            reverse('api:posts'), {'fields': 'id,author'})
+        self.assertEqual(
+            response.json()['results'][0],
+            {'id': self.posts[-1].pk, 'author': 'author'})
+        response = self.client.get(reverse('api:posts'), {'fields': 'nope'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_uses_values_queries(self):
+        """Список постов — один запрос без создания моделей."""
+        with self.assertNumQueries(1):
+            self.client.get(reverse('api:posts'))
+
+    def test_create_post_uses_form_validation(self):
+        response = self.post_json(reverse('api:posts'), {'text': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+        response = self.post_json(
+            reverse('api:posts'),
+            {'text': 'Новый пост', 'group': self.group.pk})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['group'], 'group')
+        self.assertTrue(
+            Post.objects.filter(text='Новый пост', author=self.author)
+            .exists())
+
+    def test_anonymous_cannot_write(self):
+        response = self.client.post(
+            reverse('api:posts'), json.dumps({'text': 'пост'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_only_author_edits_post(self):
+        post = self.posts[0]
+        url = reverse('api:post_detail', kwargs={'post_id': post.pk})
+        response = self.post_json(
+            url, {'text': 'Чужой'}, 'patch',
+            **basic_auth('reader', 'secret'))
+        self.assertEqual(response.status_code, 403)
+
+        response = self.post_json(url, {'text': 'Исправлен'}, 'patch')
+        self.assertEqual(response.status_code, 200)
+        post.refresh_from_db()
+        self.assertEqual(post.text, 'Исправлен')
+        self.assertEqual(post.group, self.group)
+
+        response = self.client.delete(url, **self.auth)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+
+    def test_comments(self):
+        post = self.posts[0]
+        url = reverse('api:comments', kwargs={'post_id': post.pk})
+        response = self.post_json(url, {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Comment.objects.get().author, self.author)
+        response = self.client.get(url)
+        self.assertEqual(
+            [item['text'] for item in response.json()['results']],
+            ['Комментарий'])
+
+    def test_follows(self):
+        auth = basic_auth('reader', 'secret')
+        response = self.post_json(
+            reverse('api:follows'), {'author': 'author'}, **auth)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists())
+        response = self.post_json(
+            reverse('api:follows'), {'author': 'reader'}, **auth)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.delete(
+            reverse('api:follow_detail', kwargs={'username': 'author'}),
+            **auth)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Follow.objects.exists())
+
+    @override_settings(RATE_LIMITS_ENABLED=True, RATE_LIMITS={
+        'comment': {'user': (60, 1), 'ip': (60, 10)},
+        'follow': {'user': (60, 1), 'ip': (60, 10)},
+    })
+    def test_writes_are_rate_limited(self):
+        """API делит вёдра с сайтом: обойти лимиты через него нельзя."""
+        cache.clear()
+        url = reverse('api:comments', kwargs={'post_id': self.posts[0].pk})
+        self.assertEqual(
+            self.post_json(url, {'text': 'Первый'}).status_code, 201)
+        response = self.post_json(url, {'text': 'Второй'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Comment.objects.count(), 1)
+
+        auth = basic_auth('reader', 'secret')
+        self.post_json(reverse('api:follows'), {'author': 'author'}, **auth)
+        response = self.client.delete(
+            reverse('api:follow_detail', kwargs={'username': 'author'}),
+            **auth)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(Follow.objects.exists())
+
+    @override_settings(
+        COMMENT_WRITE_BEHIND=True, COMMENT_FLUSH_SECONDS=0,
+        COMMENT_FLUSH_SIZE=100)
+    def test_comment_write_behind(self):
+        """При отложенной записи комментарий встаёт в очередь."""
+        cache.clear()
+        post = self.posts[0]
+        response = self.post_json(
+            reverse('api:comments', kwargs={'post_id': post.pk}),
+            {'text': 'В очереди'})
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.json()['pending'])
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(Comment.objects.get().text, 'В очереди')
+
+    def test_session_writes_require_csrf(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.author)
+        response = client.post(
+            reverse('api:posts'), json.dumps({'text': 'пост'}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_basic_auth_is_remembered(self):
+        """Пароль проверяется один раз; смена пароля сбрасывает проверку."""
+        cache.clear()
+        url = reverse('api:follows')
+        with mock.patch.object(
+                http, 'authenticate', wraps=http.authenticate) as check:
+            for _ in range(3):
+                response = self.client.get(url, **self.auth)
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(check.call_count, 1)
+
+        author = User.objects.get(pk=self.author.pk)
+        author.set_password('changed')
+        author.save()
+        response = self.client.get(url, **self.auth)
+        self.assertEqual(response.status_code, 401)
+
+    def test_groups(self):
+        response = self.client.get(
+            reverse('api:group_detail', kwargs={'slug': 'group'}))
+        self.assertEqual(response.json()['title'], 'Группа')
+        response = self.client.get(
+            reverse('api:group_detail', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, 404)
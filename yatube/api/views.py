@@ -0,0 +1,188 @@
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+
+from core.paginator import CursorPaginator, InvalidCursor
+from posts import comment_queue
+from posts.forms import CommentForm, PostForm
+from posts.models import Comment, Follow, Group, Post, User
+from posts.uploads import ImageUploadHandler
+
+from .http import ApiError, api_view, json_response, throttle
+from .serializers import COMMENT, FOLLOW, GROUP, POST
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом.')
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def _page_link(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri('?' + params.urlencode())
+
+
+def paginate(request, queryset, resource, ordering):
+    """Страница ``queryset`` по курсору из ``?cursor=``."""
+    names = resource.parse_fields(request)
+    paginator = CursorPaginator(
+        resource.values(queryset, names), _page_size(request), ordering)
+    try:
+        page = paginator.page(cursor=request.GET.get('cursor') or None)
+    except InvalidCursor:
+        raise ApiError(400, 'Неверный курсор.')
+    return {
+        'results': [resource.serialize(row, names) for row in page],
+        'next': _page_link(request, page.next_cursor),
+        'previous': _page_link(request, page.previous_cursor),
+    }
+
+
+def detail(request, queryset, resource, status=200):
+    """Первая запись ``queryset``; сохранённая — со статусом ``status``."""
+    names = resource.parse_fields(request)
+    row = resource.values(queryset, names).first()
+    if row is None:
+        raise ApiError(404, 'Не найдено.')
+    return json_response(resource.serialize(row, names), status=status)
+
+
+def invalid(errors):
+    return ApiError(400, 'Ошибка в данных.', errors=errors)
+
+
+def form_errors(form):
+    return invalid(form.errors.get_json_data())
+
+
+@api_view('GET', 'POST', upload_handlers=[ImageUploadHandler])
+def posts(request):
+    if request.method == 'POST':
+        return create_post(request)
+    queryset = Post.objects.all()
+    if request.GET.get('group'):
+        queryset = queryset.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        queryset = queryset.filter(author__username=request.GET['author'])
+    return paginate(request, queryset, POST, ('-pub_date', '-id'))
+
+
+@transaction.atomic
+def create_post(request):
+    throttle(request, 'post')
+    form = PostForm(request.data, request.files or None)
+    if not form.is_valid():
+        raise form_errors(form)
+    form.instance.author = request.user
+    post = form.save()
+    return detail(request, Post.objects.filter(pk=post.pk), POST, 201)
+
+
+@api_view(
+    'GET', 'PUT', 'PATCH', 'DELETE', upload_handlers=[ImageUploadHandler])
+def post_detail(request, post_id):
+    if request.method == 'GET':
+        return detail(request, Post.objects.filter(pk=post_id), POST)
+    post = get_object_or_404(Post, pk=post_id)
+    if post.author_id != request.user.pk:
+        raise ApiError(403, 'Изменять пост может только автор.')
+    if request.method == 'DELETE':
+        post.delete()
+        return HttpResponse(status=204)
+    return update_post(request, post)
+
+
+@transaction.atomic
+def update_post(request, post):
+    throttle(request, 'post')
+    data = request.data.dict()
+    if request.method == 'PATCH':
+        # Частичное обновление: недостающие поля берутся из поста.
+        data = {'text': post.text, 'group': post.group_id or '', **data}
+    form = PostForm(data, request.files or None, instance=post)
+    if not form.is_valid():
+        raise form_errors(form)
+    form.save()
+    return detail(request, Post.objects.filter(pk=post.pk), POST)
+
+
+@api_view('GET')
+def groups(request):
+    return paginate(request, Group.objects.all(), GROUP, ('id',))
+
+
+@api_view('GET')
+def group_detail(request, slug):
+    return detail(request, Group.objects.filter(slug=slug), GROUP)
+
+
+@api_view('GET', 'POST')
+def comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    if request.method == 'POST':
+        return create_comment(request, post)
+    return paginate(
+        request, Comment.objects.filter(post=post), COMMENT, ('created', 'id'))
+
+
+@transaction.atomic
+def create_comment(request, post):
+    throttle(request, 'comment')
+    form = CommentForm(request.data)
+    if not form.is_valid():
+        raise form_errors(form)
+    comment = form.save(commit=False)
+    comment.author = request.user
+    comment.post = post
+    if settings.COMMENT_WRITE_BEHIND:
+        # Комментарий запишет очередь: ``id`` у него ещё нет.
+        comment_queue.enqueue(comment)
+        return json_response({
+            'post': post.pk, 'author': request.user.username,
+            'text': comment.text, 'pending': True,
+        }, status=202)
+    comment.save()
+    return detail(
+        request, Comment.objects.filter(pk=comment.pk), COMMENT, 201)
+
+
+@api_view('GET', 'POST', login_required=True)
+def follows(request):
+    if request.method == 'POST':
+        return create_follow(request)
+    return paginate(
+        request, Follow.objects.filter(user=request.user), FOLLOW, ('-id',))
+
+
+@transaction.atomic
+def create_follow(request):
+    throttle(request, 'follow')
+    author = User.objects.filter(
+        username=request.data.get('author', '')).first()
+    if author is None:
+        raise invalid({'author': [{'message': 'Автор не найден.'}]})
+    if author == request.user:
+        raise invalid({'author': [{'message': 'Нельзя подписаться на себя.'}]})
+    follow, created = Follow.objects.get_or_create(
+        user=request.user, author=author)
+    return detail(
+        request, Follow.objects.filter(pk=follow.pk), FOLLOW,
+        201 if created else 200)
+
+
+@api_view('DELETE', login_required=True)
+def follow_detail(request, username):
+    throttle(request, 'follow')
+    get_object_or_404(
+        Follow, user=request.user, author__username=username).delete()
+    return HttpResponse(status=204)
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .db import check_connections
+        from .templating import install
+        request_started.connect(check_connections)
+        if settings.TEMPLATE_PROFILING:
+            install()
@@ -0,0 +1,25 @@
+"""SQLite с профилем для рабочего сервера (``SQLITE_TUNING``).
+
+От стандартного бэкенда отличается двумя вещами:
+
+* при открытии соединения выполняет ``PRAGMA`` из ключа ``PRAGMAS``
+  настроек базы: WAL, чтобы читатели не ждали писателя, ``mmap``,
+  размер кеша страниц и ожидание занятой базы;
+* транзакции начинает с ``BEGIN IMMEDIATE``. Обычный ``BEGIN``
+  откладывает блокировку до первой записи, и если к этому моменту базу
+  изменил другой писатель, SQLite сразу отвечает «database is locked»,
+  не дожидаясь ``busy_timeout``. С ``IMMEDIATE`` писатели встают в
+  очередь в начале транзакции.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
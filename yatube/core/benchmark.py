@@ -0,0 +1,410 @@
+"""Нагрузочный прогон страниц сайта.
+
+Каждый сценарий — запрос к одному маршруту из ``posts.urls``,
+``users.urls`` и ``about.urls`` (GET или отправка формы), от имени
+гостя или пользователя. Сценарии гоняются двумя способами:
+
+* ``client`` — тестовый клиент Django в том же потоке: только код
+  сайта, без HTTP;
+* ``wsgi`` — настоящий HTTP к локальному WSGI-серверу в соседнем
+  потоке: добавляются разбор запроса, заголовки, CSRF и сериализация.
+
+Клиент принимает сжатые ответы (``Accept-Encoding: gzip, br``), а
+статика собирается во временный ``STATIC_ROOT`` хранилищем с хешами и
+отдаётся core.static, как на боевом сервере.
+
+По каждому сценарию считаются перцентили задержки, число SQL-запросов,
+пик выделенной памяти (tracemalloc), размер тела ответа в байтах
+(после сжатия) и, в режиме ``wsgi``, время до первого байта ответа.
+Итоги сохраняются в JSON как базовая линия; ``compare`` находит
+регрессии относительно неё.
+"""
+import http.client
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from importlib import import_module
+from itertools import count
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.db import connections
+from django.middleware.csrf import _get_new_csrf_token
+from django.templatetags.static import static
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from posts.models import Follow
+from posts.synthetic import BENCH_PASSWORD
+
+NAMESPACES = ('posts', 'users', 'about')
+MODES = ('client', 'wsgi')
+OK_STATUSES = (200, 302)
+ACCEPT_ENCODING = 'gzip, br'
+STATIC_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+
+# Шум измерений: разница меньше этой не считается регрессией, мс.
+NOISE_MS = 1.0
+
+_sequence = count()
+
+
+class Scenario:
+    def __init__(self, name, route, args=None, method='GET', data=None,
+                 login=False, query=None, fresh_session=False,
+                 prepare=None, url=None):
+        self.name = name
+        self.route = route
+        # Адрес не из маршрутов сайта, например файла статики.
+        self.url = url
+        self.args = args or (lambda sample: {})
+        self.method = method
+        self.data = data or (lambda sample: {})
+        self.login = login
+        self.query = query
+        # Запрос завершает сессию (выход): перед каждым — новый вход.
+        self.fresh_session = fresh_session
+        # Подготовка перед каждым запросом, вне замера.
+        self.prepare = prepare
+
+    def path(self, sample):
+        if self.url:
+            return self.url()
+        path = reverse(self.route, kwargs=self.args(sample))
+        if self.query:
+            path += '?' + urlencode(self.query(sample))
+        return path
+
+
+def _group(sample):
+    return {'slug': sample['group'].slug}
+
+
+def _author(sample):
+    return {'username': sample['author'].username}
+
+
+def _post(sample):
+    return {'post_id': sample['post'].pk}
+
+
+def _own_post(sample):
+    return {'post_id': sample['own_post'].pk}
+
+
+def _follow(sample):
+    Follow.objects.get_or_create(user=sample['user'], author=sample['author'])
+
+
+def _text(sample):
+    return {'text': f'Нагрузочный текст {next(_sequence)}'}
+
+
+def _signup(sample):
+    name = f'bench{next(_sequence)}_{time.time_ns()}'
+    return {'username': name, 'email': f'{name}@example.com',
+            'password1': 'Very-long-pass-123', 'password2':
+            'Very-long-pass-123'}
+
+
+SCENARIOS = (
+    Scenario('index', 'posts:index'),
+    Scenario('index, стр. 5', 'posts:index', query=lambda s: {'page': 5}),
+    Scenario('group_list', 'posts:group_list', _group),
+    Scenario('profile', 'posts:profile', _author),
+    Scenario('search', 'posts:search',
+             query=lambda sample: {'q': sample['word']}),
+    Scenario('trending', 'posts:trending'),
+    Scenario('popular_groups', 'posts:popular_groups'),
+    Scenario('post_detail', 'posts:post_detail', _post),
+    Scenario('post_comments', 'posts:post_comments', _post),
+    Scenario('follow_index', 'posts:follow_index', login=True),
+    Scenario('post_create', 'posts:post_create', login=True),
+    Scenario('post_create POST', 'posts:post_create', method='POST',
+             data=_text, login=True),
+    Scenario('post_edit', 'posts:post_edit', _own_post, login=True),
+    Scenario('post_edit POST', 'posts:post_edit', _own_post, method='POST',
+             data=_text, login=True),
+    Scenario('add_comment POST', 'posts:add_comment', _post, method='POST',
+             data=_text, login=True),
+    Scenario('profile_follow', 'posts:profile_follow', _author, login=True),
+    Scenario('profile_unfollow', 'posts:profile_unfollow', _author,
+             login=True, prepare=_follow),
+    Scenario('signup', 'users:signup'),
+    Scenario('signup POST', 'users:signup', method='POST', data=_signup),
+    Scenario('login', 'users:login'),
+    Scenario('login POST', 'users:login', method='POST',
+             data=lambda sample: {'username': sample['user'].username,
+                                  'password': BENCH_PASSWORD}),
+    Scenario('logout', 'users:logout', login=True, fresh_session=True),
+    Scenario('password_reset', 'users:password_reset'),
+    Scenario('password_reset POST', 'users:password_reset', method='POST',
+             data=lambda sample: {'email': 'bench@example.com'}),
+    Scenario('password_reset_done', 'users:password_reset_done'),
+    Scenario('password_change', 'users:password_change', login=True),
+    Scenario('password_change_done', 'users:password_change_done',
+             login=True),
+    Scenario('about:author', 'about:author'),
+    Scenario('about:tech', 'about:tech'),
+    Scenario('static: comments.js', None,
+             url=lambda: static('js/comments.js')),
+)
+
+
+def uncovered_routes(scenarios=SCENARIOS):
+    """Маршруты, для которых нет ни одного сценария."""
+    covered = {scenario.route for scenario in scenarios}
+    routes = set()
+    for namespace in NAMESPACES:
+        for pattern in import_module(f'{namespace}.urls').urlpatterns:
+            routes.add(f'{namespace}:{pattern.name}')
+    return sorted(routes - covered)
+
+
+class QueryCounter:
+    """Число запросов к базам в текущем потоке внутри ``with``."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.count = 0
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+
+class ClientDriver:
+    """Тестовый клиент Django; CSRF не проверяется."""
+
+    def __init__(self, sample):
+        self.sample = sample
+
+    def session(self, login):
+        client = Client()
+        if login:
+            client.force_login(self.sample['user'])
+        return client
+
+    def request(self, session, method, path, data):
+        """Статус, SQL-запросы, байт тела и время до первого байта."""
+        with QueryCounter() as counter:
+            if method == 'POST':
+                response = session.post(
+                    path, data, HTTP_ACCEPT_ENCODING=ACCEPT_ENCODING)
+            else:
+                response = session.get(
+                    path, HTTP_ACCEPT_ENCODING=ACCEPT_ENCODING)
+            if response.streaming:
+                size = len(b''.join(response.streaming_content))
+                response.close()
+            else:
+                size = len(response.content)
+        # Без HTTP первого байта нет: ответ целиком возвращается вызовом.
+        return response.status_code, counter.count, size, None
+
+    def close(self):
+        pass
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class WSGIDriver:
+    """HTTP к wsgiref-серверу с приложением Django в отдельном потоке."""
+
+    def __init__(self, sample):
+        self.sample = sample
+        self.handler = WSGIHandler()
+        self.queries = 0
+        self.server = make_server(
+            '127.0.0.1', 0, self.app, handler_class=_QuietHandler)
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def app(self, environ, start_response):
+        with QueryCounter() as counter:
+            response = self.handler(environ, start_response)
+            body = b''.join(response)
+            response.close()
+        self.queries = counter.count
+        return [body]
+
+    def session(self, login):
+        token = _get_new_csrf_token()
+        cookies = {settings.CSRF_COOKIE_NAME: token}
+        if login:
+            client = Client()
+            client.force_login(self.sample['user'])
+            cookies[settings.SESSION_COOKIE_NAME] = client.cookies[
+                settings.SESSION_COOKIE_NAME].value
+        return {
+            'Cookie': '; '.join(f'{k}={v}' for k, v in cookies.items()),
+            'X-CSRFToken': token,
+            'Accept-Encoding': ACCEPT_ENCODING,
+        }
+
+    def request(self, session, method, path, data):
+        """Статус, SQL-запросы, байт тела и время до первого байта."""
+        host, port = self.server.server_address
+        connection = http.client.HTTPConnection(host, port)
+        headers = dict(session)
+        body = None
+        if method == 'POST':
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        start = time.perf_counter()
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        ttfb = (time.perf_counter() - start) * 1000
+        size = len(response.read())
+        connection.close()
+        return response.status, self.queries, size, ttfb
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+DRIVERS = {'client': ClientDriver, 'wsgi': WSGIDriver}
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_scenario(driver, scenario, requests, warmup):
+    sample = driver.sample
+    path = scenario.path(sample)
+    session = driver.session(scenario.login)
+    timings, queries, sizes, ttfbs, errors = [], [], [], [], 0
+
+    def once():
+        nonlocal session
+        if scenario.fresh_session:
+            session = driver.session(scenario.login)
+        if scenario.prepare:
+            scenario.prepare(sample)
+        data = scenario.data(sample)
+        start = time.perf_counter()
+        status, number, size, ttfb = driver.request(
+            session, scenario.method, path, data)
+        elapsed = (time.perf_counter() - start) * 1000
+        return status, number, size, ttfb, elapsed
+
+    for _ in range(warmup):
+        once()
+    for _ in range(requests):
+        status, number, size, ttfb, elapsed = once()
+        timings.append(elapsed)
+        queries.append(number)
+        sizes.append(size)
+        if ttfb is not None:
+            ttfbs.append(ttfb)
+        if status not in OK_STATUSES:
+            errors += 1
+
+    # Память отдельным запросом: tracemalloc замедляет код в разы.
+    tracemalloc.start()
+    once()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'p50': round(percentile(timings, 0.5), 3),
+        'p95': round(percentile(timings, 0.95), 3),
+        'p99': round(percentile(timings, 0.99), 3),
+        'mean': round(statistics.mean(timings), 3),
+        'queries': statistics.median(queries),
+        'memory_kb': round(peak / 1024, 1),
+        'bytes': statistics.median(sizes),
+        'ttfb_p50': round(percentile(ttfbs, 0.5), 3) if ttfbs else None,
+        'errors': errors,
+    }
+
+
+@contextmanager
+def collected_static():
+    """Статика, собранная как на боевом сервере, во временном каталоге."""
+    with tempfile.TemporaryDirectory() as root, override_settings(
+        STATIC_ROOT=root,
+        STATICFILES_STORAGE=STATIC_STORAGE,
+        STATIC_SERVE=True,
+    ):
+        # Файлы админки сценариям не нужны, а собирались бы дольше всего.
+        call_command(
+            'collectstatic', interactive=False, verbosity=0,
+            ignore_patterns=['admin'])
+        yield
+
+
+def run(sample, modes=MODES, scenarios=SCENARIOS, requests=50, warmup=5,
+        progress=None):
+    """Прогнать сценарии; вернуть ``{режим: {сценарий: итоги}}``."""
+    results = {}
+    # Сотни отправок форм подряд от одного пользователя упёрлись бы в
+    # ограничение частоты: замеряется сайт, а не ответ 429.
+    with override_settings(RATE_LIMITS_ENABLED=False), collected_static():
+        for mode in modes:
+            driver = DRIVERS[mode](sample)
+            try:
+                results[mode] = {}
+                for scenario in scenarios:
+                    result = run_scenario(
+                        driver, scenario, requests, warmup)
+                    results[mode][scenario.name] = result
+                    if progress:
+                        progress(mode, scenario.name, result)
+            finally:
+                driver.close()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Регрессии: строки вида ``(режим, сценарий, метрика, было, стало)``.
+
+    Медиана времени, память и размер ответа сравниваются с допуском
+    ``tolerance`` (доля), число запросов — точно: оно не зависит от
+    машины. Хвосты (p95, p99) и время до первого байта только выводятся:
+    на десятках запросов одна пауза сборщика мусора сдвигает их сильнее
+    любого допуска. Метрики, которых нет в базовой линии, пропускаются.
+    """
+    regressions = []
+    for mode, scenarios in results.items():
+        for name, result in scenarios.items():
+            base = baseline.get(mode, {}).get(name)
+            if base is None:
+                continue
+            for metric in ('p50', 'memory_kb', 'bytes'):
+                if base.get(metric) is None:
+                    continue
+                limit = base[metric] * (1 + tolerance)
+                if metric == 'p50':
+                    limit = max(limit, base[metric] + NOISE_MS)
+                if result[metric] > limit:
+                    regressions.append(
+                        (mode, name, metric, base[metric], result[metric]))
+            if result['queries'] > base['queries']:
+                regressions.append(
+                    (mode, name, 'queries', base['queries'],
+                     result['queries']))
+    return regressions
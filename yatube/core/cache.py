@@ -0,0 +1,121 @@
+"""Двухуровневый кеш: маленький LRU в процессе перед общим кешем.
+
+Общий кеш (файлы, memcached, Redis) один на все процессы gunicorn,
+поэтому фрагмент ленты считается один раз, а сброс виден всем.
+Локальный уровень снимает с него повторные чтения горячих ключей, но
+в других процессах значение обновится лишь через ``LOCAL_TIMEOUT``
+секунд. Поэтому ключи, которые меняются на месте (версии лент),
+читаются мимо него: ``shared_tier(cache)``. Фрагменты же неизменны —
+их ключ включает версии.
+
+Настройки (``OPTIONS``):
+
+* ``SHARED`` — псевдоним общего кеша в ``CACHES``;
+* ``MAX_ENTRIES`` — размер локального уровня;
+* ``LOCAL_TIMEOUT`` — сколько секунд значение живёт локально.
+"""
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+MISSING = object()
+
+
+def shared_tier(cache):
+    """Общий кеш за ``cache`` (или сам ``cache``, если он одноуровневый)."""
+    return getattr(cache, 'shared', cache)
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options['SHARED']
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self.local = LocMemCache(f'two-tier:{name}', {
+            'TIMEOUT': self.local_timeout,
+            'OPTIONS': {'MAX_ENTRIES': options.get('MAX_ENTRIES', 1000)},
+        })
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def _version(self, version):
+        return self.shared.version if version is None else version
+
+    def _local_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT or timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self.local.set(
+                key, value, self._local_timeout(timeout), version)
+        return added
+
+    def get(self, key, default=None, version=None):
+        version = self._version(version)
+        value = self.local.get(key, MISSING, version)
+        if value is not MISSING:
+            return value
+        value = self.shared.get(key, MISSING, version)
+        if value is MISSING:
+            return default
+        self.local.set(key, value, version=version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        self.shared.set(key, value, timeout, version)
+        self.local.set(key, value, self._local_timeout(timeout), version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, self._version(version))
+
+    def delete(self, key, version=None):
+        version = self._version(version)
+        self.local.delete(key, version)
+        self.shared.delete(key, version)
+
+    def get_many(self, keys, version=None):
+        version = self._version(version)
+        found = self.local.get_many(keys, version)
+        missing = [key for key in keys if key not in found]
+        if missing:
+            fetched = self.shared.get_many(missing, version)
+            self.local.set_many(fetched, version=version)
+            found.update(fetched)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        version = self._version(version)
+        failed = self.shared.set_many(data, timeout, version)
+        self.local.set_many(
+            {key: value for key, value in data.items()
+             if key not in failed},
+            self._local_timeout(timeout), version,
+        )
+        return failed
+
+    def delete_many(self, keys, version=None):
+        version = self._version(version)
+        self.local.delete_many(keys, version)
+        self.shared.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        version = self._version(version)
+        return (self.local.has_key(key, version)
+                or self.shared.has_key(key, version))
+
+    def incr(self, key, delta=1, version=None):
+        version = self._version(version)
+        self.local.delete(key, version)
+        return self.shared.incr(key, delta, version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
@@ -0,0 +1,110 @@
+"""Основная база и реплики для чтения.
+
+``PrimaryReplicaRouter`` отправляет запись в ``default``, а чтение — в
+одну из реплик ``DATABASE_REPLICAS``. Чтение идёт в основную базу, если:
+
+* запрос изменяющий (POST и т. п. или представление с ``@pin_to_primary``):
+  ``PrimaryPinMiddleware`` закрепляет его за основной базой целиком,
+  вместе с проверками перед записью;
+* после изменяющего запроса прошло меньше ``DATABASE_REPLICA_PIN_SECONDS``
+  секунд (cookie): пользователь сразу видит свою запись, даже если
+  реплика отстаёт;
+* код выполняется в транзакции основной базы или внутри ``use_primary()``.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_pinned = ContextVar('pinned_to_primary', default=False)
+
+
+@contextmanager
+def use_primary():
+    """Читать из основной базы внутри блока."""
+    token = _pinned.set(True)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def pin_to_primary(view):
+    """Для представлений, которые пишут в базу на GET-запрос."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.writes_to_primary = True
+        with use_primary():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def reads_from_primary():
+    return (
+        _pinned.get()
+        or not settings.DATABASE_REPLICAS
+        or connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if reads_from_primary():
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class PrimaryPinMiddleware:
+    """Закрепляет изменяющие запросы и следующие за ними за основной базой."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        unsafe = request.method not in SAFE_METHODS
+        if unsafe or PIN_COOKIE in request.COOKIES:
+            with use_primary():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
+        unsafe = unsafe or getattr(request, 'writes_to_primary', False)
+        if unsafe and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.DATABASE_REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+
+def check_connections(**kwargs):
+    """Закрыть постоянные соединения, которые перестали отвечать.
+
+    В Django 2.2 нет ``CONN_HEALTH_CHECKS``: соединение, оборванное базой
+    между запросами, обнаружилось бы только ошибкой следующего запроса.
+    Подключается к ``request_started``.
+    """
+    for alias in connections:
+        connection = connections[alias]
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if not connection.settings_dict.get('CONN_HEALTH_CHECKS'):
+            continue
+        if not connection.is_usable():
+            connection.close()
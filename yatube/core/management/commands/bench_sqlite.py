@@ -0,0 +1,142 @@
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from posts.models import Comment, Group, Post
+from yatube.env import ENGINES, SQLITE_ENGINE, sqlite_pragmas
+
+User = get_user_model()
+
+PROFILES = (
+    ('обычный', ENGINES['sqlite'], {}),
+    ('SQLITE_TUNING', SQLITE_ENGINE, sqlite_pragmas()),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест SQLite: читатели листают ленту, писатели '
+        'публикуют посты и комментарии. Сравнивает обычные настройки и '
+        'профиль SQLITE_TUNING на временных файлах баз.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--posts', type=int, default=20_000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"профиль":<15}{"чтений/с":>10}{"записей/с":>11}'
+            f'{"ошибок":>8}{"p95 чтения, мс":>16}{"p95 записи, мс":>16}'
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for number, (name, engine, pragmas) in enumerate(PROFILES):
+                alias = f'bench_sqlite_{number}'
+                connections.databases[alias] = {
+                    'ENGINE': engine,
+                    'NAME': os.path.join(directory, f'{alias}.sqlite3'),
+                    'PRAGMAS': pragmas,
+                }
+                try:
+                    self.seed(alias, options['posts'])
+                    result = self.run(alias, options)
+                finally:
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.databases[alias]
+                self.report(name, result, options['seconds'])
+
+    def seed(self, alias, total):
+        with connections[alias].schema_editor() as editor:
+            for model in (User, Group, Post, Comment):
+                editor.create_model(model)
+        with transaction.atomic(using=alias):
+            User.objects.using(alias).bulk_create(
+                User(username=f'user{i}') for i in range(100))
+            users = list(User.objects.using(alias))
+            group = Group.objects.using(alias).create(
+                title='bench', slug='bench')
+            Post.objects.using(alias).bulk_create(
+                Post(author=users[i % 100], group=group, text=f'Пост {i}')
+                for i in range(total)
+            )
+
+    def run(self, alias, options):
+        stop = threading.Event()
+        results = {'read': [], 'write': [], 'errors': 0}
+        lock = threading.Lock()
+
+        def worker(operation, kind):
+            timings, errors = [], 0
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    try:
+                        operation(alias)
+                    except OperationalError:
+                        errors += 1
+                        continue
+                    timings.append(time.perf_counter() - start)
+            finally:
+                connections[alias].close()
+            with lock:
+                results[kind].extend(timings)
+                results['errors'] += errors
+
+        threads = [
+            threading.Thread(target=worker, args=(read_feed, 'read'))
+            for _ in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=(publish, 'write'))
+            for _ in range(options['writers'])
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(options['seconds'])
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def report(self, name, result, seconds):
+        def p95(timings):
+            if len(timings) < 2:
+                return 0
+            return statistics.quantiles(timings, n=20)[-1] * 1000
+
+        self.stdout.write(
+            f'{name:<15}{len(result["read"]) / seconds:>10.0f}'
+            f'{len(result["write"]) / seconds:>11.0f}'
+            f'{result["errors"]:>8}{p95(result["read"]):>16.1f}'
+            f'{p95(result["write"]):>16.1f}'
+        )
+
+
+def read_feed(alias):
+    """Первая страница ленты группы с числом постов, как в group_list."""
+    posts = Post.objects.using(alias).filter(group__slug='bench')
+    posts.count()
+    list(posts.select_related('author', 'group').order_by('-pub_date')[:10])
+
+
+def publish(alias):
+    """Как post_create и add_comment: чтение, затем запись в транзакции.
+
+    ``bulk_create`` не отправляет сигналы: счётчики и ленты живут в
+    основной базе, а не во временной.
+    """
+    with transaction.atomic(using=alias):
+        group = Group.objects.using(alias).get(slug='bench')
+        author = User.objects.using(alias).order_by('?').first()
+        post, = Post.objects.using(alias).bulk_create(
+            [Post(author=author, group=group, text='Новый пост')])
+        Comment.objects.using(alias).bulk_create(
+            [Comment(post_id=post.pk, author=author, text='Комментарий')])
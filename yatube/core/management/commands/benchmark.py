@@ -0,0 +1,169 @@
+import json
+import os
+import platform
+import resource
+import tempfile
+import time
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, teardown_databases,
+)
+
+from core import benchmark
+from posts import synthetic
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон всех страниц posts, users и about на '
+        'синтетических данных во временной тестовой базе: перцентили '
+        'задержки, SQL-запросы, память, размер ответа и время до первого '
+        'байта на запрос. Сохраняет базовую линию и сравнивает с ней.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(synthetic.SCALES), default='small')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument(
+            '--mode', action='append', choices=benchmark.MODES,
+            help='client, wsgi; по умолчанию оба.')
+        parser.add_argument(
+            '--only', action='append', metavar='SCENARIO',
+            help='Только этот сценарий; можно указать несколько раз.')
+        parser.add_argument(
+            '--baseline',
+            default=os.path.join(
+                settings.BASE_DIR, 'benchmarks', 'baseline.json'))
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать итоги как новую базовую линию.')
+        parser.add_argument(
+            '--compare', action='store_true',
+            help='Сравнить с базовой линией; при регрессиях код выхода 1.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост времени, памяти и размера ответа, доля.')
+
+    def handle(self, *args, **options):
+        uncovered = benchmark.uncovered_routes()
+        if uncovered:
+            raise CommandError(
+                'Нет сценариев для маршрутов: ' + ', '.join(uncovered))
+        scenarios = [
+            scenario for scenario in benchmark.SCENARIOS
+            if not options['only'] or scenario.name in options['only']
+        ]
+        if not scenarios:
+            raise CommandError('Нет таких сценариев.')
+        baseline = None
+        if options['compare']:
+            baseline = self.load_baseline(options)
+
+        results = self.measure(scenarios, options)
+        for mode, rows in results.items():
+            self.write_table(mode, rows)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(f'Пиковая память процесса: {rss:.0f} МБ')
+
+        if options['save_baseline']:
+            self.save_baseline(results, options)
+        if baseline is not None:
+            self.report_regressions(results, baseline, options['tolerance'])
+
+    def measure(self, scenarios, options):
+        # Свой префикс ключей: общий кеш сайта не задевается, а
+        # фрагменты прошлых прогонов не подмешиваются.
+        prefix = f'benchmark-{time.time_ns()}'
+        caches = {
+            alias: {**config, 'KEY_PREFIX': prefix}
+            for alias, config in settings.CACHES.items()
+        }
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            DEBUG=False,
+            ALLOWED_HOSTS=['*'],
+            CACHES=caches,
+            MEDIA_ROOT=media,
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        ):
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                sample = synthetic.generate(
+                    **synthetic.SCALES[options['scale']],
+                    seed=options['seed'], progress=self.progress)
+                return benchmark.run(
+                    sample,
+                    modes=options['mode'] or benchmark.MODES,
+                    scenarios=scenarios,
+                    requests=options['requests'],
+                    warmup=options['warmup'],
+                )
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+    def progress(self, name, count):
+        self.stderr.write(f'Создано {name}: {count}')
+
+    def write_table(self, mode, rows):
+        self.stdout.write(f'\n[{mode}]')
+        self.stdout.write(
+            f'{"сценарий":<24}{"p50, мс":>9}{"p95":>8}{"p99":>8}'
+            f'{"SQL":>6}{"память, КБ":>12}{"ответ, КБ":>11}'
+            f'{"TTFB":>8}{"ошибок":>8}')
+        for name, row in rows.items():
+            ttfb = row['ttfb_p50']
+            ttfb = '—' if ttfb is None else f'{ttfb:.1f}'
+            self.stdout.write(
+                f'{name:<24}{row["p50"]:>9.1f}{row["p95"]:>8.1f}'
+                f'{row["p99"]:>8.1f}{row["queries"]:>6.0f}'
+                f'{row["memory_kb"]:>12.0f}{row["bytes"] / 1024:>11.1f}'
+                f'{ttfb:>8}{row["errors"]:>8}')
+
+    def meta(self, options):
+        return {
+            'scale': options['scale'],
+            'seed': options['seed'],
+            'requests': options['requests'],
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        }
+
+    def save_baseline(self, results, options):
+        path = options['baseline']
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'meta': self.meta(options), 'results': results},
+                      file, ensure_ascii=False, indent=2, sort_keys=True)
+            file.write('\n')
+        self.stdout.write(f'Базовая линия записана в {path}')
+
+    def load_baseline(self, options):
+        try:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            raise CommandError(
+                f'Нет базовой линии {options["baseline"]}: запустите с '
+                f'--save-baseline.')
+        meta = self.meta(options)
+        for key in ('scale', 'seed'):
+            if baseline['meta'].get(key) != meta[key]:
+                raise CommandError(
+                    f'Базовая линия снята с {key}='
+                    f'{baseline["meta"].get(key)}, а не {meta[key]}.')
+        return baseline['results']
+
+    def report_regressions(self, results, baseline, tolerance):
+        regressions = benchmark.compare(results, baseline, tolerance)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS('Регрессий нет.'))
+            return
+        for mode, name, metric, before, after in regressions:
+            self.stdout.write(self.style.ERROR(
+                f'[{mode}] {name}: {metric} {before:.1f} -> {after:.1f}'))
+        raise CommandError(f'Регрессий: {len(regressions)}.')
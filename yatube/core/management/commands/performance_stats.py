@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core import performance
+
+
+class Command(BaseCommand):
+    help = (
+        'Выводит гистограммы времени ответа по представлениям, которые '
+        'процессы сайта опубликовали в общем кеше '
+        '(PERFORMANCE_MONITORING).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести строки в JSON.')
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Удалить опубликованные гистограммы после вывода.')
+
+    def handle(self, *args, **options):
+        rows = performance.report(performance.collect())
+        if options['json']:
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+        else:
+            self.write_table(rows)
+        if options['reset']:
+            performance.reset()
+
+    def write_table(self, rows):
+        self.stdout.write(
+            f'{"представление":<28}{"запросов":>9}{"сред.":>8}{"p50":>7}'
+            f'{"p95":>7}{"p99":>7}{"SQL":>6}{"база":>7}{"шабл.":>7}'
+            f'{"кеш":>6}'
+        )
+        for row in rows:
+            ratio = row['hit_ratio']
+            self.stdout.write(
+                f'{row["view"]:<28}{row["count"]:>9}{row["mean"]:>8.1f}'
+                f'{row["p50"]:>7.1f}{row["p95"]:>7.1f}{row["p99"]:>7.1f}'
+                f'{row["queries"]:>6.1f}{row["db"]:>7.1f}'
+                f'{row["templates"]:>7.1f}'
+                f'{"—" if ratio is None else f"{ratio:.0%}":>6}'
+            )
+        self.stdout.write('Время в миллисекундах, база и шаблоны — в '
+                          'среднем на запрос.')
@@ -0,0 +1,82 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from core import templating
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Запрашивает страницы тестовым клиентом и выводит время отрисовки '
+        'фрагментов шаблонов: {% include %} и миниатюр, с местом в '
+        'шаблоне. Собственное время — без вложенных фрагментов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*', default=['/'],
+            help='Адреса страниц, по умолчанию главная.')
+        parser.add_argument('--requests', type=int, default=20)
+        parser.add_argument(
+            '--user', help='Имя пользователя, от которого идут запросы.')
+        parser.add_argument(
+            '--no-cache', action='store_true',
+            help='Отрисовывать фрагменты лент под {% cache %} каждый раз.')
+        parser.add_argument(
+            '--json', action='store_true', help='Вывести строки в JSON.')
+
+    def handle(self, *args, **options):
+        if options['no_cache']:
+            dummy = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+            with override_settings(CACHES={'default': dummy}):
+                self.profile(options)
+        else:
+            self.profile(options)
+
+    def profile(self, options):
+        client = Client()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(
+                    f'Нет пользователя {options["user"]!r}.')
+            client.force_login(user)
+
+        templating.install()
+        # Первый запрос разбирает шаблоны и греет кеши: не считаем его.
+        for path in options['paths']:
+            self.fetch(client, path)
+        templating.profile.reset()
+        for _ in range(options['requests']):
+            for path in options['paths']:
+                self.fetch(client, path)
+
+        rows = templating.profile.report()
+        if options['json']:
+            self.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2))
+        else:
+            self.write_table(rows, options['requests'])
+
+    def fetch(self, client, path):
+        response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(f'{path}: ответ {response.status_code}.')
+
+    def write_table(self, rows, requests):
+        self.stdout.write(
+            f'{"собств.":>8}{"всего":>8}{"вызов":>8}{"вызовов":>9}  '
+            f'фрагмент')
+        for row in rows:
+            self.stdout.write(
+                f'{row["own"] / requests:>8.2f}'
+                f'{row["total"] / requests:>8.2f}'
+                f'{row["per_call"]:>8.3f}{row["calls"] // requests:>9}  '
+                f'{row["fragment"]}'
+            )
+        self.stdout.write(
+            'Время в миллисекундах на запрос страницы, «вызов» — в среднем '
+            'на одну отрисовку фрагмента.')
@@ -0,0 +1,318 @@
+"""Замеры запросов: время ответа, база, кеш и шаблоны.
+
+Включаются настройкой ``PERFORMANCE_MONITORING``; без неё
+``PerformanceMiddleware`` убирает себя из цепочки, а перехватчики кеша и
+шаблонов не ставятся, так что выключенные замеры ничего не стоят.
+
+Для каждого запроса считаются время ответа, число и время запросов к
+базе (``execute_wrapper``), попадания и промахи кеша и время отрисовки
+шаблонов. Итог уходит в заголовок ``Server-Timing`` (его видят только
+сотрудники) и в гистограммы по представлениям. Гистограммы копятся в
+процессе и раз в ``PERFORMANCE_PUBLISH_SECONDS`` секунд публикуются в
+общий кеш: оттуда их собирают страница ``/admin/performance/`` и
+команда ``performance_stats``.
+"""
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import CacheHandler, cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+from .cache import shared_tier
+
+# Верхние границы корзин гистограммы, мс.
+BOUNDS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+TOTALS = ('wall', 'queries', 'db', 'hits', 'misses', 'templates')
+
+REGISTRY_KEY = 'performance:processes'
+SNAPSHOT_TIMEOUT = 24 * 60 * 60
+
+MISSING = object()
+
+_current = ContextVar('performance_stats', default=None)
+
+
+class RequestStats:
+    """Счётчики одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.templates = 0.0
+        # Вложенные вызовы (шаблон в шаблоне, общий уровень
+        # двухуровневого кеша) не считаются второй раз.
+        self.in_cache = False
+        self.in_template = False
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - start
+            self.queries += 1
+
+
+class Histogram:
+    """Запросы по корзинам времени ответа и суммы метрик."""
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.count = data.get('count', 0)
+        self.max = data.get('max', 0.0)
+        self.buckets = list(data.get('buckets', [0] * (len(BOUNDS) + 1)))
+        self.totals = dict.fromkeys(TOTALS, 0)
+        self.totals.update(data.get('totals', {}))
+
+    def add(self, wall, stats):
+        """Учесть запрос; время в секундах."""
+        wall_ms = wall * 1000
+        self.count += 1
+        self.max = max(self.max, wall_ms)
+        self.buckets[bisect_left(BOUNDS, wall_ms)] += 1
+        self.totals['wall'] += wall_ms
+        self.totals['queries'] += stats.queries
+        self.totals['db'] += stats.db * 1000
+        self.totals['hits'] += stats.hits
+        self.totals['misses'] += stats.misses
+        self.totals['templates'] += stats.templates * 1000
+
+    def merge(self, other):
+        self.count += other.count
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        for name in TOTALS:
+            self.totals[name] += other.totals[name]
+
+    def percentile(self, fraction):
+        """Оценка сверху: граница корзины, в которую попал перцентиль."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, number in zip(BOUNDS, self.buckets):
+            seen += number
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'max': self.max,
+            'buckets': self.buckets,
+            'totals': self.totals,
+        }
+
+
+class Recorder:
+    """Гистограммы текущего процесса по именам представлений."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.key = f'performance:{socket.gethostname()}:{os.getpid()}'
+        self.published = time.monotonic()
+
+    def record(self, view, wall, stats):
+        with self.lock:
+            if view not in self.histograms:
+                self.histograms[view] = Histogram()
+            self.histograms[view].add(wall, stats)
+            due = (time.monotonic() - self.published
+                   >= settings.PERFORMANCE_PUBLISH_SECONDS)
+            if due:
+                self.published = time.monotonic()
+        if due:
+            self.publish()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                view: histogram.as_dict()
+                for view, histogram in self.histograms.items()
+            }
+
+    def publish(self):
+        store = shared_tier(cache)
+        store.set(self.key, self.snapshot(), SNAPSHOT_TIMEOUT)
+        keys = store.get(REGISTRY_KEY) or []
+        if self.key not in keys:
+            store.set(REGISTRY_KEY, keys + [self.key], SNAPSHOT_TIMEOUT)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+
+recorder = Recorder()
+
+
+def collect():
+    """Гистограммы всех процессов, опубликованные в общем кеше."""
+    store = shared_tier(cache)
+    keys = store.get(REGISTRY_KEY) or []
+    snapshots = store.get_many(keys)
+    # Свой процесс — свежие данные, а не последняя публикация.
+    snapshots[recorder.key] = recorder.snapshot()
+    merged = {}
+    for snapshot in snapshots.values():
+        for view, data in snapshot.items():
+            merged.setdefault(view, Histogram()).merge(Histogram(data))
+    return merged
+
+
+def reset():
+    """Очистить свои гистограммы и опубликованные в кеше."""
+    recorder.reset()
+    store = shared_tier(cache)
+    store.delete_many((store.get(REGISTRY_KEY) or []) + [REGISTRY_KEY])
+
+
+def report(histograms):
+    """Строки отчёта, самые нагруженные представления первыми."""
+    rows = []
+    for view, histogram in histograms.items():
+        count = histogram.count or 1
+        totals = histogram.totals
+        lookups = totals['hits'] + totals['misses']
+        rows.append({
+            'view': view,
+            'count': histogram.count,
+            'total': totals['wall'],
+            'mean': totals['wall'] / count,
+            'p50': histogram.percentile(0.5),
+            'p95': histogram.percentile(0.95),
+            'p99': histogram.percentile(0.99),
+            'max': histogram.max,
+            'queries': totals['queries'] / count,
+            'db': totals['db'] / count,
+            'templates': totals['templates'] / count,
+            'hit_ratio': totals['hits'] / lookups if lookups else None,
+        })
+    rows.sort(key=lambda row: row['total'], reverse=True)
+    return rows
+
+
+def _instrument_cache(backend):
+    get, get_many = backend.get, backend.get_many
+
+    @wraps(get)
+    def instrumented_get(key, default=None, version=None):
+        stats = _current.get()
+        if stats is None or stats.in_cache:
+            return get(key, default, version)
+        stats.in_cache = True
+        try:
+            value = get(key, MISSING, version)
+        finally:
+            stats.in_cache = False
+        if value is MISSING:
+            stats.misses += 1
+            return default
+        stats.hits += 1
+        return value
+
+    @wraps(get_many)
+    def instrumented_get_many(keys, version=None):
+        stats = _current.get()
+        if stats is None or stats.in_cache:
+            return get_many(keys, version)
+        keys = list(keys)
+        stats.in_cache = True
+        try:
+            found = get_many(keys, version)
+        finally:
+            stats.in_cache = False
+        stats.hits += len(found)
+        stats.misses += len(keys) - len(found)
+        return found
+
+    backend.get = instrumented_get
+    backend.get_many = instrumented_get_many
+    backend.performance_instrumented = True
+
+
+def _install_hooks():
+    """Перехватить чтения кеша и отрисовку шаблонов (один раз)."""
+    if getattr(Template.render, 'performance_instrumented', False):
+        return
+
+    getitem = CacheHandler.__getitem__
+
+    @wraps(getitem)
+    def instrumented_getitem(self, alias):
+        backend = getitem(self, alias)
+        if not getattr(backend, 'performance_instrumented', False):
+            _instrument_cache(backend)
+        return backend
+
+    render = Template.render
+
+    @wraps(render)
+    def instrumented_render(self, context):
+        stats = _current.get()
+        if stats is None or stats.in_template:
+            return render(self, context)
+        stats.in_template = True
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            stats.templates += time.perf_counter() - start
+            stats.in_template = False
+
+    instrumented_render.performance_instrumented = True
+    CacheHandler.__getitem__ = instrumented_getitem
+    Template.render = instrumented_render
+
+
+def server_timing(wall, stats):
+    return ', '.join((
+        f'total;dur={wall * 1000:.1f}',
+        f'db;dur={stats.db * 1000:.1f};desc="{stats.queries} queries"',
+        f'cache;desc="hits={stats.hits} misses={stats.misses}"',
+        f'tpl;dur={stats.templates * 1000:.1f}',
+    ))
+
+
+class PerformanceMiddleware:
+    """Замеры запроса; ставится первым в ``MIDDLEWARE``."""
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_MONITORING:
+            raise MiddlewareNotUsed
+        _install_hooks()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            wall = time.perf_counter() - start
+            _current.reset(token)
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        recorder.record(view, wall, stats)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['Server-Timing'] = server_timing(wall, stats)
+        return response
@@ -0,0 +1,87 @@
+"""Плагин pytest проекта.
+
+* фикстура ``querywatch`` — ``QueryWatcher`` на всё время теста;
+  ``querywatch.issues()`` и ``querywatch.report()`` — найденное;
+* ``pytest --querywatch`` включает ``QueryWatchMiddleware`` во всех
+  тестах и перечисляет проблемные запросы к страницам в итоге прогона,
+  не роняя тесты. Запросы считаются по каждому обращению к сайту, а не
+  по тесту: подготовка данных в тесте в отчёт не попадает.
+
+Картинки постов и миниатюры sorl-thumbnail тесты пишут во временный
+``MEDIA_ROOT``, а не в каталог media проекта. После каждого теста плагин
+дожидается фоновых миниатюр постов (posts.thumbnails): иначе поток
+пишет в базу, пока pytest-django её очищает, и SQLite отвечает
+``database table is locked``.
+"""
+import logging
+
+import pytest
+
+from .querywatch import QueryWatcher, logger
+
+
+class Collector(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.nodeid = None
+        self.reports = {}
+
+    def emit(self, record):
+        self.reports.setdefault(self.nodeid, []).append(record.getMessage())
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--querywatch', action='store_true',
+        help='Искать медленные и повторяющиеся SQL-запросы к страницам.')
+
+
+def pytest_configure(config):
+    if config.getoption('querywatch'):
+        config.querywatch_collector = Collector()
+        logger.addHandler(config.querywatch_collector)
+
+
+@pytest.fixture
+def querywatch():
+    with QueryWatcher() as watcher:
+        yield watcher
+
+
+@pytest.fixture(autouse=True)
+def _querywatch_requests(request):
+    collector = getattr(request.config, 'querywatch_collector', None)
+    if collector is None:
+        yield
+        return
+    settings = request.getfixturevalue('settings')
+    settings.QUERYWATCH = True
+    collector.nodeid = request.node.nodeid
+    yield
+    collector.nodeid = None
+
+
+@pytest.fixture(autouse=True)
+def _temporary_media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    # Сразу после теста, до очистки базы фикстурами.
+    yield
+    from posts import thumbnails
+    thumbnails.wait()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    collector = getattr(config, 'querywatch_collector', None)
+    if collector is None:
+        return
+    terminalreporter.section('querywatch')
+    if not collector.reports:
+        terminalreporter.write_line('Проблемных запросов нет.')
+    for nodeid, messages in collector.reports.items():
+        terminalreporter.write_line(nodeid)
+        for message in messages:
+            terminalreporter.write_line(f'    {message}')
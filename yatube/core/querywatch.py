@@ -0,0 +1,171 @@
+"""Поиск медленных и повторяющихся SQL-запросов.
+
+``QueryWatcher`` подключается ко всем соединениям через
+``execute_wrapper`` и для каждого запроса запоминает время и место
+вызова: строку кода проекта (обычно представление) и строку шаблона,
+если запрос выполнился при отрисовке — например, ленивое ``post.author``
+в цикле. Проблемы две:
+
+* запрос дольше ``slow_ms`` миллисекунд;
+* один и тот же запрос с теми же параметрами ``duplicates`` раз и
+  больше за запрос к сайту (или тест) — признак ленивой загрузки
+  связанных объектов или повторного ``count()``.
+
+Где используется:
+
+* ``QueryWatchMiddleware`` — на тестовом стенде (``QUERYWATCH``), пишет
+  проблемы в лог ``core.querywatch`` с именем представления;
+* ``QueryWatchMixin`` — в тестах Django (``posts/tests``);
+* фикстура ``querywatch`` и ключ ``--querywatch`` — в pytest
+  (core/pytest_plugin.py).
+"""
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Кадры этих мест не считаются местом вызова: сама Django, пакеты из
+# виртуального окружения внутри проекта, этот модуль и перехватчики
+# core.performance и core.templating.
+IGNORED = (
+    os.path.dirname(sys.modules['django'].__file__),
+    __file__,
+    os.path.join(os.path.dirname(__file__), 'performance.py'),
+    os.path.join(os.path.dirname(__file__), 'templating.py'),
+)
+# Управление транзакциями не запрос к данным: BEGIN повторяется всегда.
+TRANSACTION_STATEMENTS = (
+    'BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT',
+)
+
+
+def _location():
+    """Строка кода проекта и строка шаблона, откуда пришёл запрос."""
+    code = template = None
+    frame = sys._getframe(2)
+    while frame and not (code and template):
+        node = frame.f_locals.get('self')
+        if (template is None and frame.f_code.co_name == 'render_annotated'
+                and getattr(node, 'token', None) is not None):
+            origin = getattr(node, 'origin', None)
+            name = (getattr(origin, 'template_name', None)
+                    or getattr(origin, 'name', '?'))
+            template = f'{name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        # Корень репозитория: в нём же тесты pytest (tests/).
+        root = os.path.dirname(settings.BASE_DIR)
+        if (code is None and filename.startswith(root)
+                and not filename.startswith(IGNORED)
+                and 'site-packages' not in filename):
+            path = os.path.relpath(filename, root)
+            code = f'{path}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return code, template
+
+
+class Issue:
+    def __init__(self, kind, sql, count, duration, locations):
+        self.kind = kind
+        self.sql = sql
+        self.count = count
+        self.duration = duration
+        self.locations = locations
+
+    def __str__(self):
+        if self.kind == 'slow':
+            head = f'медленный запрос, {self.duration:.0f} мс'
+        else:
+            head = f'запрос повторён {self.count} раз'
+        places = '; '.join(
+            ', '.join(filter(None, location)) or '?'
+            for location in self.locations
+        )
+        return f'{head} ({places}): {self.sql}'
+
+
+class QueryWatcher:
+    """Собирает запросы ко всем базам внутри ``with``."""
+
+    def __init__(self, slow_ms=None, duplicates=None):
+        self.slow_ms = (
+            settings.QUERYWATCH_SLOW_MS if slow_ms is None else slow_ms)
+        self.duplicates = (
+            settings.QUERYWATCH_DUPLICATES if duplicates is None
+            else duplicates)
+        self.queries = defaultdict(list)
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.startswith(TRANSACTION_STATEMENTS):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            key = (context['connection'].alias, sql, repr(params))
+            self.queries[key].append((duration, _location()))
+
+    def issues(self):
+        found = []
+        for (alias, sql, params), calls in self.queries.items():
+            for duration, location in calls:
+                if duration >= self.slow_ms:
+                    found.append(Issue('slow', sql, 1, duration, [location]))
+            if len(calls) >= self.duplicates:
+                locations = list(dict.fromkeys(
+                    location for _, location in calls))
+                found.append(Issue(
+                    'duplicate', sql, len(calls),
+                    sum(duration for duration, _ in calls), locations,
+                ))
+        return found
+
+    def report(self):
+        return '\n'.join(str(issue) for issue in self.issues())
+
+
+class QueryWatchMiddleware:
+    def __init__(self, get_response):
+        if not settings.QUERYWATCH:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with QueryWatcher() as watcher:
+            response = self.get_response(request)
+        issues = watcher.issues()
+        if issues:
+            match = request.resolver_match
+            view = match.view_name if match else request.path
+            for issue in issues:
+                logger.warning('%s: %s', view, issue)
+        return response
+
+
+class QueryWatchMixin:
+    """Для ``TestCase``: проверка, что в блоке нет проблемных запросов."""
+
+    @contextmanager
+    def assertQueriesClean(self, slow_ms=None, duplicates=None):
+        with QueryWatcher(slow_ms, duplicates) as watcher:
+            yield watcher
+        if watcher.issues():
+            self.fail(watcher.report())
@@ -0,0 +1,135 @@
+"""Ограничение частоты записей: ведро токенов на пользователя и на адрес.
+
+Каждая область (``comment``, ``follow``, ``post``) задаётся в
+``RATE_LIMITS`` парой ``(токенов в минуту, ёмкость ведра)`` отдельно для
+пользователя и для IP-адреса клиента. Запрос берёт токен из обоих
+вёдер; пустое ведро — ответ ``429 Too Many Requests`` с заголовком
+``Retry-After``. Запись через API берёт токены из тех же вёдер
+(``api.http.throttle``).
+
+Ведро хранится в общем кеше (``shared_tier``), поэтому лимит один на все
+процессы gunicorn. Вместо числа токенов и времени хранится одно число —
+момент, когда ведро снова станет полным (алгоритм GCRA, равносильный
+ведру токенов). Его сдвигает только атомарный ``incr``, ключ заводит
+атомарный ``add``, так что параллельные запросы не читают и не пишут
+ведро наперегонки. Чтобы за простой ведро не копило больше ёмкости,
+ключ живёт один интервал между токенами: первый запрос нового интервала
+заводит новый ключ и продолжает отсчёт с последнего из прежних. Кеш в
+файлах делает ``incr`` чтением и записью: там в гонке может пройти
+лишний запрос.
+
+Без ``DEBUG`` лимиты включены (``RATE_LIMITS_ENABLED``). За nginx адрес
+клиента берётся из ``X-Forwarded-For``: ``RATE_LIMIT_PROXIES`` — число
+доверенных прокси перед сайтом.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.shortcuts import render
+
+from .cache import shared_tier
+
+
+def client_ip(request):
+    """Адрес клиента с учётом доверенных прокси."""
+    proxies = settings.RATE_LIMIT_PROXIES
+    if proxies:
+        forwarded = [
+            address.strip() for address in
+            request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')
+            if address.strip()
+        ]
+        # Последний прокси дописывает адрес, от которого пришёл запрос;
+        # всё левее мог подделать сам клиент.
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _slot(key, interval, now):
+    """Ключ ведра ``key`` на интервал, в который попадает ``now``."""
+    return f'{key}:{now // interval}'
+
+
+def take(key, rate, burst, now=None):
+    """Взять токен из ведра ``key``; вернуть 0 или сколько секунд ждать."""
+    store = shared_tier(cache)
+    now = round((time.time() if now is None else now) * 1000)
+    interval = round(60_000 / rate)
+    limit = burst * interval
+    slot = _slot(key, interval, now)
+    try:
+        full_at = store.incr(slot, interval)
+    except ValueError:
+        # Первый запрос интервала: отсчёт идёт с последнего из прежних
+        # ключей, а если ведро успело наполниться — с текущего момента.
+        previous = store.get_many([
+            _slot(key, interval, now - back * interval)
+            for back in range(1, burst + 1)
+        ])
+        store.add(
+            slot, max([now, *previous.values()]),
+            math.ceil(2 * limit / 1000) + 1)
+        full_at = store.incr(slot, interval)
+    if full_at - now <= limit:
+        return 0
+    store.decr(slot, interval)
+    return (full_at - limit - now) / 1000
+
+
+def give_back(key, rate, now):
+    """Вернуть токен, взятый из ведра ``key`` в момент ``now``."""
+    interval = round(60_000 / rate)
+    try:
+        shared_tier(cache).decr(
+            _slot(key, interval, round(now * 1000)), interval)
+    except ValueError:
+        pass
+
+
+def check(request, scope):
+    """Взять токены области ``scope``; вернуть 0 или сколько ждать."""
+    if not settings.RATE_LIMITS_ENABLED:
+        return 0
+    limits = settings.RATE_LIMITS[scope]
+    buckets = []
+    if request.user.is_authenticated:
+        buckets.append(('user', request.user.pk))
+    buckets.append(('ip', client_ip(request)))
+    taken = []
+    now = time.time()
+    for kind, ident in buckets:
+        key = f'ratelimit:{scope}:{kind}:{ident}'
+        rate, burst = limits[kind]
+        wait = take(key, rate, burst, now)
+        if wait:
+            # Отклонённый запрос не тратит токены других вёдер.
+            for key, rate in taken:
+                give_back(key, rate, now)
+            return wait
+        taken.append((key, rate))
+    return 0
+
+
+def too_many_requests(request, wait):
+    response = render(
+        request, 'core/429.html', {'wait': math.ceil(wait)}, status=429)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+def ratelimit(scope, methods=('POST',)):
+    """Ограничить частоту запросов view; ``methods=None`` — любых."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                wait = check(request, scope)
+                if wait:
+                    return too_many_requests(request, wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,92 @@
+"""Раздача собранной статики с долгим кешированием и готовым сжатием.
+
+Если перед сайтом нет nginx (``STATIC_SERVE``), файлы из ``STATIC_ROOT``
+отдаёт ``StaticFilesMiddleware``, не доходя до сессий и представлений.
+Имена с хешем из манифеста (core/storage.py) кешируются на год с
+``immutable``: браузер не перепроверяет их вовсе, новая версия файла
+приходит под новым адресом. Прочие файлы кешируются на
+``STATIC_MAX_AGE`` секунд и перепроверяются по ``Last-Modified``.
+
+Сжатая копия выбирается по ``Accept-Encoding``: сначала ``br``, затем
+``gzip``. Ответ уже сжат, поэтому GZipMiddleware его не трогает.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+ENCODINGS = (
+    ('br', '.br', re.compile(r'\bbr\b')),
+    ('gzip', '.gz', re.compile(r'\bgzip\b')),
+)
+FOREVER = 365 * 24 * 60 * 60
+
+
+def hashed_names():
+    """Имена файлов с хешем из манифеста хранилища статики."""
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+class StaticFilesMiddleware:
+    def __init__(self, get_response):
+        if not settings.STATIC_SERVE or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.root = settings.STATIC_ROOT
+        # Манифест меняется только с выкладкой, то есть с перезапуском.
+        self.immutable = hashed_names()
+
+    def __call__(self, request):
+        if (request.method in ('GET', 'HEAD')
+                and request.path_info.startswith(self.prefix)):
+            response = self.serve(request, request.path_info[
+                len(self.prefix):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        """Ответ с файлом ``name`` или ``None``, если такого нет."""
+        try:
+            path = safe_join(self.root, name)
+        except SuspiciousFileOperation:
+            return None
+        if not os.path.isfile(path):
+            return None
+        stat = os.stat(path)
+        immutable = name in self.immutable
+        if not immutable and not was_modified_since(
+                request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                stat.st_mtime, stat.st_size):
+            return HttpResponseNotModified()
+
+        content_type, _ = mimetypes.guess_type(path)
+        accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        encoding = None
+        for coding, suffix, pattern in ENCODINGS:
+            if pattern.search(accepted) and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, coding
+                break
+        response = FileResponse(
+            open(path, 'rb'),
+            content_type=content_type or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        if immutable:
+            response['Cache-Control'] = (
+                f'public, max-age={FOREVER}, immutable')
+        else:
+            response['Cache-Control'] = (
+                f'public, max-age={settings.STATIC_MAX_AGE}')
+        return response
@@ -0,0 +1,81 @@
+"""Хранилище статики для боевой настройки: имена с хешем и сжатые копии.
+
+``collectstatic`` добавляет к имени файла хеш содержимого
+(``js/comments.3f2a1c9b04d7.js``) и пишет манифест, по которому
+``{% static %}`` отдаёт адрес с хешем. Адрес меняется вместе с
+содержимым, поэтому такой файл можно кешировать навсегда
+(core/static.py).
+
+Рядом с текстовыми файлами кладутся сжатые копии ``.gz`` и, если
+установлен пакет brotli, ``.br`` — только когда они заметно меньше
+оригинала. Их отдают без сжатия на лету core.static или nginx
+(``gzip_static``, ``brotli_static``).
+"""
+import gzip
+import logging
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE = (
+    '.css', '.js', '.map', '.svg', '.txt', '.json', '.xml', '.html', '.ico',
+)
+# Копия не нужна, если она больше этой доли оригинала.
+MAX_RATIO = 0.95
+
+
+def compressed_variants(content):
+    """Сжатые копии ``content``: ``{'.gz': байты, '.br': байты}``."""
+    variants = {'.gz': gzip.compress(content, 9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content)
+    return {
+        suffix: data for suffix, data in variants.items()
+        if len(data) <= len(content) * MAX_RATIO
+    }
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = set()
+        processed_files = super().post_process(paths, dry_run, **options)
+        for name, hashed_name, processed in processed_files:
+            if hashed_name and not isinstance(processed, Exception):
+                hashed.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(hashed):
+            if name.endswith(COMPRESSIBLE):
+                for variant in self.compress(name):
+                    yield variant, variant, True
+
+    def compress(self, name):
+        """Записать сжатые копии файла ``name``; вернуть их имена."""
+        with self.open(name) as original:
+            content = original.read()
+        written = []
+        for suffix, data in compressed_variants(content).items():
+            variant = name + suffix
+            if self.exists(variant):
+                self.delete(variant)
+            self._save(variant, ContentFile(data))
+            written.append(variant)
+        return written
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # Файла нет среди собранных (его забыли положить в static/):
+            # адрес без хеша вместо ошибки 500 на каждой странице.
+            logger.warning('Статический файл %s не найден в манифесте', name)
+            return name
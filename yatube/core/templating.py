@@ -0,0 +1,149 @@
+"""Загрузка шаблонов заранее и профилирование фрагментов.
+
+В боевой настройке (``DEBUG`` выключен) шаблоны читает кеширующий
+загрузчик: каждый шаблон разбирается один раз на процесс. ``preload``
+разбирает все шаблоны при старте веб-сервера (``TEMPLATES_PRELOAD``,
+yatube/wsgi.py), чтобы первые запросы не платили за чтение и разбор, а
+процесс с ошибкой в шаблоне не запускался вовсе. Команды manage.py
+шаблоны заранее не разбирают.
+
+Профилирование (``TEMPLATE_PROFILING``) замеряет время отрисовки каждого
+фрагмента — ``{% include %}``, ``{% thumbnail %}`` и тегов, которые
+вызывают фильтр миниатюр, — с местом в шаблоне: ``base.html:24``.
+Считаются полное время (с вложенными фрагментами) и собственное.
+Итоги копятся в процессе; их выводит команда ``profile_templates``.
+"""
+import os
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.template import engines
+from django.template.backends.django import DjangoTemplates
+from django.template.base import Node, TokenType
+from django.template.defaulttags import LoadNode
+from django.template.loader_tags import IncludeNode
+from sorl.thumbnail.templatetags.thumbnail import ThumbnailNodeBase
+
+PROFILED_NODES = (IncludeNode, ThumbnailNodeBase)
+# Теги с этим словом профилируются, даже если это не узлы миниатюр:
+# например, ``{% with im_url=post|thumbnail_url:"960x339" %}``.
+PROFILED_WORD = 'thumbnail'
+PROFILED_TOKENS = (TokenType.BLOCK, TokenType.VAR)
+
+# Время вложенных фрагментов текущего: вычитается из собственного.
+_children = ContextVar('template_fragment_children', default=None)
+
+
+def template_names(engine):
+    """Имена всех шаблонов в каталогах загрузчиков движка."""
+    directories = []
+    for loader in engine.template_loaders:
+        # Кеширующий загрузчик оборачивает обычные.
+        for inner in getattr(loader, 'loaders', [loader]):
+            if hasattr(inner, 'get_dirs'):
+                directories.extend(inner.get_dirs())
+    names = set()
+    for directory in dict.fromkeys(directories):
+        for root, _, files in os.walk(directory):
+            for file in files:
+                path = os.path.relpath(os.path.join(root, file), directory)
+                names.add(path.replace(os.sep, '/'))
+    return sorted(names)
+
+
+def preload():
+    """Разобрать все шаблоны Django; вернуть число загруженных.
+
+    Ошибка в шаблоне (``TemplateSyntaxError``) не перехватывается.
+    """
+    loaded = 0
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        for name in template_names(engine.engine):
+            engine.get_template(name)
+            loaded += 1
+    return loaded
+
+
+class FragmentProfile:
+    """Время фрагментов шаблонов в процессе."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fragments = {}
+
+    def add(self, fragment, total, own):
+        with self.lock:
+            calls, total_sum, own_sum = self.fragments.get(
+                fragment, (0, 0.0, 0.0))
+            self.fragments[fragment] = (
+                calls + 1, total_sum + total, own_sum + own)
+
+    def report(self):
+        """Строки отчёта, самые дорогие по собственному времени первыми."""
+        with self.lock:
+            rows = [
+                {'fragment': fragment, 'calls': calls,
+                 'total': total * 1000, 'own': own * 1000,
+                 'per_call': total * 1000 / calls}
+                for fragment, (calls, total, own) in self.fragments.items()
+            ]
+        rows.sort(key=lambda row: row['own'], reverse=True)
+        return rows
+
+    def reset(self):
+        with self.lock:
+            self.fragments.clear()
+
+
+profile = FragmentProfile()
+
+
+def fragment_name(node):
+    """``шаблон:строка {% тег %}`` или None, если узел не замеряется."""
+    token = getattr(node, 'token', None)
+    if (token is None or token.token_type not in PROFILED_TOKENS
+            or isinstance(node, LoadNode)):
+        return None
+    if not (isinstance(node, PROFILED_NODES)
+            or PROFILED_WORD in token.contents):
+        return None
+    origin = getattr(node, 'origin', None)
+    name = (getattr(origin, 'template_name', None)
+            or getattr(origin, 'name', '?'))
+    return f'{name}:{token.lineno} {{% {token.contents} %}}'
+
+
+def install():
+    """Включить профилирование фрагментов (один раз)."""
+    if getattr(Node.render_annotated, 'profiled', False):
+        return
+    render_annotated = Node.render_annotated
+
+    @wraps(render_annotated)
+    def profiled_render_annotated(self, context):
+        # Имя считается один раз: узлы разобранного шаблона общие.
+        try:
+            fragment = self.profiled_fragment
+        except AttributeError:
+            fragment = self.profiled_fragment = fragment_name(self)
+        if fragment is None:
+            return render_annotated(self, context)
+        children = [0.0]
+        token = _children.set(children)
+        start = time.perf_counter()
+        try:
+            return render_annotated(self, context)
+        finally:
+            total = time.perf_counter() - start
+            _children.reset(token)
+            parent = _children.get()
+            if parent is not None:
+                parent[0] += total
+            profile.add(fragment, total, total - children[0])
+
+    profiled_render_annotated.profiled = True
+    Node.render_annotated = profiled_render_annotated
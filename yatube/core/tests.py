@@ -1,5 +1,39 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import sqlite3
+import tempfile
 from http import HTTPStatus
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.template import TemplateSyntaxError, engines
+from django.templatetags.static import static
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts import feed_cache, synthetic
+from yatube.env import (
+    SQLITE_ENGINE, TWO_TIER_CACHE, cache_from_url, caches_from_env,
+    database_from_url, databases_from_env, sqlite_pragmas,
+)
+
+from . import benchmark, performance, ratelimit, templating
+from .cache import TwoTierCache, shared_tier
+from .querywatch import QueryWatcher, QueryWatchMixin
+from .db import PIN_COOKIE, PrimaryReplicaRouter, check_connections
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -10,3 +44,697 @@ class ViewTestClass(TestCase):
     def test_templ_error_page(self):
         response = self.client.get('/nonexist-page/')
         self.assertTemplateUsed(response, ('core/404.html'))
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_sqlite_url(self):
+        self.assertEqual(
+            database_from_url('sqlite:///db.sqlite3', '/srv'),
+            {'ENGINE': 'django.db.backends.sqlite3',
+             'NAME': '/srv/db.sqlite3'})
+        self.assertEqual(
+            database_from_url('sqlite:////tmp/db.sqlite3', '/srv')['NAME'],
+            '/tmp/db.sqlite3')
+
+    def test_postgres_url(self):
+        self.assertEqual(
+            database_from_url(
+                'postgres://user:p%40ss@db:6432/yatube?sslmode=require'),
+            {'ENGINE': 'django.db.backends.postgresql',
+             'NAME': 'yatube', 'USER': 'user', 'PASSWORD': 'p@ss',
+             'HOST': 'db', 'PORT': '6432',
+             'OPTIONS': {'sslmode': 'require'}})
+
+    def test_unknown_scheme(self):
+        with self.assertRaises(ValueError):
+            database_from_url('oracle://db/yatube')
+
+    def test_databases_from_env(self):
+        environ = {
+            'DATABASE_URL': 'postgres://db/yatube',
+            'DATABASE_REPLICA_URLS': 'postgres://r1/yatube, postgres://r2/y',
+            'DATABASE_CONN_MAX_AGE': '300',
+            'DATABASE_HEALTH_CHECKS': 'no',
+        }
+        with mock.patch.dict(os.environ, environ):
+            databases = databases_from_env('sqlite:///db.sqlite3')
+        self.assertEqual(list(databases), ['default', 'replica', 'replica_2'])
+        self.assertEqual(databases['replica']['HOST'], 'r1')
+        self.assertEqual(databases['replica_2']['TEST'], {'MIRROR': 'default'})
+        for config in databases.values():
+            self.assertEqual(config['CONN_MAX_AGE'], 300)
+            self.assertFalse(config['CONN_HEALTH_CHECKS'])
+
+    def test_defaults(self):
+        with mock.patch.dict(os.environ, clear=True):
+            databases = databases_from_env('sqlite:///db.sqlite3', '/srv')
+        self.assertEqual(list(databases), ['default'])
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 60)
+        self.assertTrue(databases['default']['CONN_HEALTH_CHECKS'])
+
+    def test_sqlite_tuning(self):
+        environ = {'SQLITE_TUNING': '1', 'SQLITE_BUSY_TIMEOUT_MS': '100'}
+        with mock.patch.dict(os.environ, environ):
+            sqlite = databases_from_env('sqlite:///db.sqlite3')['default']
+            postgres = databases_from_env('postgres://db/yatube')['default']
+        self.assertEqual(sqlite['ENGINE'], SQLITE_ENGINE)
+        self.assertEqual(sqlite['PRAGMAS']['journal_mode'], 'WAL')
+        self.assertEqual(sqlite['PRAGMAS']['busy_timeout'], 100)
+        self.assertNotIn('PRAGMAS', postgres)
+
+    def test_without_replicas_reads_go_to_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+        self.assertFalse(router.allow_migrate('replica', 'posts'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Реплика в тестах — второе соединение с той же тестовой базой."""
+
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        replica = dict(connections['default'].settings_dict)
+        replica['TEST'] = {**replica['TEST'], 'MIRROR': 'default'}
+        connections.databases['replica'] = replica
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.databases['replica']
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        self.client.force_login(self.reader)
+
+    def capture(self, method, url, data=None):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(url, data)
+        return response, len(primary), len(replica)
+
+    def test_feeds_read_from_replica(self):
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response, primary, replica = self.capture('get', url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+
+    def test_writes_go_to_primary_and_pin_reads(self):
+        writes = (
+            ('post', reverse('posts:post_create'), {'text': 'Новый'}),
+            ('post', reverse('posts:add_comment', args=[self.post.pk]),
+             {'text': 'Комментарий'}),
+            ('get', reverse('posts:profile_follow',
+                            args=[self.author.username]), None),
+        )
+        for method, url, data in writes:
+            with self.subTest(url=url):
+                self.client.cookies.pop(PIN_COOKIE, None)
+                response, primary, replica = self.capture(method, url, data)
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+                self.assertGreater(primary, 0)
+                if method == 'post':
+                    # GET подписки читает сессию с реплики до представления.
+                    self.assertEqual(replica, 0)
+                self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertTrue(Post.objects.filter(text='Новый').exists())
+        self.assertTrue(Comment.objects.filter(text='Комментарий').exists())
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.author)
+            .exists())
+
+        # Пока жива cookie, чтение идёт из основной базы.
+        self.client.cookies[PIN_COOKIE] = '1'
+        _, primary, replica = self.capture('get', reverse('posts:index'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_reads_inside_transaction_use_primary(self):
+        with transaction.atomic():
+            self.assertEqual(Post.objects.all().db, 'default')
+        self.assertEqual(Post.objects.all().db, 'replica')
+
+
+class TunedSqliteTests(SimpleTestCase):
+    databases = {'tuned'}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.directory.name, 'tuned.sqlite3')
+        connections.databases['tuned'] = {
+            'ENGINE': SQLITE_ENGINE,
+            'NAME': cls.path,
+            'PRAGMAS': {**sqlite_pragmas(), 'busy_timeout': 0},
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['tuned'].close()
+        del connections['tuned']
+        del connections.databases['tuned']
+        cls.directory.cleanup()
+
+    def test_pragmas(self):
+        with connections['tuned'].cursor() as cursor:
+            pragmas = {
+                name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                for name in ('journal_mode', 'synchronous', 'busy_timeout')
+            }
+        self.assertEqual(
+            pragmas,
+            {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 0})
+
+    def test_transactions_take_write_lock_at_start(self):
+        other = sqlite3.connect(self.path, timeout=0)
+        self.addCleanup(other.close)
+        with transaction.atomic(using='tuned'):
+            connections['tuned'].cursor().execute('SELECT 1')
+            with self.assertRaisesMessage(
+                    sqlite3.OperationalError, 'database is locked'):
+                other.execute('BEGIN IMMEDIATE')
+        other.execute('BEGIN IMMEDIATE')
+        other.rollback()
+
+
+class HealthCheckTests(TransactionTestCase):
+    def test_broken_connection_is_closed(self):
+        connection = connections['default']
+        connection.ensure_connection()
+        with mock.patch.dict(
+                connection.settings_dict, CONN_HEALTH_CHECKS=True), \
+                mock.patch.object(
+                    connection, 'is_usable', return_value=False), \
+                mock.patch.object(connection, 'close') as close:
+            check_connections()
+        close.assert_called_once_with()
+
+
+class CacheSettingsTests(SimpleTestCase):
+    def test_cache_urls(self):
+        self.assertEqual(
+            cache_from_url('file://cache?max_entries=5000&timeout=60', '/srv'),
+            {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+             'LOCATION': '/srv/cache', 'TIMEOUT': 60,
+             'OPTIONS': {'MAX_ENTRIES': 5000}})
+        self.assertEqual(
+            cache_from_url('memcached://a:11211,b:11211')['LOCATION'],
+            ['a:11211', 'b:11211'])
+        self.assertEqual(
+            cache_from_url('redis://h:6379/1?timeout=5')['LOCATION'],
+            'redis://h:6379/1')
+        with self.assertRaises(ValueError):
+            cache_from_url('mongodb://h')
+
+    def test_two_tier(self):
+        environ = {
+            'CACHE_URL': 'file:///var/tmp/yatube',
+            'CACHE_KEY_PREFIX': 'site',
+            'CACHE_VERSION': '3',
+            'CACHE_LOCAL_MAX_ENTRIES': '500',
+        }
+        with mock.patch.dict(os.environ, environ):
+            config = caches_from_env('locmem://')
+        self.assertEqual(config['default']['BACKEND'], TWO_TIER_CACHE)
+        self.assertEqual(config['default']['OPTIONS']['MAX_ENTRIES'], 500)
+        self.assertEqual(config['shared']['LOCATION'], '/var/tmp/yatube')
+        self.assertEqual(config['shared']['KEY_PREFIX'], 'site')
+        self.assertEqual(config['shared']['VERSION'], 3)
+
+    def test_defaults(self):
+        with mock.patch.dict(os.environ, clear=True):
+            config = caches_from_env('locmem://')
+        self.assertEqual(list(config), ['default'])
+        self.assertEqual(config['default']['KEY_PREFIX'], 'yatube')
+
+
+TWO_TIER_CACHES = {
+    'default': {
+        'BACKEND': TWO_TIER_CACHE,
+        'OPTIONS': {'SHARED': 'shared', 'MAX_ENTRIES': 10},
+    },
+    # Локальная замена общего кеша: один на все «процессы» теста.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+        'KEY_PREFIX': 'yatube',
+        'VERSION': 2,
+    },
+}
+
+
+@override_settings(CACHES=TWO_TIER_CACHES)
+class TwoTierCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Второй процесс gunicorn: свой локальный уровень, общий кеш тот же.
+        self.other = TwoTierCache('other', TWO_TIER_CACHES['default'])
+        self.other.local.clear()
+
+    def test_reads_fill_local_tier(self):
+        shared = caches['shared']
+        shared.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        shared.delete('key')
+        # Локальная копия живёт до LOCAL_TIMEOUT.
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertIsNone(self.other.get('key'))
+
+    def test_writes_reach_shared_tier(self):
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.other.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2})
+        self.assertEqual(caches['shared'].get('a', version=2), 1)
+        cache.delete('a')
+        self.assertIsNone(caches['shared'].get('a'))
+        self.assertTrue(cache.add('c', 3))
+        self.assertFalse(self.other.add('c', 4))
+
+    def test_incr_skips_local_tier(self):
+        cache.set('counter', 1)
+        self.assertEqual(self.other.get('counter'), 1)
+        self.assertEqual(cache.incr('counter'), 2)
+        self.assertEqual(cache.get('counter'), 2)
+        self.assertEqual(shared_tier(cache), caches['shared'])
+
+    def test_feed_versions_bypass_local_tier(self):
+        before = feed_cache.versions(feed_cache.INDEX)
+        # В TestCase транзакция не фиксируется: вызываем сразу.
+        with mock.patch.object(
+                feed_cache.transaction, 'on_commit', lambda func: func()):
+            feed_cache.bump(feed_cache.INDEX)
+        self.assertNotEqual(feed_cache.versions(feed_cache.INDEX), before)
+
+
+@override_settings(PERFORMANCE_MONITORING=True, PERFORMANCE_PUBLISH_SECONDS=0)
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        performance.reset()
+
+    def timing(self, response):
+        return dict(
+            metric.split(';', 1)
+            for metric in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_for_staff(self):
+        self.client.force_login(self.staff)
+        first = self.timing(self.client.get(reverse('posts:index')))
+        second = self.timing(self.client.get(reverse('posts:index')))
+        self.assertRegex(first['db'], r'^dur=[\d.]+;desc="[1-9]\d* queries"$')
+        self.assertRegex(first['tpl'], r'^dur=[\d.]+$')
+        self.assertRegex(first['cache'], r'misses=[1-9]')
+        # Второй раз лента берётся из кеша фрагментов.
+        self.assertRegex(second['cache'], r'hits=[1-9]')
+
+    def test_histograms(self):
+        for _ in range(3):
+            response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+        self.client.get('/nonexist-page/')
+        rows = {row['view']: row for row in performance.report(
+            performance.collect())}
+        self.assertEqual(rows['posts:index']['count'], 3)
+        self.assertGreater(rows['posts:index']['queries'], 0)
+        self.assertEqual(rows['<unresolved>']['count'], 1)
+
+    def test_collect_merges_processes(self):
+        self.client.get(reverse('posts:index'))
+        store = shared_tier(cache)
+        other = performance.Histogram()
+        other.add(0.3, performance.RequestStats())
+        store.set('performance:other:1', {'posts:index': other.as_dict()})
+        store.set(performance.REGISTRY_KEY, store.get(
+            performance.REGISTRY_KEY) + ['performance:other:1'])
+        histogram = performance.collect()['posts:index']
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(histogram.percentile(0.99), 300)
+
+    def test_command_and_admin_page(self):
+        self.client.get(reverse('posts:index'))
+        output = io.StringIO()
+        call_command('performance_stats', '--json', stdout=output)
+        self.assertIn(
+            'posts:index', [row['view'] for row in json.loads(
+                output.getvalue())])
+        response = self.client.get(reverse('performance'))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('performance'))
+        self.assertContains(response, 'posts:index')
+        self.client.post(reverse('performance'))
+        self.assertEqual(list(performance.collect()), ['performance'])
+
+    @override_settings(PERFORMANCE_MONITORING=False)
+    def test_disabled(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(performance.collect(), {})
+
+
+class HistogramTests(SimpleTestCase):
+    def test_percentiles(self):
+        histogram = performance.Histogram()
+        stats = performance.RequestStats()
+        for wall in [0.003] * 90 + [0.04] * 9 + [7.5]:
+            histogram.add(wall, stats)
+        self.assertEqual(histogram.percentile(0.5), 5)
+        self.assertEqual(histogram.percentile(0.95), 50)
+        self.assertEqual(histogram.percentile(1), 7500)
+
+
+class QueryWatchTests(QueryWatchMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        for i in range(3):
+            Post.objects.create(author=cls.author, text=f'Пост {i}')
+
+    def test_duplicates_point_to_template_line(self):
+        template = engines['django'].from_string(
+            '{% for post in posts %}\n{{ post.author.username }}\n'
+            '{% endfor %}')
+        with QueryWatcher() as watcher:
+            template.render({'posts': Post.objects.all()})
+        issue, = watcher.issues()
+        self.assertEqual(issue.kind, 'duplicate')
+        self.assertEqual(issue.count, 3)
+        self.assertIn('auth_user', issue.sql)
+        code, line = issue.locations[0]
+        self.assertTrue(code.startswith('yatube/core/tests.py:'))
+        self.assertEqual(line, '<unknown source>:2')
+
+    def test_slow_queries(self):
+        with QueryWatcher(slow_ms=0) as watcher:
+            Post.objects.count()
+        self.assertEqual(
+            [issue.kind for issue in watcher.issues()], ['slow'])
+
+    def test_transactions_are_ignored(self):
+        with QueryWatcher() as watcher:
+            for pk in range(3):
+                with transaction.atomic():
+                    Post.objects.filter(pk=pk).exists()
+        self.assertEqual(watcher.issues(), [])
+
+    def test_mixin(self):
+        with self.assertRaisesMessage(AssertionError, 'повторён 2 раз'):
+            with self.assertQueriesClean():
+                Post.objects.count()
+                Post.objects.count()
+        with self.assertQueriesClean():
+            self.client.get(reverse('posts:index'))
+
+    @override_settings(QUERYWATCH=True, QUERYWATCH_DUPLICATES=1)
+    def test_middleware_logs_view(self):
+        with self.assertLogs('core.querywatch', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        self.assertTrue(logs.output)
+        self.assertTrue(all(
+            'posts:index: запрос повторён 1 раз' in line
+            for line in logs.output))
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.media = tempfile.TemporaryDirectory()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media.name)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        cls.media.cleanup()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sample = synthetic.generate(
+            users=10, groups=2, posts=40, comments=60, follows=20)
+
+    def test_scenarios_cover_all_routes(self):
+        self.assertEqual(benchmark.uncovered_routes(), [])
+
+    def test_client_run(self):
+        results = benchmark.run(
+            self.sample, modes=['client'], requests=2, warmup=0)
+        for name, result in results['client'].items():
+            with self.subTest(scenario=name):
+                self.assertEqual(result['errors'], 0)
+                self.assertGreater(result['p50'], 0)
+                self.assertIn('bytes', result)
+        # Статика отдаётся сжатой копией.
+        original = os.path.getsize(
+            os.path.join(settings.BASE_DIR, 'static', 'js', 'comments.js'))
+        self.assertLess(
+            results['client']['static: comments.js']['bytes'], original)
+
+    def test_compare(self):
+        base = {'p50': 10.0, 'p95': 20.0, 'memory_kb': 100.0, 'queries': 5}
+        baseline = {'client': {'index': base}}
+
+        def regressions(**changes):
+            result = dict(base, **changes)
+            return [row[2] for row in benchmark.compare(
+                {'client': {'index': result}}, baseline, 0.25)]
+
+        self.assertEqual(regressions(p50=12.0, p95=60.0), [])
+        self.assertEqual(regressions(p50=13.0), ['p50'])
+        self.assertEqual(regressions(memory_kb=130.0), ['memory_kb'])
+        self.assertEqual(regressions(queries=6), ['queries'])
+        self.assertEqual(regressions(queries=4), [])
+        # В старой базовой линии размера ответа нет: не сравнивается.
+        self.assertEqual(regressions(bytes=5000), [])
+        baseline['client']['index'] = dict(base, bytes=1000)
+        self.assertEqual(regressions(bytes=1200), [])
+        self.assertEqual(regressions(bytes=1300), ['bytes'])
+
+
+@override_settings(
+    STATICFILES_STORAGE='core.storage.CompressedManifestStaticFilesStorage',
+    STATIC_SERVE=True)
+class StaticPipelineTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = root.name
+        static_root = override_settings(STATIC_ROOT=self.root)
+        static_root.enable()
+        self.addCleanup(static_root.disable)
+        call_command('collectstatic', interactive=False, verbosity=0,
+                     ignore_patterns=['admin'])
+        self.url = static('js/comments.js')
+
+    def test_hashed_and_compressed(self):
+        self.assertRegex(self.url, r'^/static/js/comments\.[0-9a-f]{12}\.js$')
+        path = os.path.join(self.root, self.url[len('/static/'):])
+        with open(path, 'rb') as original, open(path + '.gz', 'rb') as gz:
+            self.assertEqual(gzip.decompress(gz.read()), original.read())
+        # Картинки уже сжаты: копий нет.
+        logo = static('img/logo.png')
+        self.assertFalse(os.path.exists(
+            os.path.join(self.root, logo[len('/static/'):] + '.gz')))
+
+    def test_missing_file_keeps_plain_url(self):
+        with self.assertLogs('core.storage', 'WARNING'):
+            self.assertEqual(static('img/missing.png'),
+                             '/static/img/missing.png')
+
+    def test_hashed_file_cached_forever(self):
+        response = Client().get(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Cache-Control'],
+                         'public, max-age=31536000, immutable')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertIn(b'data-comments-more', body)
+
+    def test_plain_name_revalidated(self):
+        client = Client()
+        response = client.get('/static/js/comments.js')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Cache-Control'],
+                         f'public, max-age={settings.STATIC_MAX_AGE}')
+        response = client.get(
+            '/static/js/comments.js',
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_outside_root_not_served(self):
+        response = Client().get('/static/../manage.py')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class CompressionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост ' * 100)
+
+    def test_pages_gzipped(self):
+        for url in (reverse('posts:index'), reverse('about:author')):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+                self.assertIn('Accept-Encoding', response['Vary'])
+                page = gzip.decompress(response.content).decode()
+                self.assertIn('</body>', page)
+                response = self.client.get(url)
+                self.assertFalse(response.has_header('Content-Encoding'))
+
+
+CACHED_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ])],
+    },
+}]
+
+
+class TemplatingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for i in range(3):
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}')
+
+    @override_settings(TEMPLATES=CACHED_TEMPLATES)
+    def test_preload_fills_cached_loader(self):
+        loader, = engines['django'].engine.template_loaders
+        self.assertEqual(loader.get_template_cache, {})
+        self.assertGreater(templating.preload(), 0)
+        for name in ('base.html', 'posts/post.html', 'admin/base.html'):
+            self.assertIn(name, loader.get_template_cache)
+
+    def test_preload_raises_on_broken_template(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'broken.html'), 'w') as file:
+                file.write('{% if %}')
+            templates = [{**CACHED_TEMPLATES[0], 'DIRS': [directory]}]
+            with override_settings(TEMPLATES=templates):
+                with self.assertRaises(TemplateSyntaxError):
+                    templating.preload()
+
+    def test_fragments(self):
+        cache.clear()
+        templating.install()
+        templating.profile.reset()
+        self.client.get(reverse('posts:group_list', args=['group']))
+        rows = {
+            row['fragment']: row for row in templating.profile.report()}
+        header = "base.html:24 {% include 'includes/header.html' %}"
+        post = "posts/group_list.html:13 {% include './post.html' %}"
+        thumbnail = ('posts/post.html:14 '
+                     '{% with im_url=post|thumbnail_url:"960x339" %}')
+        self.assertEqual(rows[header]['calls'], 1)
+        self.assertEqual(rows[post]['calls'], 3)
+        self.assertEqual(rows[thumbnail]['calls'], 3)
+        # Миниатюры внутри post.html не входят в его собственное время.
+        self.assertLess(rows[post]['own'], rows[post]['total'])
+        self.assertFalse(any('{% load' in name for name in rows))
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command('profile_templates', '/group/group/', '--requests',
+                     '2', '--no-cache', stdout=output)
+        self.assertIn("{% include './post.html' %}", output.getvalue())
+
+
+@override_settings(RATE_LIMITS_ENABLED=True, RATE_LIMITS={
+    'comment': {'user': (60, 2), 'ip': (60, 3)},
+})
+class RateLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='user')
+        cls.other = User.objects.create_user(username='other')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_token_bucket(self):
+        """Ведро на 2 токена, токен в секунду."""
+        take = ratelimit.take
+        self.assertEqual(take('bucket', 60, 2, now=100), 0)
+        self.assertEqual(take('bucket', 60, 2, now=100), 0)
+        self.assertEqual(take('bucket', 60, 2, now=100), 1)
+        self.assertEqual(take('bucket', 60, 2, now=100.5), 0.5)
+        # Отказ не тратит токен: через секунду он снова есть.
+        self.assertEqual(take('bucket', 60, 2, now=101), 0)
+        self.assertEqual(take('bucket', 60, 2, now=101), 1)
+        # За простой ведро наполняется, но не больше ёмкости.
+        self.assertEqual(take('bucket', 60, 2, now=200), 0)
+        self.assertEqual(take('bucket', 60, 2, now=200), 0)
+        self.assertEqual(take('bucket', 60, 2, now=200), 1)
+        # Отсчёт переходит в ключ нового интервала без лишних токенов.
+        self.assertEqual(take('bucket', 60, 2, now=201.5), 0)
+        self.assertEqual(take('bucket', 60, 2, now=201.5), 0.5)
+
+    def comment(self, user, **extra):
+        client = Client()
+        client.force_login(user)
+        return client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Комментарий'}, **extra)
+
+    def test_user_and_ip_limits(self):
+        for _ in range(2):
+            self.assertEqual(self.comment(self.user).status_code, 302)
+        response = self.comment(self.user)
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertTemplateUsed(response, 'core/429.html')
+        self.assertEqual(Comment.objects.count(), 2)
+        # Другой пользователь с того же адреса упирается в лимит адреса.
+        self.assertEqual(self.comment(self.other).status_code, 302)
+        self.assertEqual(self.comment(self.other).status_code, 429)
+        self.assertEqual(
+            self.comment(self.other, REMOTE_ADDR='10.0.0.2').status_code,
+            302)
+
+    @override_settings(RATE_LIMIT_PROXIES=1)
+    def test_client_ip_behind_proxy(self):
+        request = RequestFactory().get(
+            '/', HTTP_X_FORWARDED_FOR='1.1.1.1, 2.2.2.2',
+            REMOTE_ADDR='127.0.0.1')
+        self.assertEqual(ratelimit.client_ip(request), '2.2.2.2')
+        with override_settings(RATE_LIMIT_PROXIES=2):
+            self.assertEqual(ratelimit.client_ip(request), '1.1.1.1')
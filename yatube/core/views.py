@@ -1,6 +1,10 @@
 # core/views.py
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
 
+from . import performance as perf
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -18,3 +22,13 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, "core/403.html", status=403)
+
+
+@staff_member_required
+def performance(request):
+    if request.method == 'POST':
+        perf.reset()
+    return render(request, 'core/performance.html', {
+        'rows': perf.report(perf.collect()),
+        'enabled': settings.PERFORMANCE_MONITORING,
+    })
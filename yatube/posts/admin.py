@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Group, Post
+from .search import filter_queryset
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -13,6 +14,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск идёт по индексу FTS5, а не по LIKE '%...%'
+        found = filter_queryset(queryset, search_term)
+        if found is None:
+            return super().get_search_results(
+                request, queryset, search_term)
+        return found, False
+
 # При регистрации модели Post источником конфигурации для неё назначаем
 # класс PostAdmin
 
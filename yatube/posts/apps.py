@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import ensure_triggers, forget_fts
+        post_migrate.connect(ensure_triggers, sender=self)
+        connection_created.connect(forget_fts)
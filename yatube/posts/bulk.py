@@ -0,0 +1,412 @@
+"""Потоковые импорт и экспорт постов, комментариев, групп и подписок.
+
+Записи читаются и пишутся по одной (NDJSON или CSV), поэтому память не
+зависит от объёма данных. Импорт складывает записи в ``bulk_create``
+пачками по ``batch_size`` внутри транзакций по ``transaction_size``
+записей. ``bulk_create`` не отправляет сигналы моделей, поэтому после
+импорта счётчики, ленты подписок и версии кеша лент пересчитываются
+разом (``finish_import``) — только для записей с id не меньше
+``Importer.since``; рейтинги строятся заново, если импорт записал id
+ниже уже учтённых. Индекс поиска обновляют триггеры базы.
+
+Авторы ссылаются на пользователей по ``username`` (недостающие
+создаются без пароля), посты — на группы по ``slug``, комментарии — на
+посты по ``id``.
+"""
+import contextlib
+import csv
+import datetime
+import json
+from collections import OrderedDict
+from itertools import groupby, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, reset_queries, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed_cache, rankings, timeline
+from .models import Comment, Follow, Group, Post, User
+
+# Порядок зависимостей: группы и посты раньше комментариев.
+KINDS = ('group', 'post', 'comment', 'follow')
+
+FIELDS = {
+    'group': {
+        'title': 'title',
+        'slug': 'slug',
+        'description': 'description',
+    },
+    'post': {
+        'id': 'id',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'image': 'image',
+    },
+    'comment': {
+        'id': 'id',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    },
+    'follow': {
+        'user': 'user__username',
+        'author': 'author__username',
+    },
+}
+
+MODELS = {
+    'group': Group,
+    'post': Post,
+    'comment': Comment,
+    'follow': Follow,
+}
+
+CACHE_SIZE = 100_000
+
+
+class InvalidRecord(ValueError):
+    """Запись не удалось разобрать."""
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextlib.contextmanager
+def preserve_dates(*models):
+    """Не подменять даты ``auto_now``/``auto_now_add`` текущим временем.
+
+    Нужно, чтобы импорт и генерация данных сохраняли свои даты.
+    """
+    changed = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            for attr in ('auto_now', 'auto_now_add'):
+                if getattr(field, attr, False):
+                    setattr(field, attr, False)
+                    changed.append((field, attr))
+    try:
+        yield
+    finally:
+        for field, attr in changed:
+            setattr(field, attr, True)
+
+
+def _encode(value):
+    # Время — с микросекундами, иначе ключи курсоров после импорта
+    # разойдутся с исходными.
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def _datetime(value):
+    if not value:
+        return timezone.now()
+    if isinstance(value, datetime.datetime):
+        parsed = value
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise InvalidRecord(f'Неверная дата: {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.utc)
+    return parsed
+
+
+def _int(value):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise InvalidRecord(f'Неверное число: {value!r}')
+
+
+class LRUCache(OrderedDict):
+    def __init__(self, size=CACHE_SIZE):
+        super().__init__()
+        self.size = size
+
+    def put(self, key, value):
+        self[key] = value
+        self.move_to_end(key)
+        if len(self) > self.size:
+            self.popitem(last=False)
+
+
+class Resolver:
+    """Ключи пользователей и групп по ``username`` и ``slug``.
+
+    Ищет сразу всю пачку одним запросом и помнит последние
+    ``CACHE_SIZE`` ключей.
+    """
+
+    def __init__(self):
+        self.users = LRUCache()
+        self.groups = LRUCache()
+
+    def user_ids(self, usernames):
+        missing = {name for name in usernames if name not in self.users}
+        if missing:
+            found = dict(User.objects.filter(
+                username__in=missing).values_list('username', 'id'))
+            new = missing - set(found)
+            if new:
+                unusable = make_password(None)
+                User.objects.bulk_create(
+                    [User(username=name, password=unusable)
+                     for name in new],
+                    ignore_conflicts=True,
+                )
+                found.update(User.objects.filter(
+                    username__in=new).values_list('username', 'id'))
+            for name, pk in found.items():
+                self.users.put(name, pk)
+        return {name: self.users[name] for name in usernames}
+
+    def group_ids(self, slugs):
+        missing = {slug for slug in slugs if slug not in self.groups}
+        if missing:
+            found = dict(Group.objects.filter(
+                slug__in=missing).values_list('slug', 'id'))
+            unknown = missing - set(found)
+            if unknown:
+                raise InvalidRecord(
+                    f'Нет групп: {", ".join(sorted(unknown))}')
+            for slug, pk in found.items():
+                self.groups.put(slug, pk)
+        return {slug: self.groups[slug] for slug in slugs}
+
+
+class Importer:
+    def __init__(self, batch_size=1000, transaction_size=10_000,
+                 ignore_conflicts=False):
+        self.batch_size = batch_size
+        self.transaction_size = transaction_size
+        self.ignore_conflicts = ignore_conflicts
+        self.resolver = Resolver()
+        # Затронутые области кеша лент: их версии сменятся после импорта.
+        self.scopes = {feed_cache.INDEX}
+        # Наименьшие id, которые может записать импорт: новые записи
+        # получают id больше прежних, явные id учитываются в ``create``.
+        self.since = {
+            kind: (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+            for kind, model in (
+                ('user', User), ('post', Post), ('comment', Comment),
+                ('follow', Follow),
+            )
+        }
+
+    def run(self, records, progress=None):
+        """Импортировать пары ``(вид, запись)``; вернуть число записей."""
+        totals = dict.fromkeys(KINDS, 0)
+        with preserve_dates(Post, Comment):
+            for chunk in chunked(records, self.transaction_size):
+                with transaction.atomic():
+                    for kind, rows in groupby(chunk, key=lambda r: r[0]):
+                        rows = [row for _, row in rows]
+                        for batch in chunked(rows, self.batch_size):
+                            self.create(kind, batch)
+                        totals[kind] += len(rows)
+                # При DEBUG Django копит текст запросов, а INSERT на
+                # тысячу строк велик: без очистки память растёт.
+                reset_queries()
+                if progress:
+                    progress(totals)
+        reset_sequences(MODELS.values())
+        return totals
+
+    def create(self, kind, rows):
+        objects = getattr(self, f'build_{kind}')(rows)
+        # У групп и подписок есть естественные уникальные ключи: повторный
+        # импорт их пропускает.
+        ignore = self.ignore_conflicts or kind in ('group', 'follow')
+        MODELS[kind].objects.bulk_create(objects, ignore_conflicts=ignore)
+        if kind in self.since:
+            self.since[kind] = min(
+                [self.since[kind]]
+                + [obj.pk for obj in objects if obj.pk is not None])
+
+    def build_group(self, rows):
+        return [
+            Group(
+                title=row.get('title') or row['slug'],
+                slug=row['slug'],
+                description=row.get('description') or '',
+            )
+            for row in rows
+        ]
+
+    def build_post(self, rows):
+        users = self.resolver.user_ids({row['author'] for row in rows})
+        groups = self.resolver.group_ids(
+            {row['group'] for row in rows if row.get('group')})
+        posts = []
+        for row in rows:
+            pub_date = _datetime(row.get('pub_date'))
+            group_id = groups.get(row.get('group') or None)
+            posts.append(Post(
+                id=_int(row.get('id')),
+                text=row['text'],
+                pub_date=pub_date,
+                updated=pub_date,
+                author_id=users[row['author']],
+                group_id=group_id,
+                image=row.get('image') or '',
+            ))
+            self.scopes.add(feed_cache.author_scope(users[row['author']]))
+            if group_id:
+                self.scopes.add(feed_cache.group_scope(group_id))
+        return posts
+
+    def build_comment(self, rows):
+        users = self.resolver.user_ids(
+            {row['author'] for row in rows if row.get('author')})
+        comments = []
+        for row in rows:
+            created = _datetime(row.get('created'))
+            comments.append(Comment(
+                id=_int(row.get('id')),
+                post_id=_int(row.get('post')),
+                author_id=users.get(row.get('author') or None),
+                text=row.get('text'),
+                created=created,
+                updated=created,
+            ))
+        return comments
+
+    def build_follow(self, rows):
+        users = self.resolver.user_ids(
+            {row[key] for row in rows for key in ('user', 'author')})
+        return [
+            Follow(user_id=users[row['user']], author_id=users[row['author']])
+            for row in rows
+            # Подписка на себя запрещена ограничением prevent_self_follow.
+            if row['user'] != row['author']
+        ]
+
+
+def reset_sequences(models):
+    """Сдвинуть последовательности после вставки записей с явными id.
+
+    Нужно на PostgreSQL и других базах с последовательностями, как после
+    loaddata.
+    """
+    statements = connection.ops.sequence_reset_sql(no_style(), list(models))
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def distinct_values(queryset, field, size=counters.BATCH_SIZE):
+    """Различные значения ``field`` в ``queryset`` пачками по ``size``.
+
+    Каждая пачка — отдельный запрос по возрастанию значений, поэтому
+    память не растёт, а между пачками можно писать в те же таблицы.
+    """
+    queryset = queryset.filter(**{f'{field}__isnull': False}).order_by(
+        field).values_list(field, flat=True).distinct()
+    chunk = list(queryset[:size])
+    while chunk:
+        yield chunk
+        chunk = list(queryset.filter(**{f'{field}__gt': chunk[-1]})[:size])
+
+
+def finish_import(scopes, since=None):
+    """Пересчитать то, что обычно обновляют сигналы моделей.
+
+    ``since`` — наименьшие id записей импорта по видам
+    (``Importer.since``): пересчитываются счётчики и ленты только
+    затронутых им пользователей, постов и подписок. Без ``since`` всё
+    пересчитывается заново.
+    """
+    with transaction.atomic():
+        if since is None:
+            counters.rebuild(fix=True)
+            timeline.rebuild()
+        else:
+            _refresh(since)
+        # Записи с id ниже учтённых refresh_rankings не прочитает.
+        if since is None or rankings.behind(since):
+            rankings.rebuild()
+    feed_cache.bump(*scopes)
+
+
+def _refresh(since):
+    posts = Post.objects.filter(id__gte=since['post'])
+    follows = Follow.objects.filter(id__gte=since['follow'])
+    users = (
+        (User.objects.filter(id__gte=since['user']), 'id'),
+        (posts, 'author_id'),
+        (follows, 'user_id'),
+        (follows, 'author_id'),
+    )
+    for queryset, field in users:
+        for chunk in distinct_values(queryset, field):
+            counters.refresh_users(chunk)
+    comments = Comment.objects.filter(id__gte=since['comment'])
+    for chunk in distinct_values(comments, 'post_id'):
+        counters.refresh_posts(chunk)
+    # Ленты — после счётчиков: по ним видно популярных авторов.
+    for queryset in (posts, follows):
+        for chunk in distinct_values(queryset, 'author_id'):
+            timeline.refresh(chunk)
+
+
+def read_ndjson(stream, kind=None):
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise InvalidRecord(f'Строка {number}: не JSON')
+        record_kind = record.pop('type', None) or kind
+        if record_kind not in KINDS:
+            raise InvalidRecord(f'Строка {number}: неизвестный тип записи')
+        yield record_kind, record
+
+
+def read_csv(stream, kind):
+    for record in csv.DictReader(stream):
+        yield kind, record
+
+
+def export_rows(kind, chunk_size=2000):
+    """Записи вида ``kind`` по возрастанию id, без создания моделей."""
+    fields = FIELDS[kind]
+    queryset = MODELS[kind].objects.order_by('pk').values(*fields.values())
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield {name: row[path] for name, path in fields.items()}
+
+
+def write_ndjson(stream, kind, rows):
+    for row in rows:
+        stream.write(json.dumps(
+            {'type': kind, **row}, ensure_ascii=False, default=_encode
+        ) + '\n')
+
+
+def write_csv(stream, kind, rows):
+    writer = csv.DictWriter(stream, fieldnames=list(FIELDS[kind]))
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            name: _encode(value)
+            if isinstance(value, datetime.datetime) else value
+            for name, value in row.items()
+        })
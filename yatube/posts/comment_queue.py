@@ -0,0 +1,187 @@
+"""Отложенная запись комментариев пачками (``COMMENT_WRITE_BEHIND``).
+
+У SQLite один писатель, и шквал комментариев под популярным постом
+выстраивает запросы в очередь за ним. При включённой настройке
+``add_comment`` и API не пишут комментарий в базу, а ставят его в
+очередь процесса; фоновый поток раз в ``COMMENT_FLUSH_SECONDS`` секунд (или
+сразу, когда накопилось ``COMMENT_FLUSH_SIZE``) вставляет всю очередь
+одним ``bulk_create`` в одной транзакции. При 0 секундах потока нет:
+очередь записывает запрос, который её заполнил, или ``flush``.
+
+``bulk_create`` не шлёт сигналов, поэтому счётчики комментариев, дата
+изменения поста и версии лент обновляются здесь, по разу на пост.
+
+Если пачка нарушает ограничение базы (например, автора удалили), она
+пишется по одному комментарию: плохая строка не отнимает место у
+остальных. Пачка, которую база не приняла по другой причине (занята),
+возвращается в очередь, но не больше ``MAX_ATTEMPTS`` раз.
+
+Автор видит свой комментарий сразу: пока тот в очереди, копия лежит в
+общем кеше в своём ключе ``comments:pending:<автор>:<пост>:<номер>``, а
+номер выдаёт атомарный ``incr``, так что параллельные комментарии не
+затирают копии друг друга. Очередь живёт в памяти процесса: при
+штатной остановке она записывается, при аварийной — теряется.
+"""
+import atexit
+import logging
+import threading
+from collections import Counter
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+from core.cache import shared_tier
+
+from . import counters, feed_cache
+from .models import Comment, Post
+
+logger = logging.getLogger(__name__)
+
+# Сколько копия ждущего комментария живёт в кеше, если её не убрали.
+PENDING_TIMEOUT = 5 * 60
+# Сколько раз комментарий возвращается в очередь после ошибки базы.
+MAX_ATTEMPTS = 5
+
+_queue = []
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_flusher = None
+
+
+def pending_key(user_id, post_id):
+    return f'comments:pending:{user_id}:{post_id}'
+
+
+def pending(user, post):
+    """Комментарии ``user`` к ``post``, ещё не записанные в базу."""
+    if not settings.COMMENT_WRITE_BEHIND or not user.is_authenticated:
+        return []
+    store = shared_tier(cache)
+    key = pending_key(user.pk, post.pk)
+    last = store.get(key, 0)
+    entries = store.get_many([f'{key}:{slot}' for slot in range(1, last + 1)])
+    return [
+        Comment(post=post, author=user, text=entry['text'],
+                created=entry['created'])
+        for entry in sorted(entries.values(), key=itemgetter('created'))
+    ]
+
+
+def enqueue(comment):
+    """Поставить несохранённый комментарий в очередь на запись."""
+    store = shared_tier(cache)
+    key = pending_key(comment.author_id, comment.post_id)
+    # Номер копии; счётчик живёт дольше копий, чтобы номера не
+    # повторялись, пока копии в кеше.
+    store.add(key, 0, 2 * PENDING_TIMEOUT)
+    comment.pending_key = f'{key}:{store.incr(key)}'
+    store.set(comment.pending_key, {
+        'text': comment.text, 'created': timezone.now(),
+    }, PENDING_TIMEOUT)
+
+    with _lock:
+        _queue.append(comment)
+        full = len(_queue) >= settings.COMMENT_FLUSH_SIZE
+    if settings.COMMENT_FLUSH_SECONDS:
+        _start_flusher()
+        if full:
+            _wakeup.set()
+    elif full:
+        flush()
+
+
+def _write(comments):
+    """Записать комментарии одной транзакцией; вернуть записанные."""
+    with transaction.atomic():
+        posts = Post.objects.only('author', 'group').in_bulk(
+            {comment.post_id for comment in comments})
+        # Пост могли удалить, пока комментарий ждал.
+        saved = [comment for comment in comments if comment.post_id in posts]
+        Comment.objects.bulk_create(saved)
+        added = Counter(comment.post_id for comment in saved)
+        for post_id, number in added.items():
+            counters.change_comments_count(post_id, number)
+            feed_cache.bump(*feed_cache.post_scopes(posts[post_id]))
+    return saved
+
+
+def _write_each(batch):
+    """Записать по одному; вернуть записанные и отложенные."""
+    saved, failed = [], []
+    for comment in batch:
+        try:
+            saved += _write([comment])
+        except IntegrityError:
+            # Повтор не поможет.
+            logger.exception(
+                'Комментарий к посту %s не записан', comment.post_id)
+        except DatabaseError:
+            failed.append(comment)
+    return saved, failed
+
+
+def _requeue(failed):
+    """Вернуть комментарии в начало очереди; вернуть возвращённые."""
+    retry = []
+    for comment in failed:
+        comment.attempts = getattr(comment, 'attempts', 0) + 1
+        if comment.attempts < MAX_ATTEMPTS:
+            retry.append(comment)
+    if len(retry) < len(failed):
+        logger.error(
+            'Комментарии не записаны за %s попыток: %s шт.',
+            MAX_ATTEMPTS, len(failed) - len(retry))
+    with _lock:
+        _queue[:0] = retry
+    return retry
+
+
+def flush():
+    """Записать очередь в базу; вернуть число записанных комментариев."""
+    with _lock:
+        batch = _queue[:]
+        del _queue[:]
+    if not batch:
+        return 0
+    try:
+        saved, failed = _write(batch), []
+    except IntegrityError:
+        # Одна плохая строка откатила всю пачку.
+        saved, failed = _write_each(batch)
+    except DatabaseError:
+        # База занята: пачка подождёт до следующего раза.
+        logger.exception('Запись комментариев отложена: %s шт.', len(batch))
+        saved, failed = [], batch
+    waiting = {comment.pending_key for comment in _requeue(failed)}
+    # Копии убираются у записанных и у отброшенных комментариев.
+    shared_tier(cache).delete_many([
+        comment.pending_key for comment in batch
+        if comment.pending_key not in waiting
+    ])
+    return len(saved)
+
+
+def _run():
+    while True:
+        _wakeup.wait(settings.COMMENT_FLUSH_SECONDS)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Не удалось записать очередь комментариев')
+        finally:
+            # У потока своё соединение с базой: не оставляем его.
+            connection.close()
+
+
+def _start_flusher():
+    global _flusher
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_run, name='comment-flusher', daemon=True)
+            _flusher.start()
+            atexit.register(flush)
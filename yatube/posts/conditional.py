@@ -0,0 +1,157 @@
+"""Условные GET-запросы (ETag и Last-Modified) для страниц постов.
+
+Валидаторы считаются дешевле, чем страница: для лент — по версиям
+областей кеша (posts.feed_cache), которые меняются при каждой записи
+поста, комментария или подписки; для поста — по ``Post.updated``,
+который обновляется и при записи комментариев, по числу постов автора
+и по комментариям читателя в очереди на запись (posts.comment_queue).
+Если клиент прислал совпадающий ``If-None-Match``, view отвечает
+``304 Not Modified`` без запросов ленты и отрисовки шаблона.
+
+``Last-Modified`` отдаёт только фрагмент комментариев: он зависит лишь
+от ``Post.updated`` и курсора в адресе. Страница поста зависит ещё от
+читателя и счётчиков автора, которые дата не отражает, поэтому
+перепроверяется только по ``ETag``.
+
+Объекты, нужные и валидатору, и view (группа, автор, пост), читаются
+один раз за запрос функциями ``get_*``.
+
+Страницы показывают имя пользователя и кнопки для него, поэтому
+валидаторы учитывают текущего пользователя, а ответы кешируются только
+в браузере и всегда перепроверяются (``Cache-Control: private, no-cache``).
+"""
+import hashlib
+
+from django.shortcuts import get_object_or_404
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from . import comment_queue, feed_cache, suggestions
+from .counters import user_stats
+from .models import Follow, Group, Post, User
+
+
+def make_etag(*parts):
+    return hashlib.md5(
+        ':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _memoize(request, key, load):
+    cache = request.__dict__.setdefault('_conditional_objects', {})
+    if key not in cache:
+        cache[key] = load()
+    return cache[key]
+
+
+def get_group(request, slug):
+    return _memoize(
+        request, ('group', slug),
+        lambda: get_object_or_404(Group, slug=slug))
+
+
+def get_profile(request, username):
+    """Автор со счётчиками и признак подписки текущего пользователя."""
+    def load():
+        author = get_object_or_404(
+            User.objects.select_related('stats'), username=username)
+        following = (
+            request.user.is_authenticated
+            and Follow.objects.filter(
+                user=request.user, author=author).exists()
+        )
+        return author, user_stats(author), following
+    return _memoize(request, ('profile', username), load)
+
+
+def get_post(request, post_id):
+    return _memoize(request, ('post', post_id), lambda: get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id))
+
+
+def get_pending(request, post):
+    """Комментарии текущего пользователя к посту, ждущие записи."""
+    return _memoize(
+        request, ('pending', post.pk),
+        lambda: comment_queue.pending(request.user, post))
+
+
+def get_suggested(request):
+    """``id`` авторов, которых стоит почитать текущему пользователю."""
+    return _memoize(
+        request, ('suggested',),
+        lambda: suggestions.suggested_ids(request.user))
+
+
+def _viewer(request):
+    return request.user.pk or ''
+
+
+def _page(request):
+    return request.GET.get('page', ''), request.GET.get('cursor', '')
+
+
+def conditional(etag_func=None, last_modified_func=None):
+    """``condition`` плюс заголовки, требующие перепроверки страницы."""
+    def decorator(view):
+        view = condition(etag_func, last_modified_func)(view)
+        return cache_control(private=True, no_cache=True)(view)
+    return decorator
+
+
+def index_etag(request):
+    return make_etag(
+        'index', _viewer(request), *_page(request),
+        *feed_cache.versions(feed_cache.INDEX),
+    )
+
+
+def group_etag(request, slug):
+    group = get_group(request, slug)
+    return make_etag(
+        'group', _viewer(request), *_page(request),
+        group.pk, group.title, group.description,
+        *feed_cache.versions(feed_cache.group_scope(group.pk)),
+    )
+
+
+def trending_etag(request):
+    return make_etag(
+        'trending', _viewer(request),
+        *feed_cache.versions(feed_cache.RANKINGS, feed_cache.INDEX),
+    )
+
+
+def popular_groups_etag(request):
+    return make_etag(
+        'groups', _viewer(request),
+        *feed_cache.versions(feed_cache.RANKINGS),
+    )
+
+
+def profile_etag(request, username):
+    author, stats, following = get_profile(request, username)
+    return make_etag(
+        'profile', _viewer(request), *_page(request), author.pk,
+        author.get_full_name(), stats.followers_count, stats.following_count,
+        following, *feed_cache.versions(feed_cache.author_scope(author.pk)),
+        *get_suggested(request),
+    )
+
+
+def post_etag(request, post_id):
+    post = get_post(request, post_id)
+    return make_etag(
+        'post', _viewer(request), post.pk, post.updated,
+        user_stats(post.author).posts_count, request.GET.get('comments', ''),
+        *(comment.created for comment in get_pending(request, post)),
+    )
+
+
+def comments_etag(request, post_id):
+    post = get_post(request, post_id)
+    return make_etag(
+        'comments', post.pk, post.updated, request.GET.get('cursor', ''))
+
+
+def post_last_modified(request, post_id):
+    return get_post(request, post_id).updated
@@ -0,0 +1,153 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются запросами ``UPDATE ... SET n = n + 1`` из сигналов
+моделей (posts.signals), поэтому страницы профиля и поста не выполняют
+агрегирующих запросов. ``rebuild`` пересчитывает все счётчики разом,
+``refresh_users`` и ``refresh_posts`` — только счётчики пачки записей.
+"""
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Comment, Follow, Post, User, UserStats
+
+USER_COUNTERS = ('posts_count', 'followers_count', 'following_count')
+BATCH_SIZE = 500
+
+
+def count_user(user_id):
+    """Посчитать счётчики пользователя агрегирующими запросами."""
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def user_stats(user):
+    """Счётчики пользователя; недостающая строка создаётся пересчётом."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        stats, _ = UserStats.objects.get_or_create(
+            user_id=user.pk, defaults=count_user(user.pk))
+        return stats
+
+
+def change_user_counter(user_id, field, delta):
+    if user_id is None:
+        return
+    updated = UserStats.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta})
+    # Строки ещё нет: при добавлении считаем всё заново (запись уже
+    # сохранена и попадёт в подсчёт), при удалении ничего не делаем —
+    # пользователь может удаляться в той же транзакции.
+    if not updated and delta > 0:
+        _, created = UserStats.objects.get_or_create(
+            user_id=user_id, defaults=count_user(user_id))
+        # Строку успел создать параллельный запрос: его подсчёт нашей
+        # незафиксированной записи не видел, поэтому повторяем сдвиг.
+        if not created:
+            UserStats.objects.filter(user_id=user_id).update(
+                **{field: F(field) + delta})
+
+
+def change_comments_count(post_id, delta):
+    if post_id is None:
+        return
+    # Комментарии — часть страницы поста: тем же запросом сдвигаем дату
+    # изменения поста, по которой view отвечает на условные запросы.
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta, updated=timezone.now())
+
+
+def touch_post(post_id):
+    if post_id is not None:
+        Post.objects.filter(pk=post_id).update(updated=timezone.now())
+
+
+def _grouped(queryset, field):
+    # ``order_by()`` сбрасывает сортировку модели, иначе GROUP BY ломается.
+    return dict(
+        queryset.values_list(field).annotate(total=Count('id')).order_by()
+    )
+
+
+def rebuild(fix=True):
+    """Пересчитать счётчики; вернуть число расхождений по каждому полю."""
+    posts = _grouped(Post.objects.all(), 'author')
+    followers = _grouped(Follow.objects.filter(author__isnull=False), 'author')
+    following = _grouped(Follow.objects.filter(user__isnull=False), 'user')
+    comments = _grouped(Comment.objects.filter(post__isnull=False), 'post')
+
+    mismatches = dict.fromkeys(USER_COUNTERS + ('comments_count',), 0)
+    current = {
+        stats['user_id']: stats
+        for stats in UserStats.objects.values('user_id', *USER_COUNTERS)
+    }
+    to_create, to_update = [], []
+    for user_id in User.objects.values_list('id', flat=True).iterator():
+        expected = {
+            'posts_count': posts.get(user_id, 0),
+            'followers_count': followers.get(user_id, 0),
+            'following_count': following.get(user_id, 0),
+        }
+        stored = current.get(user_id)
+        if stored is None:
+            to_create.append(UserStats(user_id=user_id, **expected))
+            continue
+        wrong = [
+            field for field in USER_COUNTERS
+            if stored[field] != expected[field]
+        ]
+        for field in wrong:
+            mismatches[field] += 1
+        if wrong:
+            to_update.append(UserStats(user_id=user_id, **expected))
+
+    posts_to_update = []
+    for post_id, stored in Post.objects.values_list(
+            'id', 'comments_count').iterator():
+        expected = comments.get(post_id, 0)
+        if stored != expected:
+            mismatches['comments_count'] += 1
+            posts_to_update.append(Post(id=post_id, comments_count=expected))
+
+    if fix:
+        UserStats.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+        UserStats.objects.bulk_update(
+            to_update, USER_COUNTERS, batch_size=BATCH_SIZE)
+        Post.objects.bulk_update(
+            posts_to_update, ['comments_count'], batch_size=BATCH_SIZE)
+    return mismatches, len(to_create)
+
+
+def refresh_users(user_ids):
+    """Пересчитать счётчики пользователей ``user_ids`` (до ``BATCH_SIZE``)."""
+    posts = _grouped(Post.objects.filter(author_id__in=user_ids), 'author')
+    followers = _grouped(
+        Follow.objects.filter(author_id__in=user_ids), 'author')
+    following = _grouped(Follow.objects.filter(user_id__in=user_ids), 'user')
+    existing = set(UserStats.objects.filter(
+        user_id__in=user_ids).values_list('user_id', flat=True))
+    stats = [
+        UserStats(
+            user_id=user_id,
+            posts_count=posts.get(user_id, 0),
+            followers_count=followers.get(user_id, 0),
+            following_count=following.get(user_id, 0),
+        )
+        for user_id in user_ids
+    ]
+    UserStats.objects.bulk_create(
+        [row for row in stats if row.user_id not in existing])
+    UserStats.objects.bulk_update(
+        [row for row in stats if row.user_id in existing], USER_COUNTERS)
+
+
+def refresh_posts(post_ids):
+    """Пересчитать ``comments_count`` постов ``post_ids``."""
+    comments = _grouped(Comment.objects.filter(post_id__in=post_ids), 'post')
+    Post.objects.bulk_update([
+        Post(id=post_id, comments_count=comments.get(post_id, 0))
+        for post_id in post_ids
+    ], ['comments_count'])
@@ -0,0 +1,94 @@
+"""Версионированный кеш фрагментов лент.
+
+Ключ фрагмента включает ленту, её объект (группу, автора, читателя),
+страницу и версии «областей» ленты. Запись поста, комментария или
+подписки увеличивает версии затронутых областей, после чего старые
+фрагменты больше не читаются и вытесняются по таймауту. Поэтому
+таймаут ``FEED_CACHE_TIMEOUT`` можно держать долгим.
+
+Версии читаются и меняются в общем кеше, мимо локального уровня
+двухуровневого кеша: иначе другие процессы увидели бы сброс не сразу.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core.cache import shared_tier
+
+INDEX = 'index'
+# Места в рейтингах (posts.rankings).
+RANKINGS = 'rankings'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def follow_scope(user_id):
+    return f'follow:{user_id}'
+
+
+def _version_key(scope):
+    return f'feed-version:{scope}'
+
+
+def _initial_version():
+    # Версия начинается со времени, а не с единицы: если ключ версии
+    # вытеснят из кеша, новая версия не совпадёт со старыми фрагментами.
+    return int(time.time() * 1000)
+
+
+def versions(*scopes):
+    store = shared_tier(cache)
+    keys = [_version_key(scope) for scope in scopes]
+    stored = store.get_many(keys)
+    result = []
+    for key in keys:
+        if key not in stored:
+            store.add(key, _initial_version(), None)
+            stored[key] = store.get(key)
+        result.append(str(stored[key]))
+    return result
+
+
+def bump(*scopes):
+    """Сменить версии областей после фиксации текущей транзакции."""
+    def apply():
+        store = shared_tier(cache)
+        for scope in scopes:
+            key = _version_key(scope)
+            try:
+                store.incr(key)
+            except ValueError:
+                store.add(key, _initial_version(), None)
+    transaction.on_commit(apply)
+
+
+def post_scopes(post):
+    scopes = [INDEX, author_scope(post.author_id)]
+    if post.group_id:
+        scopes.append(group_scope(post.group_id))
+    return scopes
+
+
+def cache_context(request, feed, scopes, object_id='', per_user=False):
+    """Контекст для ``{% cache feed_cache_timeout feed feed_cache_key %}``."""
+    parts = [
+        feed,
+        str(object_id),
+        request.GET.get('page', ''),
+        request.GET.get('cursor', ''),
+        *versions(*scopes),
+    ]
+    if per_user:
+        parts.append(str(request.user.pk))
+    return {
+        'feed_cache_key': ':'.join(parts),
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+    }
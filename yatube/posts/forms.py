@@ -1,5 +1,9 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
 from .models import Post, Comment
+from .thumbnails import schedule as schedule_thumbnails
+from .uploads import reencode
 
 
 class PostForm(forms.ModelForm):
@@ -10,6 +14,40 @@ class PostForm(forms.ModelForm):
             'image': ('author'),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        # Обработчик загрузки отверг файл по заголовку и не дописал его:
+        # показываем причину вместо ошибки пустого файла.
+        upload = self.files.get(self.add_prefix('image'))
+        error = getattr(upload, 'upload_error', None)
+        if error:
+            self.errors.pop('image', None)
+            cleaned_data.pop('image', None)
+            self.add_error('image', error)
+        return cleaned_data
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            try:
+                return reencode(image)
+            except (OSError, ValueError):
+                raise forms.ValidationError(
+                    'Загрузите правильное изображение.')
+        return image
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        image = self.cleaned_data.get('image')
+        if commit and isinstance(image, UploadedFile):
+            # Пережатый файл уже перенесён в хранилище: закрываем его
+            # сами, иначе временный файл удалится только при сборке мусора.
+            image.close()
+        # Миниатюры готовятся заранее, а не при первом показе страницы.
+        if commit and 'image' in self.changed_data:
+            schedule_thumbnails(post)
+        return post
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
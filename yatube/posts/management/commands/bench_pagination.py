@@ -0,0 +1,88 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from core.paginator import NEXT, CursorPaginator
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает Paginator и CursorPaginator на первой и глубокой '
+        'странице ленты. Тестовые посты создаются внутри транзакции, '
+        'которая в конце откатывается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100_010)
+        parser.add_argument('--per-page', type=int, default=10)
+        parser.add_argument('--page', type=int, default=10_000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['posts'])
+            self.run(options['per_page'], options['page'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, total):
+        missing = total - Post.objects.count()
+        if missing <= 0:
+            return
+        author, _ = User.objects.get_or_create(username='bench_pagination')
+        self.stdout.write(f'Создаём {missing} постов...')
+        Post.objects.bulk_create(
+            [Post(author=author, text=f'Пост {i}') for i in range(missing)]
+        )
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return timings[len(timings) // 2] * 1000
+
+    def run(self, per_page, page, repeat):
+        queryset = Post.objects.all()
+        offset_paginator = Paginator(queryset.order_by('-pub_date'), per_page)
+
+        cursor_paginator = CursorPaginator(queryset, per_page)
+        # Курсор глубокой страницы берётся заранее: пользователь получает
+        # его из ссылки «Следующая» на предыдущей странице.
+        anchor = (
+            queryset.order_by(*cursor_paginator.ordering)
+            [(page - 1) * per_page - 1]
+        )
+        deep_cursor = cursor_paginator.encode_cursor(NEXT, anchor)
+
+        def offset_page(number):
+            # Новый пагинатор на каждый запрос, как во view: COUNT(*)
+            # выполняется заново.
+            paginator = Paginator(offset_paginator.object_list, per_page)
+            return lambda: list(paginator.page(number))
+
+        def cursor_page(cursor):
+            def fetch():
+                paginator = CursorPaginator(queryset, per_page)
+                list(paginator.page(cursor=cursor) if cursor
+                     else paginator.page())
+            return fetch
+
+        rows = (
+            ('Paginator', 1, offset_page(1)),
+            ('Paginator', page, offset_page(page)),
+            ('CursorPaginator', 1, cursor_page(None)),
+            ('CursorPaginator', page, cursor_page(deep_cursor)),
+        )
+        self.stdout.write(f'{"пагинатор":<18}{"страница":>10}{"мс":>10}')
+        for name, number, func in rows:
+            self.stdout.write(
+                f'{name:<18}{number:>10}{self.measure(func, repeat):>10.2f}'
+            )
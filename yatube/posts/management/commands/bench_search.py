@@ -0,0 +1,114 @@
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import SearchResults, fts_enabled, parse_query
+
+User = get_user_model()
+
+SYLLABLES = (
+    'ка ло ми ну ре са то фу ша бе ви го да жи зо ку ле мо не пи ро'.split()
+)
+# Частые, средние и редкие слова словаря для запросов по умолчанию.
+QUERY_RANKS = ((5,), (200,), (5000,), (50, 300))
+
+
+def make_vocabulary():
+    """Словарь из слогов; частота слова обратна его рангу (закон Ципфа)."""
+    return [
+        first + second + third
+        for first in SYLLABLES
+        for second in SYLLABLES
+        for third in SYLLABLES
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает поиск по индексу FTS5 и LIKE-поиск (icontains) на '
+        'большом числе постов. Тестовые посты создаются внутри '
+        'транзакции, которая в конце откатывается.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--query', action='append',
+            help='Запрос; можно указать несколько раз.')
+
+    def handle(self, *args, **options):
+        if not fts_enabled():
+            raise CommandError('Индекс FTS5 доступен только на SQLite.')
+        vocabulary = make_vocabulary()
+        queries = options['query'] or [
+            ' '.join(vocabulary[rank] for rank in ranks)
+            for ranks in QUERY_RANKS
+        ]
+        with transaction.atomic():
+            self.seed(
+                options['posts'], vocabulary, random.Random(options['seed']))
+            self.run(queries, options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, total, vocabulary, rng):
+        missing = total - Post.objects.count()
+        if missing <= 0:
+            return
+        author, _ = User.objects.get_or_create(username='bench_search')
+        self.stdout.write(f'Создаём {missing} постов...')
+        start = time.perf_counter()
+        cum_weights = list(accumulate(
+            1 / rank for rank in range(1, len(vocabulary) + 1)))
+        batch = []
+        for _ in range(missing):
+            text = ' '.join(rng.choices(
+                vocabulary, cum_weights=cum_weights, k=rng.randint(5, 30)))
+            batch.append(Post(author=author, text=text))
+            if len(batch) == 10_000:
+                # Индекс FTS5 заполняют триггеры базы.
+                Post.objects.bulk_create(batch)
+                batch = []
+        Post.objects.bulk_create(batch)
+        self.stdout.write(
+            f'Посты и индекс готовы за {time.perf_counter() - start:.1f} с')
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return timings[len(timings) // 2] * 1000
+
+    def run(self, queries, repeat):
+        def fts_page(terms):
+            def fetch():
+                paginator = Paginator(SearchResults(terms), 10)
+                list(paginator.page(1))
+            return fetch
+
+        def like_page(terms):
+            def fetch():
+                queryset = Post.objects.for_feed()
+                for term in terms:
+                    queryset = queryset.filter(text__icontains=term)
+                list(Paginator(queryset, 10).page(1))
+            return fetch
+
+        self.stdout.write(f'{"запрос":<20}{"FTS5, мс":>12}{"LIKE, мс":>12}')
+        for query in queries:
+            terms = parse_query(query)
+            self.stdout.write(
+                f'{query:<20}'
+                f'{self.measure(fts_page(terms), repeat):>12.2f}'
+                f'{self.measure(like_page(terms), repeat):>12.2f}'
+            )
@@ -0,0 +1,105 @@
+import io
+import multiprocessing
+import resource
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django import forms
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler, TemporaryFileUploadHandler,
+)
+from django.core.management.base import BaseCommand
+from django.http.multipartparser import MultiPartParser
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+
+from posts.uploads import ImageUploadHandler, reencode
+
+
+def default_pipeline(body):
+    """Обработчики Django по умолчанию и проверка ``ImageField``."""
+    handlers = [MemoryFileUploadHandler(), TemporaryFileUploadHandler()]
+    _, files = parse(body, handlers)
+    forms.ImageField().clean(files['image'])
+
+
+def streaming_pipeline(body):
+    """``ImageUploadHandler``, проверка ``ImageField`` и пережатие."""
+    _, files = parse(body, [ImageUploadHandler()])
+    reencode(forms.ImageField().clean(files['image'])).close()
+
+
+PIPELINES = {
+    'default': default_pipeline,
+    'streaming': streaming_pipeline,
+}
+
+
+def parse(body, handlers):
+    meta = {
+        'CONTENT_TYPE': MULTIPART_CONTENT,
+        'CONTENT_LENGTH': str(len(body)),
+    }
+    return MultiPartParser(
+        meta, io.BytesIO(body), handlers, 'utf-8').parse()
+
+
+def run_pipeline(name, body, uploads, queue):
+    # Каждый вариант работает в отдельном процессе, чтобы пик памяти
+    # одного не попадал в замер другого.
+    pipeline = PIPELINES[name]
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=uploads) as executor:
+        list(executor.map(pipeline, [body] * uploads))
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((elapsed, traced_peak, (rss_after - rss_before) * 1024))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пик памяти при параллельной загрузке картинок через '
+        'обработчики Django по умолчанию и через ImageUploadHandler '
+        'с пережатием.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=50)
+        parser.add_argument('--width', type=int, default=1600)
+        parser.add_argument('--height', type=int, default=1200)
+
+    def handle(self, *args, **options):
+        body = self.make_body(options['width'], options['height'])
+        self.stdout.write(
+            f'{options["uploads"]} загрузок по {len(body) / 2 ** 20:.1f} МБ')
+        context = multiprocessing.get_context('fork')
+        for name in PIPELINES:
+            queue = context.Queue()
+            process = context.Process(
+                target=run_pipeline,
+                args=(name, body, options['uploads'], queue),
+            )
+            process.start()
+            elapsed, traced_peak, rss_growth = queue.get()
+            process.join()
+            self.stdout.write(
+                f'{name:>10}: {elapsed:6.2f} с, '
+                f'пик Python {traced_peak / 2 ** 20:7.1f} МБ, '
+                f'рост RSS {rss_growth / 2 ** 20:7.1f} МБ'
+            )
+
+    def make_body(self, width, height):
+        # Шум плохо сжимается: файл получается крупным, как фото с камеры,
+        # но меньше FILE_UPLOAD_MAX_MEMORY_SIZE, и обработчики по умолчанию
+        # держат его в памяти целиком.
+        image = Image.effect_noise((width, height), 64).convert('RGB')
+        content = io.BytesIO()
+        image.save(content, 'JPEG', quality=95)
+        content.seek(0)
+        content.name = 'photo.jpg'
+        return encode_multipart(BOUNDARY, {'text': 'Пост', 'image': content})
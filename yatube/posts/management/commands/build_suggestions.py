@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = (
+        'Считает подсказки «Кого почитать» всем пользователям по графу '
+        'подписок в памяти. Запускайте периодически, например раз в сутки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--memory-mb', type=int,
+            help='Бюджет памяти на граф, по умолчанию '
+                 'SUGGESTIONS_MEMORY_MB.')
+        parser.add_argument(
+            '--batch-size', type=int, default=suggestions.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        self.start = time.perf_counter()
+        progress = self.progress if options['verbosity'] >= 2 else None
+        try:
+            summary = suggestions.build(
+                options['memory_mb'], options['batch_size'], progress)
+        except suggestions.MemoryBudgetExceeded as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - self.start
+        cap = summary['cap'] or 'нет'
+        self.stdout.write(
+            f'Подписок: {summary["edges"]}, граф: '
+            f'{summary["memory_mb"]} МБ, предел соседей: {cap}, '
+            f'за {elapsed:.1f} с.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Подсказки готовы для {summary["suggested"]} пользователей.'))
+
+    def progress(self, written):
+        elapsed = time.perf_counter() - self.start
+        self.stderr.write(f'пользователей: {written} за {elapsed:.1f} с')
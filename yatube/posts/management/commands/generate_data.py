@@ -0,0 +1,65 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import synthetic
+from posts.models import Post
+
+SIZES = ('users', 'groups', 'posts', 'comments', 'follows')
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для нагрузочных тестов: '
+        'подписки по степенному закону, посты сериями, обсуждения под '
+        'постами и картинки. Одинаковые --seed и --end на пустой базе '
+        'дают одинаковые данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(synthetic.SCALES), default='small',
+            help='Готовый набор размеров; отдельные можно переопределить.')
+        for name in SIZES:
+            parser.add_argument(f'--{name}', type=int)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--end', type=datetime.fromisoformat,
+            help='Дата самых свежих записей, например 2024-01-31. По '
+                 'умолчанию сегодняшняя полночь.')
+        parser.add_argument(
+            '--batch-size', type=int, default=synthetic.BATCH_SIZE)
+        parser.add_argument(
+            '--append', action='store_true',
+            help='Добавить к уже существующим постам.')
+
+    def handle(self, *args, **options):
+        if Post.objects.exists() and not options['append']:
+            raise CommandError(
+                'В базе уже есть посты. Данные будут воспроизводимы только '
+                'на пустой базе; чтобы всё равно добавить, укажите --append.')
+        sizes = dict(synthetic.SCALES[options['scale']])
+        sizes.update({
+            name: options[name] for name in SIZES
+            if options[name] is not None
+        })
+        end = options['end']
+        if end is not None and timezone.is_naive(end):
+            end = timezone.make_aware(end)
+
+        self.start = time.perf_counter()
+        progress = self.progress if options['verbosity'] >= 2 else None
+        sample = synthetic.generate(
+            **sizes, seed=options['seed'], end=end,
+            batch_size=options['batch_size'], progress=progress)
+        elapsed = time.perf_counter() - self.start
+        self.stdout.write(
+            f'Готово за {elapsed:.1f} с. Пользователь для входа: '
+            f'{sample["user"].username} / {synthetic.BENCH_PASSWORD}.')
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
+
+    def progress(self, name, count):
+        elapsed = time.perf_counter() - self.start
+        self.stderr.write(f'{name}: {count} за {elapsed:.1f} с')
@@ -0,0 +1,51 @@
+from multiprocessing import get_context
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import generate
+
+
+def _init_worker():
+    # Дочерний процесс не должен пользоваться соединениями родителя.
+    django.setup()
+    connections.close_all()
+
+
+def _generate_chunk(post_ids):
+    for post in Post.objects.filter(pk__in=post_ids):
+        generate(post)
+    return len(post_ids)
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры картинок постов в нескольких процессах.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать и уже готовые миниатюры.',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(thumbnails__isnull=True)
+        post_ids = list(posts.values_list('id', flat=True).distinct())
+        size = options['chunk_size']
+        chunks = [
+            post_ids[start:start + size]
+            for start in range(0, len(post_ids), size)
+        ]
+        connections.close_all()
+        done = 0
+        with get_context().Pool(
+                options['processes'], initializer=_init_worker) as pool:
+            for count in pool.imap_unordered(_generate_chunk, chunks):
+                done += count
+                self.stdout.write(f'{done}/{len(post_ids)}')
+        self.stdout.write(self.style.SUCCESS('Миниатюры готовы.'))
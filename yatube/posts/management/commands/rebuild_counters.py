@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев и подписок. '
+        'С --verify только сообщает о расхождениях.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Не исправлять, а завершиться с ошибкой при расхождениях.',
+        )
+
+    def handle(self, *args, **options):
+        verify = options['verify']
+        with transaction.atomic():
+            mismatches, created = counters.rebuild(fix=not verify)
+        for field, total in mismatches.items():
+            self.stdout.write(f'{field}: расхождений {total}')
+        self.stdout.write(f'строк счётчиков без записи: {created}')
+        if verify and any(mismatches.values()):
+            raise CommandError('Счётчики расходятся с данными.')
+        if not verify:
+            self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
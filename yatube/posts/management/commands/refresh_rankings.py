@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import rankings
+
+
+class Command(BaseCommand):
+    help = (
+        'Учитывает в рейтингах «Популярное» и «Популярные группы» посты, '
+        'комментарии и подписки, появившиеся с прошлого запуска. '
+        'Запускайте периодически, например раз в минуту из cron.'
+    )
+
+    def handle(self, *args, **options):
+        counted = rankings.refresh()
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинги пересчитаны, новых записей: {counted}.'))
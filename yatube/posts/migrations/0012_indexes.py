@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:31
+
+from django.db import migrations, models
+from django.db.models import F, Min
+import django.db.models.expressions
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    # Перед добавлением ограничений убираем повторные подписки и подписки
+    # на самого себя; счётчики затем пересчитывает rebuild_counters.
+    Follow = apps.get_model('posts', 'Follow')
+    Follow.objects.filter(user=F('author')).delete()
+    keep = Follow.objects.values('user', 'author').annotate(
+        first_id=Min('id')).order_by().values('first_id')
+    Follow.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_timeline'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created', 'id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['pub_date', 'id'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', 'pub_date', 'id'], name='post_group_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'pub_date', 'id'], name='post_author_date_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='prevent_self_follow'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostThumbnail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('geometry', models.CharField(max_length=32, verbose_name='Размер')),
+                ('url', models.CharField(max_length=255, verbose_name='Адрес')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='thumbnails', to='posts.Post', verbose_name='Пост')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='postthumbnail',
+            constraint=models.UniqueConstraint(fields=('post', 'geometry'), name='unique_post_thumbnail'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_post_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupRank',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank', serialize=False, to='posts.Group', verbose_name='Группа')),
+                ('heat', models.FloatField(db_index=True, default=0, verbose_name='Активность')),
+                ('place', models.PositiveSmallIntegerField(blank=True, db_index=True, null=True, verbose_name='Место')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostRank',
+            fields=[
+                ('post', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rank', serialize=False, to='posts.Post', verbose_name='Пост')),
+                ('heat', models.FloatField(default=0, verbose_name='Активность')),
+                ('score', models.FloatField(db_index=True, default=0, verbose_name='Оценка')),
+                ('place', models.PositiveSmallIntegerField(blank=True, db_index=True, null=True, verbose_name='Место')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RankingState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('epoch', models.DateTimeField(verbose_name='Начало отсчёта активности')),
+                ('last_post_id', models.PositiveIntegerField(default=0)),
+                ('last_comment_id', models.PositiveIntegerField(default=0)),
+                ('last_follow_id', models.PositiveIntegerField(default=0)),
+                ('refreshed', models.DateTimeField(blank=True, null=True, verbose_name='Пересчитано')),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.utils.timezone
+
+
+def fill_pub_dates(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    TimelineEntry.objects.update(pub_date=Subquery(
+        Post.objects.filter(pk=OuterRef('post_id')).values('pub_date')[:1]))
+    # Лента получила при подписке 200 последних постов автора.
+    Follow.objects.update(timeline_horizon=Subquery(
+        Post.objects.filter(author_id=OuterRef('author_id')).order_by(
+            '-pub_date', '-id').values('pub_date')[200:201]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_rankings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follow',
+            name='timeline_horizon',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='timelineentry',
+            name='pub_date',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Дата публикации'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_pub_dates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', 'pub_date', 'post'], name='timeline_user_date_idx'),
+        ),
+    ]
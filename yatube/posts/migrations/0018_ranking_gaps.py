@@ -0,0 +1,26 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_timeline_pub_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingGap',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16, verbose_name='Вид записи')),
+                ('record_id', models.PositiveIntegerField(verbose_name='Id записи')),
+                ('noticed', models.DateTimeField(verbose_name='Замечен')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='rankinggap',
+            constraint=models.UniqueConstraint(fields=('kind', 'record_id'), name='unique_ranking_gap'),
+        ),
+    ]
@@ -14,6 +14,24 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    # Поля, которые шаблоны лент читают у поста, автора и группы.
+    FEED_FIELDS = (
+        'id', 'text', 'pub_date', 'image', 'author_id', 'group_id',
+        'comments_count',
+        'author__id', 'author__username',
+        'author__first_name', 'author__last_name',
+        'group__id', 'group__title', 'group__slug',
+    )
+
+    def for_feed(self):
+        """Посты для ленты: автор и группа в том же запросе,
+        готовые миниатюры — одним дополнительным запросом."""
+        return self.select_related('author', 'group').only(
+            *self.FEED_FIELDS
+        ).prefetch_related('thumbnails')
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='text',
@@ -44,12 +62,50 @@ class Post(models.Model):
         blank=True
     )
 
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+
+    # Меняется и при записи комментариев поста (posts.counters).
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
+
+    objects = PostQuerySet.as_manager()
+
+    # Счётчики меняются только запросами ``F() + 1`` из posts.counters.
+    COUNTER_FIELDS = ('comments_count',)
+
     def __str__(self):
         # выводим текст поста
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        # При редактировании не перезаписываем счётчики значениями,
+        # прочитанными до сохранения: их могли изменить параллельно.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ['-pub_date']
+        # Ключи курсорной пагинации лент: (pub_date, id) в пределах
+        # всей ленты, группы или автора.
+        indexes = [
+            models.Index(fields=['pub_date', 'id'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['group', 'pub_date', 'id'],
+                name='post_group_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date', 'id'],
+                name='post_author_date_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -83,10 +139,21 @@ class Comment(models.Model):
         auto_now_add=True, verbose_name='Дата публикации комментария'
     )
 
+    updated = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения комментария'
+    )
+
     def __str__(self):
         # выводим текст поста
         return self.text
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -105,3 +172,145 @@ class Follow(models.Model):
         null=True,
         verbose_name='Имя автора',
     )
+    # Дата самого нового поста автора, не попавшего в ленту подписчика
+    # при подписке (posts/timeline.py): этот пост и более старые лента
+    # подтягивает при чтении.
+    timeline_horizon = models.DateTimeField(
+        null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            # Без ограничения параллельные get_or_create в profile_follow
+            # могли создать две одинаковые подписки.
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='prevent_self_follow'),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class TimelineEntry(models.Model):
+    """Пост в ленте подписок пользователя (fan-out-on-write)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    # Копия ``post.pub_date``: страница ленты читается диапазоном индекса
+    # (user, pub_date, post) без сортировки.
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', 'pub_date', 'post'],
+                name='timeline_user_date_idx'),
+        ]
+
+
+class PostThumbnail(models.Model):
+    """Заранее подготовленная миниатюра картинки поста."""
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='thumbnails',
+        verbose_name='Пост',
+    )
+    geometry = models.CharField('Размер', max_length=32)
+    url = models.CharField('Адрес', max_length=255)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['post', 'geometry'], name='unique_post_thumbnail'),
+        ]
+
+    def __str__(self):
+        return self.url
+
+
+class PostRank(models.Model):
+    """Активность поста для раздела «Популярное» (posts.rankings)."""
+
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rank',
+        verbose_name='Пост',
+    )
+    heat = models.FloatField('Активность', default=0)
+    score = models.FloatField('Оценка', default=0, db_index=True)
+    place = models.PositiveSmallIntegerField(
+        'Место', null=True, blank=True, db_index=True)
+
+
+class GroupRank(models.Model):
+    """Активность группы для раздела «Популярные группы»."""
+
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='rank',
+        verbose_name='Группа',
+    )
+    heat = models.FloatField('Активность', default=0, db_index=True)
+    place = models.PositiveSmallIntegerField(
+        'Место', null=True, blank=True, db_index=True)
+
+
+class RankingState(models.Model):
+    """Докуда учтены записи при пересчёте рейтингов (одна строка)."""
+
+    epoch = models.DateTimeField('Начало отсчёта активности')
+    last_post_id = models.PositiveIntegerField(default=0)
+    last_comment_id = models.PositiveIntegerField(default=0)
+    last_follow_id = models.PositiveIntegerField(default=0)
+    refreshed = models.DateTimeField('Пересчитано', null=True, blank=True)
+
+
+class RankingGap(models.Model):
+    """Пропуск в id, который пересчёт рейтингов проверит снова."""
+
+    kind = models.CharField('Вид записи', max_length=16)
+    record_id = models.PositiveIntegerField('Id записи')
+    noticed = models.DateTimeField('Замечен')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'record_id'], name='unique_ranking_gap'),
+        ]
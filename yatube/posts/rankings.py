@@ -0,0 +1,233 @@
+"""Рейтинги «Популярное» и «Популярные группы».
+
+Активность поста — комментарии и сам пост, каждый с весом, который
+затухает вдвое за ``TRENDING_HALF_LIFE`` часов. Затухание общее для
+всех, поэтому хранится не текущий вес, а вес относительно начала отсчёта
+``RankingState.epoch``: запись в момент ``t`` добавляет
+``exp((t - epoch) / tau)`` и больше не пересчитывается (forward decay).
+Порядок постов от общего множителя не зависит. Оценка поста —
+активность, умноженная на ``1 + TRENDING_FOLLOWER_WEIGHT * lg(1 +
+подписчики автора)``; активность группы — сумма по её постам.
+
+``refresh`` читает только записи с ``id`` больше учтённых в прошлый
+раз: новые посты и комментарии добавляют активность, новые подписки
+пересчитывают оценки постов автора. id, которых при пересчёте ещё нет
+(транзакция выдала id, но не зафиксирована), хранятся в ``RankingGap``
+и проверяются снова в течение ``GAP_TIMEOUT``; найденная запись
+учитывается один раз. Импорт с явными id ниже учтённых пересчёт не
+увидит, поэтому после него рейтинги строятся заново (``rebuild``) по
+записям за время затухания. Удаления активность не убавляют, отписки
+учитываются при следующей активности автора. Когда веса вырастают
+слишком сильно, они делятся на общий множитель, а строки с затухшей
+активностью удаляются, так что таблицы остаются маленькими.
+
+Места первых ``TRENDING_SIZE`` постов и ``POPULAR_GROUPS_SIZE`` групп
+хранятся в ``place``: страницы читают их по индексу, и цена запроса не
+зависит от объёма данных. Пересчёт запускает команда
+``refresh_rankings`` (например, раз в минуту из cron).
+"""
+import math
+from collections import Counter
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from . import bulk, feed_cache
+from .models import (
+    Comment, Follow, GroupRank, Post, PostRank, RankingGap, RankingState,
+)
+
+BATCH_SIZE = 500
+# Активность ниже этой (в затухших комментариях) не учитывается.
+MIN_HEAT = 0.01
+# Через сколько периодов затухания веса приводятся к новому началу.
+RENORMALIZE_AFTER = 30
+# Сколько ждать незафиксированную запись с пропущенным id.
+GAP_TIMEOUT = timedelta(minutes=10)
+
+
+def _tau():
+    return settings.TRENDING_HALF_LIFE * 3600 / math.log(2)
+
+
+def _weight(moment, epoch, tau):
+    return math.exp((moment - epoch).total_seconds() / tau)
+
+
+def _follower_boost(followers):
+    return 1 + settings.TRENDING_FOLLOWER_WEIGHT * math.log10(1 + followers)
+
+
+def _renormalize(state, now, tau):
+    factor = 1 / _weight(now, state.epoch, tau)
+    PostRank.objects.update(heat=F('heat') * factor, score=F('score') * factor)
+    GroupRank.objects.update(heat=F('heat') * factor)
+    PostRank.objects.filter(heat__lt=MIN_HEAT).delete()
+    GroupRank.objects.filter(heat__lt=MIN_HEAT).delete()
+    state.epoch = now
+
+
+def _missing_ids(queryset, last_id, newest):
+    """id из ``(last_id, newest]``, которых в ``queryset`` нет."""
+    ids = queryset.filter(id__gt=last_id, id__lte=newest)
+    if ids.count() == newest - last_id:
+        return []
+    missing, expected = [], last_id + 1
+    for pk in ids.order_by('id').values_list('id', flat=True).iterator():
+        missing.extend(range(expected, pk))
+        expected = pk + 1
+    return missing
+
+
+def _new_rows(queryset, kind, last_id, now, first=False):
+    """Записи с ``id`` больше ``last_id`` или из пропусков; новый ``last_id``.
+
+    При первом пересчёте (``first``) читаются все записи, и пропуски
+    среди них — давно удалённые записи, а не незафиксированные.
+    """
+    newest = queryset.aggregate(newest=Max('id'))['newest'] or last_id
+    gaps = RankingGap.objects.filter(kind=kind)
+    gaps.filter(noticed__lt=now - GAP_TIMEOUT).delete()
+    found = list(queryset.filter(
+        id__in=gaps.values('record_id')).values_list('id', flat=True))
+    gaps.filter(record_id__in=found).delete()
+    missing = [] if first else _missing_ids(queryset, last_id, newest)
+    RankingGap.objects.bulk_create(
+        [RankingGap(kind=kind, record_id=pk, noticed=now) for pk in missing],
+        batch_size=BATCH_SIZE)
+
+    # Пропуски исключаются явно: запись, зафиксированная после поиска
+    # пропусков, будет учтена при следующем пересчёте, а не дважды.
+    condition = Q(id__gt=last_id, id__lte=newest)
+    if missing:
+        condition &= ~Q(id__in=gaps.filter(
+            record_id__gt=last_id).values('record_id'))
+    if found:
+        condition |= Q(id__in=found)
+    return queryset.filter(condition).order_by(), newest
+
+
+def _add_heat(post_heat, authors):
+    """Прибавить активность постам и пересчитать их оценки."""
+    rows = {}
+    for ids in bulk.chunked(post_heat, BATCH_SIZE):
+        rows.update(PostRank.objects.in_bulk(ids))
+    for author_ids in bulk.chunked(authors, BATCH_SIZE):
+        ranked = PostRank.objects.filter(post__author_id__in=author_ids)
+        for row in ranked:
+            rows.setdefault(row.pk, row)
+
+    created = []
+    for post_id, heat in post_heat.items():
+        if post_id in rows:
+            rows[post_id].heat += heat
+        else:
+            created.append(PostRank(post_id=post_id, heat=heat))
+    for chunk in bulk.chunked(list(rows.values()) + created, BATCH_SIZE):
+        followers = dict(Post.objects.filter(
+            pk__in=[row.post_id for row in chunk],
+        ).values_list('id', 'author__stats__followers_count'))
+        for row in chunk:
+            row.score = row.heat * _follower_boost(
+                followers.get(row.post_id) or 0)
+    PostRank.objects.bulk_update(
+        rows.values(), ['heat', 'score'], batch_size=BATCH_SIZE)
+    PostRank.objects.bulk_create(created, batch_size=BATCH_SIZE)
+
+
+def _add_group_heat(group_heat):
+    rows = {}
+    for ids in bulk.chunked(group_heat, BATCH_SIZE):
+        rows.update(GroupRank.objects.in_bulk(ids))
+    created = []
+    for group_id, heat in group_heat.items():
+        if group_id in rows:
+            rows[group_id].heat += heat
+        else:
+            created.append(GroupRank(group_id=group_id, heat=heat))
+    GroupRank.objects.bulk_update(
+        rows.values(), ['heat'], batch_size=BATCH_SIZE)
+    GroupRank.objects.bulk_create(created, batch_size=BATCH_SIZE)
+
+
+def _place(model, order, size):
+    model.objects.filter(place__isnull=False).update(place=None)
+    top = list(model.objects.order_by(order, '-pk')[:size])
+    for place, row in enumerate(top, 1):
+        row.place = place
+    model.objects.bulk_update(top, ['place'])
+
+
+def refresh(now=None):
+    """Учесть новые записи и пересчитать места; вернуть число записей."""
+    now = now or timezone.now()
+    tau = _tau()
+    with transaction.atomic():
+        state, first = RankingState.objects.get_or_create(
+            pk=1, defaults={'epoch': now})
+        renormalized = (
+            (now - state.epoch).total_seconds() > RENORMALIZE_AFTER * tau)
+        if renormalized:
+            _renormalize(state, now, tau)
+        # Более старые записи затухли бы ниже MIN_HEAT.
+        horizon = now - timedelta(seconds=tau * math.log(1 / MIN_HEAT))
+
+        post_heat, group_heat = Counter(), Counter()
+        posts, state.last_post_id = _new_rows(
+            Post.objects.all(), 'post', state.last_post_id, now, first)
+        comments, state.last_comment_id = _new_rows(
+            Comment.objects.all(), 'comment', state.last_comment_id, now,
+            first)
+        follows, state.last_follow_id = _new_rows(
+            Follow.objects.all(), 'follow', state.last_follow_id, now,
+            first)
+        records = chain(
+            posts.filter(pub_date__gte=horizon).values_list(
+                'id', 'group_id', 'pub_date').iterator(),
+            comments.filter(
+                created__gte=horizon, post__isnull=False,
+            ).values_list('post_id', 'post__group_id', 'created').iterator(),
+        )
+        counted = 0
+        for counted, (post_id, group_id, moment) in enumerate(records, 1):
+            weight = _weight(min(moment, now), state.epoch, tau)
+            post_heat[post_id] += weight
+            if group_id is not None:
+                group_heat[group_id] += weight
+        authors = set(follows.values_list('author_id', flat=True))
+        authors.discard(None)
+
+        _add_heat(post_heat, authors)
+        _add_group_heat(group_heat)
+        if post_heat or group_heat or authors or renormalized:
+            _place(PostRank, '-score', settings.TRENDING_SIZE)
+            _place(GroupRank, '-heat', settings.POPULAR_GROUPS_SIZE)
+            feed_cache.bump(feed_cache.RANKINGS)
+        state.refreshed = now
+        state.save()
+    return counted
+
+
+def rebuild(now=None):
+    """Построить рейтинги заново; вернуть число учтённых записей."""
+    with transaction.atomic():
+        for model in (PostRank, GroupRank, RankingGap, RankingState):
+            model.objects.all().delete()
+        return refresh(now)
+
+
+def behind(since):
+    """Записал ли импорт id не больше уже учтённых пересчётом.
+
+    ``since`` — наименьшие id импорта по видам (``bulk.Importer.since``).
+    """
+    state = RankingState.objects.filter(pk=1).first()
+    return state is not None and (
+        since['post'] <= state.last_post_id
+        or since['comment'] <= state.last_comment_id
+        or since['follow'] <= state.last_follow_id
+    )
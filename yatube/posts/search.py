@@ -0,0 +1,174 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite посты индексируются в виртуальной таблице FTS5
+``posts_post_fts`` (миграция 0014). Она хранит только инвертированный
+индекс, а текст читает из ``posts_post``. Триггеры базы обновляют индекс
+при любой записи в ``posts_post``, в том числе при ``bulk_create`` и
+``QuerySet.delete()``, которые не отправляют сигналы моделей. SQLite
+удаляет триггеры, когда миграция пересоздаёт ``posts_post``, поэтому
+после каждой миграции ``ensure_triggers`` возвращает их и перестраивает
+индекс. Результаты сортируются по релевантности (BM25). На других базах
+поиск сводится к ``icontains`` по словам запроса.
+"""
+import re
+
+from django.db import connection, connections
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+MAX_TERMS = 8
+
+TERM_RE = re.compile(r'\w+')
+
+TRIGGERS = {
+    'posts_post_fts_insert': f"""
+        CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post
+        BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+    'posts_post_fts_delete': f"""
+        CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END""",
+    'posts_post_fts_update': f"""
+        CREATE TRIGGER posts_post_fts_update
+        AFTER UPDATE OF text ON posts_post
+        BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END""",
+}
+
+
+def fts_enabled():
+    """Есть ли индекс FTS5; список таблиц читается раз на соединение."""
+    enabled = getattr(connection, 'fts_enabled', None)
+    if enabled is None:
+        enabled = connection.fts_enabled = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return enabled
+
+
+def forget_fts(sender, connection, **kwargs):
+    """Проверить индекс заново на новом соединении (connection_created)."""
+    connection.fts_enabled = None
+
+
+def ensure_triggers(using='default', **kwargs):
+    """Вернуть триггеры индекса, удалённые миграцией (post_migrate)."""
+    db = connections[using]
+    # Миграция могла создать или удалить таблицу индекса.
+    db.fts_enabled = None
+    if db.vendor != 'sqlite':
+        return
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, type FROM sqlite_master "
+            "WHERE name = %s OR type = 'trigger'",
+            [FTS_TABLE],
+        )
+        existing = {name for name, _ in cursor.fetchall()}
+        if FTS_TABLE not in existing:
+            return
+        missing = [name for name in TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(TRIGGERS[name])
+        if missing:
+            # Пока триггеров не было, индекс мог разойтись с постами.
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def parse_query(query):
+    """Слова запроса без операторов FTS5, не больше ``MAX_TERMS``."""
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def match_expression(terms):
+    # Каждое слово берётся в кавычки, чтобы пользователь не мог написать
+    # оператор FTS5; последнее слово ищется как префикс.
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+class SearchResults:
+    """Найденные посты в порядке релевантности.
+
+    Поддерживает ``count()`` и срезы, поэтому подходит для ``Paginator``:
+    срез выбирает идентификаторы из индекса, а посты страницы читаются
+    одним запросом.
+    """
+
+    def __init__(self, terms):
+        self.match = match_expression(terms)
+        self.queryset = Post.objects.for_feed()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT count(*) FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s',
+                    [self.match],
+                )
+                self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def ids(self, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY rank LIMIT %s OFFSET %s',
+                [self.match, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        offset = index.start or 0
+        limit = -1 if index.stop is None else max(index.stop - offset, 0)
+        ids = self.ids(offset, limit)
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search(query):
+    """Посты, подходящие под запрос; пустой запрос ничего не находит."""
+    terms = parse_query(query)
+    if not terms:
+        return Post.objects.none()
+    if fts_enabled():
+        return SearchResults(terms)
+    queryset = Post.objects.for_feed()
+    for term in terms:
+        queryset = queryset.filter(text__icontains=term)
+    return queryset
+
+
+def filter_queryset(queryset, query):
+    """Ограничить ``queryset`` постами, найденными по запросу."""
+    terms = parse_query(query)
+    if not terms or not fts_enabled():
+        return None
+    # Не ``pk__in=RawSQL(...)``: Django берёт такой подзапрос в двойные
+    # скобки, и SQLite возвращает из него только первую строку.
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    return queryset.extra(
+        where=[
+            f'{table}.id IN (SELECT rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        ],
+        params=[match_expression(terms)],
+    )
@@ -0,0 +1,71 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feed_cache, suggestions, timeline
+from .models import Comment, Follow, Post
+
+
+@receiver(pre_save, sender=Post)
+def post_group_changing(sender, instance, **kwargs):
+    # Пост, перенесённый в другую группу, должен исчезнуть из ленты
+    # прежней группы.
+    if instance.pk is None or instance._state.adding:
+        return
+    old_group_id = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', flat=True).first()
+    if old_group_id and old_group_id != instance.group_id:
+        feed_cache.bump(feed_cache.group_scope(old_group_id))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counter(instance.author_id, 'posts_count', 1)
+        timeline.fan_out(instance)
+    feed_cache.bump(*feed_cache.post_scopes(instance))
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.change_user_counter(instance.author_id, 'posts_count', -1)
+    feed_cache.bump(*feed_cache.post_scopes(instance))
+
+
+def comment_changed(comment):
+    # Ленты показывают число комментариев поста.
+    if comment.post_id is not None:
+        feed_cache.bump(*feed_cache.post_scopes(comment.post))
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+        comment_changed(instance)
+    else:
+        counters.touch_post(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+    comment_changed(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_counter(instance.user_id, 'following_count', 1)
+        counters.change_user_counter(instance.author_id, 'followers_count', 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+        feed_cache.bump(feed_cache.follow_scope(instance.user_id))
+        suggestions.followed(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_user_counter(instance.user_id, 'following_count', -1)
+    counters.change_user_counter(instance.author_id, 'followers_count', -1)
+    timeline.trim(instance.user_id, instance.author_id)
+    feed_cache.bump(feed_cache.follow_scope(instance.user_id))
+    suggestions.unfollowed(instance.user_id, instance.author_id)
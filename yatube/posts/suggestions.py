@@ -0,0 +1,275 @@
+"""«Кого почитать»: подсказки авторов по графу подписок.
+
+Кандидат получает ``FRIEND_WEIGHT`` очков за каждого читаемого автора,
+который сам на него подписан (друзья друзей), и очко за каждого
+читателя тех же авторов, который на него подписан (совместные
+подписки). Уже читаемые авторы и сам пользователь отбрасываются.
+
+Подсказки всем пользователям считает команда ``build_suggestions``
+(например, раз в сутки). Граф держится в памяти в CSR-массивах
+``array('i')``: соседи узла ``u`` — ``targets[offsets[u]:offsets[u + 1]]``,
+узел — ``id`` пользователя, по 4 байта на подписку в каждую сторону.
+Подписки читаются пачками по ``id`` в два прохода (степени, затем
+соседи), так что ORM-объекты не создаются и память не зависит от числа
+пачек. Если массивы не помещаются в ``SUGGESTIONS_MEMORY_MB``, у узлов
+с большой степенью хранятся только первые соседи — столько, чтобы
+уложиться в бюджет.
+
+Результаты лежат в общем кеше по ключу пользователя. Подписка и
+отписка сразу правят подсказки пользователя по подпискам автора
+(друзья друзей); совместные подписки обновит следующий расчёт.
+Пользователям без подписок показываются самые читаемые авторы.
+"""
+import heapq
+from array import array
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+
+from core.cache import shared_tier
+
+from .models import Follow, User
+
+BATCH_SIZE = 10_000
+# Сколько подсказок хранится на пользователя.
+SIZE = 20
+# Сколько читаемых авторов, их подписок и их читателей учитывается.
+SEEDS = 50
+FANOUT = 200
+SAMPLE = 20
+# Очки за друга друга; совместная подписка — одно очко.
+FRIEND_WEIGHT = 2
+# Байт на узел: степени и смещения в обе стороны, курсоры заполнения.
+NODE_BYTES = 6 * array('i').itemsize
+EDGE_BYTES = array('i').itemsize
+
+POPULAR_KEY = 'suggestions:popular'
+
+
+class MemoryBudgetExceeded(ValueError):
+    """Граф не помещается в бюджет памяти даже по соседу на узел."""
+
+
+def _key(user_id):
+    return f'suggestions:{user_id}'
+
+
+class Adjacency:
+    """Списки соседей всех узлов в двух массивах (CSR)."""
+
+    def __init__(self, offsets, targets):
+        self.offsets = offsets
+        self.targets = targets
+
+    def neighbours(self, node, limit=None):
+        start, end = self.offsets[node], self.offsets[node + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.targets[start:end]
+
+    @property
+    def nbytes(self):
+        return (len(self.offsets) * self.offsets.itemsize
+                + len(self.targets) * self.targets.itemsize)
+
+
+def _zeros(size):
+    return array('i', [0]) * size
+
+
+def _edges(batch_size):
+    """Подписки пачками ``(подписчик, автор)`` по возрастанию ``id``."""
+    last_id = 0
+    while True:
+        batch = list(Follow.objects.filter(
+            id__gt=last_id, user__isnull=False, author__isnull=False,
+        ).order_by('id').values_list('id', 'user_id', 'author_id')[
+            :batch_size])
+        if not batch:
+            return
+        last_id = batch[-1][0]
+        yield batch
+
+
+def _stored_edges(degrees, cap):
+    if cap is None:
+        return sum(degrees)
+    return sum(min(degree, cap) for degree in degrees)
+
+
+def degree_cap(out_degrees, in_degrees, budget_edges):
+    """Наибольшая степень узла, при которой рёбра влезают в бюджет."""
+    if sum(out_degrees) + sum(in_degrees) <= budget_edges:
+        return None
+    low, high = 0, max(max(out_degrees), max(in_degrees))
+    while low < high:
+        cap = (low + high + 1) // 2
+        stored = (_stored_edges(out_degrees, cap)
+                  + _stored_edges(in_degrees, cap))
+        if stored <= budget_edges:
+            low = cap
+        else:
+            high = cap - 1
+    if low == 0:
+        raise MemoryBudgetExceeded(
+            'Графу подписок не хватает памяти: увеличьте '
+            'SUGGESTIONS_MEMORY_MB.')
+    return low
+
+
+def _offsets(degrees, cap):
+    offsets = _zeros(len(degrees) + 1)
+    total = 0
+    for node, degree in enumerate(degrees):
+        total += degree if cap is None else min(degree, cap)
+        offsets[node + 1] = total
+    return offsets
+
+
+def load_graph(memory_mb=None, batch_size=BATCH_SIZE):
+    """Подписки и читатели всех пользователей; вернуть их и сводку."""
+    if memory_mb is None:
+        memory_mb = settings.SUGGESTIONS_MEMORY_MB
+    budget = memory_mb * 1024 * 1024
+    size = (User.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    budget_edges = (budget - size * NODE_BYTES) // EDGE_BYTES
+    if budget_edges < 0:
+        raise MemoryBudgetExceeded(
+            'Пользователям не хватает памяти: увеличьте '
+            'SUGGESTIONS_MEMORY_MB.')
+
+    out_degrees, in_degrees = _zeros(size), _zeros(size)
+    edges = 0
+    for batch in _edges(batch_size):
+        for _, user_id, author_id in batch:
+            out_degrees[user_id] += 1
+            in_degrees[author_id] += 1
+        edges += len(batch)
+    cap = degree_cap(out_degrees, in_degrees, budget_edges)
+    popular = heapq.nlargest(
+        SIZE, (node for node in range(size) if in_degrees[node]),
+        key=lambda node: (in_degrees[node], -node))
+    popular = [[node, in_degrees[node]] for node in popular]
+
+    following = Adjacency(
+        _offsets(out_degrees, cap), _zeros(_stored_edges(out_degrees, cap)))
+    readers = Adjacency(
+        _offsets(in_degrees, cap), _zeros(_stored_edges(in_degrees, cap)))
+    out_cursor = array('i', following.offsets[:-1])
+    in_cursor = array('i', readers.offsets[:-1])
+    for batch in _edges(batch_size):
+        for _, user_id, author_id in batch:
+            position = out_cursor[user_id]
+            if position < following.offsets[user_id + 1]:
+                following.targets[position] = author_id
+                out_cursor[user_id] = position + 1
+            position = in_cursor[author_id]
+            if position < readers.offsets[author_id + 1]:
+                readers.targets[position] = user_id
+                in_cursor[author_id] = position + 1
+    summary = {
+        'users': size - 1, 'edges': edges, 'cap': cap,
+        'memory_mb': round(
+            (following.nbytes + readers.nbytes + size * NODE_BYTES)
+            / 1024 / 1024, 1),
+        'popular': popular,
+    }
+    return following, readers, summary
+
+
+def suggest(following, readers, user_id):
+    """Подсказки пользователю: ``[[id автора, очки], ...]``."""
+    followed = following.neighbours(user_id)
+    # Все кандидаты копятся в одном массиве, по копии на очко, и
+    # считаются одним ``Counter.update`` на C.
+    pool = array('i')
+    for author_id in followed[:SEEDS]:
+        friends = following.neighbours(author_id, FANOUT)
+        for _ in range(FRIEND_WEIGHT):
+            pool.extend(friends)
+        for reader in readers.neighbours(author_id, SAMPLE):
+            if reader != user_id:
+                pool.extend(following.neighbours(reader, SAMPLE))
+    scores = Counter(pool)
+    for node in (user_id, *followed):
+        scores.pop(node, None)
+    best = heapq.nlargest(
+        SIZE, scores.items(), key=lambda item: (item[1], -item[0]))
+    return [[node, score] for node, score in best]
+
+
+def build(memory_mb=None, batch_size=BATCH_SIZE, progress=None):
+    """Посчитать подсказки всем читателям; вернуть сводку."""
+    following, readers, summary = load_graph(memory_mb, batch_size)
+    store = shared_tier(cache)
+    timeout = settings.SUGGESTIONS_TIMEOUT
+    store.set(POPULAR_KEY, summary.pop('popular'), timeout)
+    results, written = {}, 0
+    for user_id in range(len(following.offsets) - 1):
+        if following.offsets[user_id] == following.offsets[user_id + 1]:
+            continue
+        entries = suggest(following, readers, user_id)
+        if entries:
+            results[_key(user_id)] = entries
+        if len(results) >= batch_size:
+            store.set_many(results, timeout)
+            written += len(results)
+            results = {}
+            if progress:
+                progress(written)
+    store.set_many(results, timeout)
+    summary['suggested'] = written + len(results)
+    return summary
+
+
+def _shift(user_id, author_id, delta):
+    if user_id is None or author_id is None:
+        return
+    store = shared_tier(cache)
+    key = _key(user_id)
+    scores = dict(store.get(key) or [])
+    scores.pop(author_id, None)
+    candidates = Follow.objects.filter(
+        user_id=author_id, author__isnull=False,
+    ).values_list('author_id', flat=True)[:FANOUT]
+    for candidate in candidates:
+        if candidate != user_id:
+            scores[candidate] = scores.get(candidate, 0) + delta
+    best = heapq.nlargest(
+        SIZE, ((node, score) for node, score in scores.items() if score > 0),
+        key=lambda item: (item[1], -item[0]))
+    store.set(
+        key, [[node, score] for node, score in best],
+        settings.SUGGESTIONS_TIMEOUT)
+
+
+def followed(user_id, author_id):
+    """Пользователь подписался: добавить подписки автора."""
+    _shift(user_id, author_id, FRIEND_WEIGHT)
+
+
+def unfollowed(user_id, author_id):
+    """Пользователь отписался: убрать очки за подписки автора."""
+    _shift(user_id, author_id, -FRIEND_WEIGHT)
+
+
+def suggested_ids(user):
+    """``id`` подсказанных авторов из кеша, лучшие первыми."""
+    if not user.is_authenticated:
+        return []
+    store = shared_tier(cache)
+    entries = store.get(_key(user.pk)) or store.get(POPULAR_KEY) or []
+    return [node for node, _ in entries if node != user.pk]
+
+
+def suggested_users(user, ids, limit=None):
+    """Подсказанные авторы, которых ``user`` ещё не читает."""
+    if not ids:
+        return []
+    users = User.objects.filter(pk__in=ids).exclude(
+        following__user=user).select_related('stats')
+    order = {node: place for place, node in enumerate(ids)}
+    users = sorted(users, key=lambda suggested: order[suggested.pk])
+    return users[:limit or settings.SUGGESTIONS_SHOWN]
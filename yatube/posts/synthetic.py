@@ -0,0 +1,310 @@
+"""Синтетические данные для нагрузочных тестов.
+
+Распределения похожи на настоящую соцсеть:
+
+* подписки — степенной закон: авторы ранжированы по популярности, доля
+  подписчиков падает как ``1 / rank ** POPULARITY_EXPONENT``, а сколько
+  авторов читает пользователь, задаёт распределение Парето;
+* посты пишутся сериями: автор публикует несколько постов подряд с
+  паузами в минуты, чаще днём и вечером, чем ночью; активнее пишут
+  популярные авторы;
+* комментарии — обсуждения под постом: число комментариев с тяжёлым
+  хвостом, несколько участников и ответы автора поста вскоре после
+  публикации;
+* часть постов с картинками разных пропорций и готовыми миниатюрами.
+
+Записи создаются потоком через ``bulk_create`` с явными id пачками по
+``batch_size``: в памяти держится одна пачка, так что объём ограничен
+только базой. Сигналы моделей не срабатывают; счётчики, ленты подписок и
+версии кеша пересчитываются в конце, как после импорта.
+
+Одинаковые ``seed``, размеры и ``end`` на пустой базе дают одинаковые
+данные: случайность идёт только из ``random.Random(seed)`` и Faker с тем
+же зерном.
+"""
+import io
+import random
+import re
+from datetime import timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from . import bulk, feed_cache, thumbnails
+from .models import Comment, Follow, Group, Post, PostThumbnail, User
+
+SCALES = {
+    'small': {'users': 200, 'groups': 10, 'posts': 2_000,
+              'comments': 5_000, 'follows': 3_000},
+    'medium': {'users': 5_000, 'groups': 50, 'posts': 100_000,
+               'comments': 300_000, 'follows': 100_000},
+    'large': {'users': 50_000, 'groups': 200, 'posts': 1_000_000,
+              'comments': 3_000_000, 'follows': 1_000_000},
+    'huge': {'users': 500_000, 'groups': 1_000, 'posts': 10_000_000,
+             'comments': 30_000_000, 'follows': 10_000_000},
+}
+
+# Пользователь с известным паролем: под ним ходят нагрузочные тесты.
+BENCH_USERNAME = 'bench'
+BENCH_PASSWORD = 'bench-password'
+# Сколько авторов читает bench: его лента не должна быть пустой.
+BENCH_FOLLOWING = 20
+
+PERIOD = timedelta(days=365)
+BATCH_SIZE = 2000
+
+# Подписки.
+POPULARITY_EXPONENT = 1.1
+FOLLOWING_SHAPE = 1.5
+MAX_FOLLOWING = 5000
+
+# Посты: серии в среднем по BURST_SIZE постов с паузами BURST_GAP
+# минут; доля постов в группах и с картинками.
+ACTIVITY_EXPONENT = 0.8
+BURST_SIZE = 4
+BURST_GAP = 20
+GROUP_SHARE = 0.6
+IMAGE_SHARE = 0.3
+IMAGE_SIZES = ((1200, 800), (800, 1200), (1600, 1600), (640, 480))
+IMAGE_COUNT = 8
+# Относительная активность по часам суток.
+HOUR_WEIGHTS = (
+    2, 1, 1, 1, 1, 1, 2, 4, 6, 6, 5, 5,
+    6, 6, 5, 5, 6, 7, 9, 10, 10, 9, 6, 4,
+)
+
+# Обсуждения: размер — Парето с показателем THREAD_SHAPE, паузы между
+# комментариями в среднем REPLY_GAP минут.
+THREAD_SHAPE = 1.5
+MAX_THREAD = 1000
+REPLY_GAP = 45
+AUTHOR_REPLY_SHARE = 0.3
+
+# Размеры словарей Faker: тексты и имена собираются из них, чтобы не
+# вызывать Faker на каждую из миллионов записей.
+SENTENCES = 2000
+NAMES = 1000
+
+
+def _next_id(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+def _zipf(count, exponent):
+    """Накопленные веса рангов 1..count для ``random.choices``."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+class Vocabulary:
+    def __init__(self, seed):
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.sentences = [fake.sentence() for _ in range(SENTENCES)]
+        self.names = [fake.user_name() for _ in range(NAMES)]
+        self.titles = [fake.catch_phrase() for _ in range(NAMES)]
+
+    def text(self, rnd, low, high):
+        return ' '.join(rnd.choices(self.sentences, k=rnd.randint(low, high)))
+
+
+def _images(rnd, seed):
+    """Несколько JPEG в хранилище; посты делят их между собой."""
+    names = []
+    for number in range(IMAGE_COUNT):
+        color = tuple(rnd.randrange(256) for _ in range(3))
+        size = rnd.choice(IMAGE_SIZES)
+        name = f'posts/synthetic_{seed}_{number}.jpg'
+        # С тем же зерном картинка та же: повторный запуск её не плодит.
+        if not default_storage.exists(name):
+            buffer = io.BytesIO()
+            Image.new('RGB', size, color).save(buffer, 'JPEG')
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+        names.append(name)
+    return names
+
+
+def _following(rnd, people, popularity, total, bench_id):
+    """Пары (читатель, автор): авторы выбираются по популярности."""
+    limit = min(MAX_FOLLOWING, len(people) // 2)
+    degrees = [rnd.paretovariate(FOLLOWING_SHAPE) for _ in people]
+    scale = total / sum(degrees)
+    for user, degree in zip(people, degrees):
+        wanted = min(limit, round(degree * scale))
+        if user == bench_id:
+            wanted = max(wanted, min(limit, BENCH_FOLLOWING))
+        chosen = set()
+        while len(chosen) < wanted:
+            chosen.update(rnd.choices(
+                people, cum_weights=popularity, k=wanted - len(chosen)))
+            chosen.discard(user)
+        yield from ((user, author) for author in sorted(chosen))
+
+
+def _bursts(rnd, people, activity, groups, end, total, bench_id):
+    """(автор, группа, время) постов сериями; первая серия — bench."""
+    hours = list(accumulate(HOUR_WEIGHTS))
+    made = 0
+    while made < total:
+        author = rnd.choices(people, cum_weights=activity)[0]
+        if not made:
+            author = bench_id
+        group = rnd.choice(groups) if rnd.random() < GROUP_SHARE else None
+        hour = rnd.choices(range(24), cum_weights=hours)[0]
+        moment = end - timedelta(
+            days=rnd.randrange(1, PERIOD.days + 1),
+            hours=-hour, minutes=-60 * rnd.random())
+        size = 1 + int(rnd.expovariate(1 / (BURST_SIZE - 1)))
+        for _ in range(min(size, total - made)):
+            yield author, group, moment
+            moment = min(
+                end, moment + timedelta(
+                    minutes=rnd.expovariate(1 / BURST_GAP)))
+            made += 1
+
+
+def _thread_size(rnd, mean):
+    # Среднее (X - 1) для Парето равно 1 / (shape - 1); случайное
+    # округление сохраняет среднее и для дробных значений.
+    size = (rnd.paretovariate(THREAD_SHAPE) - 1) * mean * (THREAD_SHAPE - 1)
+    return min(MAX_THREAD, int(size + rnd.random()))
+
+
+def generate(users, groups, posts, comments, follows, seed=0,
+             progress=None, end=None, batch_size=BATCH_SIZE):
+    """Создать данные; вернуть словарь с примерами для запросов.
+
+    ``end`` — момент, к которому относятся самые свежие записи; по
+    умолчанию полночь сегодняшнего дня. ``comments`` и ``follows``
+    выдерживаются в среднем, ``users``, ``groups`` и ``posts`` — точно.
+    """
+    rnd = random.Random(seed)
+    words = Vocabulary(seed)
+    end = end or timezone.localtime().replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    report = progress or (lambda name, count: None)
+
+    first_user = _next_id(User)
+    # id bench — следующий за создаваемыми: от последовательности он
+    # не зависит, и данные повторяются.
+    bench = User.objects.filter(username=BENCH_USERNAME).first() or User(
+        id=first_user + users, username=BENCH_USERNAME)
+    bench.set_password(BENCH_PASSWORD)
+    bench.save()
+
+    with bulk.preserve_dates(Post, Comment):
+        unusable = make_password(None)
+        user_ids = range(first_user, first_user + users)
+        for chunk in bulk.chunked(user_ids, batch_size):
+            User.objects.bulk_create(
+                User(id=pk, password=unusable,
+                     username=f'{rnd.choice(words.names)}{pk}')
+                for pk in chunk)
+        people = list(user_ids) + [bench.pk]
+        report('users', users)
+
+        first_group = _next_id(Group)
+        group_ids = list(range(first_group, first_group + groups))
+        Group.objects.bulk_create(
+            Group(id=pk, title=rnd.choice(words.titles)[:200],
+                  slug=f'group-{pk}', description=words.text(rnd, 1, 3))
+            for pk in group_ids)
+        report('groups', groups)
+
+        # Популярность и активность — по одному случайному ранжированию:
+        # у читаемых авторов и постов больше.
+        ranked = rnd.sample(people, len(people))
+        popularity = _zipf(len(people), POPULARITY_EXPONENT)
+        activity = _zipf(len(people), ACTIVITY_EXPONENT)
+
+        made = 0
+        for chunk in bulk.chunked(
+                _following(rnd, ranked, popularity, follows, bench.pk),
+                batch_size):
+            Follow.objects.bulk_create(
+                (Follow(user_id=user, author_id=author)
+                 for user, author in chunk),
+                ignore_conflicts=True)
+            made += len(chunk)
+            report('follows', made)
+
+        images = _images(rnd, seed)
+        image_urls = {
+            (name, geometry): thumbnails.make_thumbnail_url(name, geometry)
+            for name in images
+            for geometry in settings.POST_THUMBNAIL_GEOMETRIES
+        }
+        post_id, comment_id = _next_id(Post), _next_id(Comment)
+        mean_thread = comments / posts if posts else 0
+        stream = _bursts(
+            rnd, ranked, activity, group_ids, end, posts, bench.pk)
+        made = commented = 0
+        for chunk in bulk.chunked(stream, batch_size):
+            batch, prepared, replies = [], [], []
+            for author, group, pub_date in chunk:
+                image = (rnd.choice(images) if rnd.random() < IMAGE_SHARE
+                         else '')
+                thread = _thread_size(rnd, mean_thread)
+                participants = rnd.choices(
+                    ranked, cum_weights=activity, k=1 + thread // 3)
+                created = pub_date
+                for _ in range(thread):
+                    created = min(end, created + timedelta(
+                        minutes=rnd.expovariate(1 / REPLY_GAP)))
+                    replier = (author if rnd.random() < AUTHOR_REPLY_SHARE
+                               else rnd.choice(participants))
+                    replies.append(Comment(
+                        id=comment_id, post_id=post_id, author_id=replier,
+                        text=words.text(rnd, 1, 3),
+                        created=created, updated=created))
+                    comment_id += 1
+                batch.append(Post(
+                    id=post_id, text=words.text(rnd, 1, 8),
+                    pub_date=pub_date, updated=pub_date, author_id=author,
+                    group_id=group, image=image, comments_count=thread,
+                ))
+                if image:
+                    prepared.extend(
+                        PostThumbnail(post_id=post_id, geometry=geometry,
+                                      url=image_urls[image, geometry])
+                        for geometry in settings.POST_THUMBNAIL_GEOMETRIES)
+                post_id += 1
+            with transaction.atomic():
+                Post.objects.bulk_create(batch)
+                PostThumbnail.objects.bulk_create(prepared)
+                for part in bulk.chunked(replies, batch_size):
+                    Comment.objects.bulk_create(part)
+            made += len(batch)
+            commented += len(replies)
+            report('posts', made)
+            report('comments', commented)
+
+    bulk.reset_sequences([User, Group, Post, Comment])
+    bulk.finish_import(
+        {feed_cache.INDEX}
+        | {feed_cache.author_scope(pk) for pk in people}
+        | {feed_cache.group_scope(pk) for pk in group_ids})
+    return sample(bench)
+
+
+def sample(user):
+    """Объекты, на которых удобно проверять страницы."""
+    author = User.objects.order_by('-stats__followers_count', 'pk').first()
+    post = Post.objects.order_by('-comments_count', 'pk').first()
+    own = Post.objects.filter(author=user).order_by('pk').first()
+    return {
+        'user': user,
+        'author': author,
+        'group': Group.objects.order_by('pk').first(),
+        'post': post,
+        'own_post': own,
+        'word': max(re.findall(r'\w+', post.text.lower()), key=len),
+    }
@@ -0,0 +1,20 @@
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail_url(post, geometry):
+    """Адрес готовой миниатюры; пока её нет — адрес самой картинки.
+
+    Миниатюры ленты загружаются заранее (``Post.objects.for_feed``),
+    поэтому фильтр не обращается ни к базе, ни к хранилищу sorl.
+    Недостающие миниатюры готовят пул потоков и команда
+    ``generate_thumbnails``, а не запрос.
+    """
+    if not post.image:
+        return ''
+    for thumbnail in post.thumbnails.all():
+        if thumbnail.geometry == geometry:
+            return thumbnail.url
+    return post.image.url
@@ -0,0 +1,113 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .. import comment_queue
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(
+    COMMENT_WRITE_BEHIND=True, COMMENT_FLUSH_SECONDS=0, COMMENT_FLUSH_SIZE=3)
+class CommentQueueTests(TransactionTestCase):
+    """Счётчики и версии лент обновляются после фиксации транзакции,
+    поэтому тесты работают без обёртки TestCase."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.url = reverse('posts:post_detail', args=[self.post.pk])
+
+    def tearDown(self):
+        comment_queue.flush()
+
+    def comment(self, text):
+        return self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': text})
+
+    def test_author_sees_pending_comment(self):
+        """Комментарий в очереди виден автору, но не другим."""
+        self.assertRedirects(self.comment('Ждёт записи'), self.url)
+        self.assertFalse(Comment.objects.exists())
+        self.assertContains(self.client.get(self.url), 'Ждёт записи')
+
+        other = Client()
+        other.force_login(self.author)
+        self.assertNotContains(other.get(self.url), 'Ждёт записи')
+
+    def test_pending_comment_changes_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.comment('Новый')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый')
+
+    def test_flush(self):
+        """Пачка пишется одним запросом вставки, счётчики сходятся."""
+        self.comment('Первый')
+        self.comment('Второй')
+        self.assertEqual(comment_queue.flush(), 2)
+        self.assertEqual(
+            list(Comment.objects.order_by('id').values_list(
+                'text', 'author')),
+            [('Первый', self.reader.pk), ('Второй', self.reader.pk)])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertEqual(comment_queue.pending(self.reader, self.post), [])
+        # Ленты показывают новое число комментариев.
+        self.assertContains(
+            self.client.get(reverse('posts:index')), 'Комментариев: 2')
+        # Записанный комментарий не показывается дважды.
+        self.assertContains(self.client.get(self.url), 'Первый', count=1)
+
+    def test_flush_when_full(self):
+        for i in range(3):
+            self.comment(f'Комментарий {i}')
+        self.assertEqual(Comment.objects.count(), 3)
+
+    def test_deleted_post(self):
+        self.comment('К удалённому')
+        Post.objects.filter(pk=self.post.pk).delete()
+        self.assertEqual(comment_queue.flush(), 0)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_bad_row_does_not_drop_batch(self):
+        """Комментарий удалённого автора не мешает записать остальные."""
+        self.comment('Останется')
+        gone = User.objects.create_user(username='gone')
+        other = Client()
+        other.force_login(gone)
+        other.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Пропадёт'})
+        gone.delete()
+        with self.assertLogs('posts.comment_queue', 'ERROR'):
+            self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Останется'])
+        self.assertEqual(comment_queue.pending(self.reader, self.post), [])
+
+    def test_retries_are_capped(self):
+        """Пачка, которую база не принимает, откладывается не вечно."""
+        self.comment('Не запишется')
+        with mock.patch.object(
+                comment_queue, '_write', side_effect=OperationalError
+        ), self.assertLogs('posts.comment_queue', 'ERROR'):
+            for _ in range(comment_queue.MAX_ATTEMPTS - 1):
+                self.assertEqual(comment_queue.flush(), 0)
+                self.assertEqual(len(comment_queue._queue), 1)
+                self.assertEqual(
+                    len(comment_queue.pending(self.reader, self.post)), 1)
+            comment_queue.flush()
+        self.assertEqual(comment_queue._queue, [])
+        self.assertEqual(comment_queue.pending(self.reader, self.post), [])
@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TransactionTestCase):
+    """Валидаторы лент зависят от версий кеша, которые меняются после
+    фиксации транзакции, поэтому тесты работают без обёртки TestCase."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, text='Первый пост', group=self.group)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url, client=None):
+        client = client or self.client
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_pages_are_not_modified(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                self.assertEqual(self.revalidate(url), 304)
+
+    def test_writes_change_validators(self):
+        """После записи поста страницы лент отдаются заново."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ]
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        Post.objects.create(
+            author=self.author, text='Второй пост', group=self.group)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertContains(response, 'Второй пост')
+
+    def test_follow_changes_profile(self):
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        etag = self.client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Отписаться')
+
+    def test_comment_changes_post_detail(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Комментарий')
+
+    def test_post_detail_has_no_last_modified(self):
+        """Дата поста не отражает читателя: перепроверка только по ETag."""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        since = http_date(self.post.updated.timestamp() + 60)
+        self.assertEqual(
+            Client().get(url, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_comments_fragment_last_modified(self):
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(
+            self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code,
+            304,
+        )
+
+    def test_validators_depend_on_user(self):
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
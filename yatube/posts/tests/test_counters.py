@@ -0,0 +1,99 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import counters
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_post_counter(self):
+        """Создание и удаление поста меняют счётчик автора."""
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.posts_count, 1)
+        post = Post.objects.create(author=self.user, text='Ещё пост')
+        stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 2)
+        post.delete()
+        stats.refresh_from_db()
+        self.assertEqual(stats.posts_count, 1)
+
+    def test_comment_counter_survives_post_edit(self):
+        """Редактирование поста не затирает счётчик комментариев."""
+        stale_post = Post.objects.get(pk=self.post.pk)
+        self.reader_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'},
+        )
+        stale_post.text = 'Исправленный пост'
+        stale_post.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(self.post.text, 'Исправленный пост')
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счётчики обоих пользователей."""
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.user.username}))
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).followers_count, 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1)
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.user.username}))
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).followers_count, 0)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 0)
+
+    def test_rebuild_command(self):
+        """rebuild_counters находит и исправляет расхождения."""
+        Comment.objects.create(post=self.post, author=self.reader, text='1')
+        Follow.objects.create(user=self.reader, author=self.user)
+        UserStats.objects.filter(user=self.user).update(posts_count=7)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=5)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', verify=True, stdout=StringIO())
+        call_command('rebuild_counters', stdout=StringIO())
+        call_command('rebuild_counters', verify=True, stdout=StringIO())
+
+        self.assertEqual(
+            UserStats.objects.get(user=self.user).posts_count, 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+    def test_counter_row_created_concurrently(self):
+        """Строку создал параллельный запрос — прибавка не теряется."""
+        UserStats.objects.filter(user=self.reader).delete()
+        get_or_create = UserStats.objects.get_or_create
+
+        def concurrent(**kwargs):
+            # Параллельный запрос посчитал подписки до нашей записи.
+            UserStats.objects.create(user=self.reader)
+            return get_or_create(**kwargs)
+
+        with mock.patch.object(
+                UserStats.objects, 'get_or_create', side_effect=concurrent):
+            counters.change_user_counter(
+                self.reader.pk, 'following_count', 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1)
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedCacheTests(TransactionTestCase):
+    """Версии кеша меняются после фиксации транзакции, поэтому
+    тесты работают без обёртки TestCase."""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.other = User.objects.create_user(username='other')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, text='Первый пост', group=self.group)
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_feeds_are_invalidated_on_write(self):
+        """Новый пост сразу виден в закешированных лентах."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+        ]
+        for url in urls:
+            self.client.get(url)
+        Post.objects.create(
+            author=self.author, text='Второй пост', group=self.group)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Второй пост')
+
+    def test_comment_invalidates_counter(self):
+        """Комментарий обновляет число комментариев в ленте."""
+        url = reverse('posts:index')
+        self.assertContains(self.client.get(url), 'Комментариев: 0')
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        self.assertContains(self.client.get(url), 'Комментариев: 1')
+
+    def test_follow_feed_is_per_user(self):
+        """Лента подписок не попадает к другому пользователю."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = reverse('posts:follow_index')
+        self.assertContains(self.client.get(url), 'Первый пост')
+
+        other_client = Client()
+        other_client.force_login(self.other)
+        self.assertNotContains(other_client.get(url), 'Первый пост')
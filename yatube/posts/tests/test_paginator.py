@@ -1,5 +1,6 @@
 # deals/tests/test_views.py
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import Client, TestCase
 from django.urls import reverse
 from ..models import Post, Group, User
@@ -32,6 +33,7 @@ class TaskPagesTests(TestCase):
         ]
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -63,3 +65,40 @@ class TaskPagesTests(TestCase):
             with self.subTest(reverse_name=reverse_name):
                 response = self.authorized_client.get(reverse_name)
                 self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_cursor_links_are_stable(self):
+        """Ссылки «Следующая» и «Предыдущая» работают через курсор
+        и не сдвигаются при появлении новых постов."""
+        url = reverse('posts:index')
+        first_page = self.authorized_client.get(url).context['page_obj']
+        first_ids = [post.id for post in first_page]
+        Post.objects.create(author=self.user, text='Новый пост')
+
+        response = self.authorized_client.get(
+            url, {'cursor': first_page.next_cursor})
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+
+        response = self.authorized_client.get(
+            url, {'cursor': second_page.previous_cursor})
+        previous_page = response.context['page_obj']
+        self.assertEqual([post.id for post in previous_page], first_ids)
+
+    def test_last_page_cursor(self):
+        """Курсор «Последняя» открывает конец ленты."""
+        url = reverse('posts:index')
+        first_page = self.authorized_client.get(url).context['page_obj']
+        response = self.authorized_client.get(
+            url, {'cursor': first_page.last_cursor})
+        last_page = response.context['page_obj']
+        self.assertEqual(len(last_page), 10)
+        self.assertFalse(last_page.has_next())
+        self.assertEqual(last_page[len(last_page) - 1], self.post)
+
+    def test_invalid_cursor_opens_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'broken'})
+        self.assertEqual(response.context['page_obj'].number, 1)
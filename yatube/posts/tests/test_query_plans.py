@@ -0,0 +1,163 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Полный обход допустим только для маленьких справочников: форма поста
+# показывает все группы.
+ALLOWED_SCANS = {'posts_group'}
+SCAN = re.compile(r'^SCAN (?:TABLE )?(\S+)')
+# Таблица FTS5 ищет сама: ``M`` в ограничениях — это MATCH по индексу.
+VIRTUAL = re.compile(r'VIRTUAL TABLE INDEX \d+:(\S*)')
+# Сортировка во временном B-дереве читает все подходящие строки, даже
+# если странице нужны десять.
+TEMP_BTREE = 'USE TEMP B-TREE'
+
+
+class QueryPlanTests(TestCase):
+    """Запросы всех view из posts.views идут по индексам."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for i in range(12):
+            Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.group)
+        cls.post = Post.objects.create(author=cls.user, text='Свой пост')
+        Comment.objects.create(post=cls.post, author=cls.author, text='Ок')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def full_scans(self, queries):
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                for row in cursor.fetchall():
+                    if self.is_bad_step(row[-1], sql):
+                        scans.append(f'{row[-1]}\n    {sql}')
+        return scans
+
+    @staticmethod
+    def is_bad_step(detail, sql):
+        if TEMP_BTREE in detail:
+            return True
+        match = SCAN.match(detail)
+        if not match:
+            return False
+        virtual = VIRTUAL.search(detail)
+        if virtual:
+            return 'M' not in virtual.group(1)
+        if 'INDEX' not in detail:
+            return match.group(1) not in ALLOWED_SCANS
+        # Обход индекса по порядку допустим только для начала ленты без
+        # условий: его обрывает LIMIT. С условием нужен SEARCH.
+        return ' WHERE ' in sql or ' LIMIT ' not in sql
+
+    def assert_no_full_scans(self, method, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            getattr(self.client, method)(url, data or {})
+        scans = self.full_scans(queries)
+        self.assertFalse(scans, '\n'.join(scans))
+
+    def test_read_views(self):
+        """Страницы лент и поста, включая страницы по курсору."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+            reverse('posts:trending'),
+            reverse('posts:popular_groups'),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_create'),
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            reverse('posts:search') + '?q=пост',
+            reverse('posts:search') + '?q=пост&page=2',
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assert_no_full_scans('get', url)
+                page_obj = self.client.get(url).context.get('page_obj')
+                if getattr(page_obj, 'next_cursor', None):
+                    self.assert_no_full_scans(
+                        'get', url, {'cursor': page_obj.next_cursor})
+
+    def test_search_uses_fts_index(self):
+        """Поиск читает индекс FTS5 без сортировки во временном B-дереве."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:search'), {'q': 'пост'})
+        self.assertEqual(response.context['page_obj'].paginator.count, 13)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if 'MATCH' in query['sql']:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plans.extend(row[-1] for row in cursor.fetchall())
+        self.assertTrue(plans)
+        for detail in plans:
+            with self.subTest(detail=detail):
+                self.assertIn('VIRTUAL TABLE INDEX', detail)
+                self.assertFalse(self.is_bad_step(detail, ''))
+        self.assertFalse(self.full_scans(queries))
+
+    def test_write_views(self):
+        """Создание, правка, комментарий, подписка и отписка."""
+        requests = [
+            ('post', reverse('posts:post_create'), {'text': 'Новый'}),
+            ('post', reverse('posts:post_edit',
+                             kwargs={'post_id': self.post.pk}),
+             {'text': 'Правка'}),
+            ('post', reverse('posts:add_comment',
+                             kwargs={'post_id': self.post.pk}),
+             {'text': 'Комментарий'}),
+            ('get', reverse('posts:profile_unfollow',
+                            kwargs={'username': 'author'}), None),
+            ('get', reverse('posts:profile_follow',
+                            kwargs={'username': 'author'}), None),
+        ]
+        for method, url, data in requests:
+            with self.subTest(url=url):
+                self.assert_no_full_scans(method, url, data)
+
+    def test_plan_checks(self):
+        """Что считается плохим шагом плана."""
+        cases = [
+            ('USE TEMP B-TREE FOR ORDER BY', 'SELECT 1 LIMIT 1', True),
+            ('SCAN posts_post', 'SELECT 1', True),
+            ('SCAN posts_group', 'SELECT 1', False),
+            ('SCAN posts_post USING INDEX post_pub_date_idx',
+             'SELECT 1 FROM posts_post LIMIT 11', False),
+            ('SCAN posts_post USING COVERING INDEX post_author_idx',
+             'SELECT 1 FROM posts_post WHERE author_id = 1 LIMIT 11', True),
+            ('SEARCH posts_post USING INDEX post_author_idx (author_id=?)',
+             'SELECT 1 FROM posts_post WHERE author_id = 1', False),
+            ('SCAN posts_post_fts VIRTUAL TABLE INDEX 32:M1',
+             'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s',
+             False),
+            ('SCAN posts_post_fts VIRTUAL TABLE INDEX 0:',
+             'SELECT rowid FROM posts_post_fts', True),
+        ]
+        for detail, sql, bad in cases:
+            with self.subTest(detail=detail):
+                self.assertIs(self.is_bad_step(detail, sql), bad)
@@ -0,0 +1,181 @@
+import io
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import bulk, rankings
+from ..models import (
+    Comment, Follow, Group, GroupRank, Post, PostRank, RankingGap,
+    RankingState, User,
+)
+
+
+@override_settings(
+    TRENDING_HALF_LIFE=6, TRENDING_FOLLOWER_WEIGHT=0.5, TRENDING_SIZE=3,
+    POPULAR_GROUPS_SIZE=2)
+class RankingsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='')
+            for i in range(3)
+        ]
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {i}', group=cls.groups[i])
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def comment(self, post, count=1, ago=timedelta()):
+        comments = [
+            Comment.objects.create(post=post, author=self.reader, text='Да')
+            for _ in range(count)
+        ]
+        Comment.objects.filter(pk__in=[c.pk for c in comments]).update(
+            created=timezone.now() - ago)
+
+    def places(self):
+        return list(PostRank.objects.filter(place__isnull=False).order_by(
+            'place').values_list('post__text', flat=True))
+
+    def test_recent_comments_rank_first(self):
+        """Свежие комментарии весят больше старых."""
+        self.comment(self.posts[0], 5, ago=timedelta(hours=24))
+        self.comment(self.posts[1], 2)
+        rankings.refresh()
+        self.assertEqual(self.places(), ['Пост 1', 'Пост 0', 'Пост 2'])
+        self.assertEqual(
+            list(GroupRank.objects.filter(place__isnull=False).order_by(
+                'place').values_list('group__slug', flat=True)),
+            ['group-1', 'group-0'])
+
+    def test_incremental(self):
+        """Повторный пересчёт читает только новые записи."""
+        self.assertEqual(rankings.refresh(), 3)
+        self.assertEqual(rankings.refresh(), 0)
+        self.comment(self.posts[2], 3)
+        self.assertEqual(rankings.refresh(), 3)
+        self.assertEqual(self.places()[0], 'Пост 2')
+        state = RankingState.objects.get()
+        self.assertEqual(
+            state.last_comment_id, Comment.objects.latest('id').pk)
+
+    def test_late_commit_is_counted_once(self):
+        """Запись с пропущенным id, зафиксированная позже, учитывается."""
+        now = timezone.now()
+        rankings.refresh(now=now)
+        self.comment(self.posts[0], 3)
+        late = Comment.objects.order_by('id')[1]
+        # Транзакция с этим id ещё не зафиксирована.
+        Comment.objects.filter(pk=late.pk).delete()
+        self.assertEqual(rankings.refresh(now=now), 2)
+        self.assertEqual(
+            list(RankingGap.objects.values_list('kind', 'record_id')),
+            [('comment', late.pk)])
+        Comment.objects.create(
+            id=late.pk, post=self.posts[0], author=self.reader, text='Да')
+        self.assertEqual(rankings.refresh(now=now), 1)
+        self.assertEqual(rankings.refresh(now=now), 0)
+        self.assertFalse(RankingGap.objects.exists())
+
+    def test_gap_expires(self):
+        """Пропуск, который так и не заполнился, забывается."""
+        now = timezone.now()
+        rankings.refresh(now=now)
+        self.comment(self.posts[0], 2)
+        Comment.objects.order_by('id').first().delete()
+        rankings.refresh(now=now)
+        self.assertTrue(RankingGap.objects.exists())
+        rankings.refresh(now=now + rankings.GAP_TIMEOUT * 2)
+        self.assertFalse(RankingGap.objects.exists())
+
+    def test_import_below_counted_ids_rebuilds(self):
+        """Импорт с явными id ниже учтённых перестраивает рейтинги."""
+        self.comment(self.posts[2], 3)
+        free_ids = list(Comment.objects.values_list('id', flat=True))
+        Comment.objects.all().delete()
+        self.comment(self.posts[1], 2)
+        rankings.refresh()
+        self.assertEqual(self.places()[0], 'Пост 1')
+
+        importer = bulk.Importer()
+        importer.run(
+            ('comment', {
+                'id': str(pk),
+                'post': str(self.posts[2].pk),
+                'author': 'reader',
+                'text': 'Импорт',
+                'created': timezone.now().isoformat(),
+            })
+            for pk in free_ids
+        )
+        self.assertEqual(rankings.refresh(), 0)
+        bulk.finish_import(importer.scopes, importer.since)
+        self.assertEqual(self.places()[0], 'Пост 2')
+
+    def test_followers_boost_score(self):
+        popular = User.objects.create_user(username='popular')
+        post = Post.objects.create(author=popular, text='Пост популярного')
+        # Пост 0 чуть активнее: его пост и комментарий полпериода назад.
+        self.comment(self.posts[0], ago=timedelta(hours=6))
+        rankings.refresh()
+        self.assertNotEqual(self.places()[0], 'Пост популярного')
+        for i in range(20):
+            Follow.objects.create(
+                user=User.objects.create_user(username=f'fan{i}'),
+                author=popular)
+        rankings.refresh()
+        self.assertEqual(self.places()[0], 'Пост популярного')
+        rank = PostRank.objects.get(post=post)
+        self.assertAlmostEqual(
+            rank.score, rank.heat * rankings._follower_boost(20))
+
+    def test_renormalize(self):
+        """Старые веса делятся на общий множитель, затухшие удаляются."""
+        now = timezone.now()
+        self.comment(self.posts[1], 2)
+        rankings.refresh(now=now)
+        later = now + timedelta(hours=6 * 50)
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Потом')
+        Comment.objects.filter(text='Потом').update(created=later)
+        rankings.refresh(now=later)
+        self.assertEqual(RankingState.objects.get().epoch, later)
+        self.assertEqual(self.places(), ['Пост 0'])
+        self.assertAlmostEqual(
+            PostRank.objects.get(post=self.posts[0]).heat, 1)
+
+    def test_views(self):
+        self.comment(self.posts[1], 2)
+        rankings.refresh()
+        response = self.client.get(reverse('posts:trending'))
+        self.assertEqual(
+            [post.text for post in response.context['posts']],
+            ['Пост 1', 'Пост 2', 'Пост 0'])
+        response = self.client.get(reverse('posts:popular_groups'))
+        self.assertContains(response, 'Группа 1')
+        self.assertNotContains(response, 'Группа 0')
+
+    def test_view_cost_does_not_grow(self):
+        """Страница читает только места из рейтинга: посты и миниатюры."""
+        for i in range(30):
+            Post.objects.create(author=self.author, text=f'Ещё {i}')
+        rankings.refresh()
+        cache.clear()
+        with self.assertNumQueries(2):
+            self.client.get(reverse('posts:trending'))
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command('refresh_rankings', stdout=output)
+        self.assertIn('новых записей: 3', output.getvalue())
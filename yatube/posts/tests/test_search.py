@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post
+from ..search import fts_enabled, search
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author', is_staff=True, is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def found(self, query):
+        return [post.text for post in search(query)[:100]]
+
+    def test_index_follows_writes(self):
+        """Индекс обновляется при создании, правке и удалении постов."""
+        post = Post.objects.create(author=self.user, text='Рыжий кот')
+        Post.objects.bulk_create([Post(author=self.user, text='Кот спит')])
+        self.assertCountEqual(self.found('кот'), ['Рыжий кот', 'Кот спит'])
+
+        post.text = 'Рыжая собака'
+        post.save()
+        self.assertEqual(self.found('кот'), ['Кот спит'])
+        self.assertEqual(self.found('собака'), ['Рыжая собака'])
+
+        Post.objects.filter(text='Кот спит').delete()
+        self.assertEqual(self.found('кот'), [])
+
+    def test_table_list_is_read_once_per_connection(self):
+        fts_enabled()
+        with CaptureQueriesContext(connection) as queries:
+            self.found('кот')
+            self.found('собака')
+        self.assertFalse(
+            [query for query in queries if 'sqlite_master' in query['sql']])
+
+    def test_ranking_and_prefix(self):
+        Post.objects.create(author=self.user, text='море и горы')
+        Post.objects.create(author=self.user, text='море, море, снова море')
+        self.assertEqual(
+            self.found('мор'), ['море, море, снова море', 'море и горы'])
+        self.assertEqual(self.found('море горы'), ['море и горы'])
+
+    def test_operators_are_not_interpreted(self):
+        Post.objects.create(author=self.user, text='кот NEAR собака')
+        for query in ('кот"', 'NEAR(кот', '*', 'кот OR', ''):
+            with self.subTest(query=query):
+                list(search(query)[:10])
+        self.assertEqual(self.found('- , ;'), [])
+
+    def test_search_view_paginates(self):
+        Post.objects.bulk_create(
+            [Post(author=self.user, text=f'пост {i}') for i in range(13)])
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'пост', 'page': 2})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 13)
+        self.assertEqual(len(page_obj), 3)
+
+    def test_admin_uses_index(self):
+        Post.objects.create(author=self.user, text='кот')
+        Post.objects.create(author=self.user, text='котлета')
+        Post.objects.create(author=self.user, text='собака')
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кот'})
+        self.assertEqual(response.context['cl'].result_count, 2)
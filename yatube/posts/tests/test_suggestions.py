@@ -0,0 +1,118 @@
+import io
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from .. import suggestions
+from ..models import Follow, User
+
+
+class SuggestionsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        names = ('reader', 'a', 'b', 'c', 'd', 'e', 'f')
+        cls.users = {
+            name: User.objects.create_user(username=name) for name in names}
+        for user, author in (
+            ('reader', 'a'), ('reader', 'b'),
+            ('a', 'c'), ('b', 'c'), ('b', 'd'),
+            ('e', 'a'), ('e', 'f'),
+        ):
+            Follow.objects.create(
+                user=cls.users[user], author=cls.users[author])
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, *names):
+        return [self.users[name].pk for name in names]
+
+    def test_graph(self):
+        following, readers, summary = suggestions.load_graph()
+        self.assertEqual(summary['edges'], 7)
+        self.assertIsNone(summary['cap'])
+        self.assertEqual(
+            list(following.neighbours(self.users['b'].pk)),
+            self.ids('c', 'd'))
+        self.assertEqual(
+            list(readers.neighbours(self.users['a'].pk)),
+            self.ids('reader', 'e'))
+        self.assertEqual(
+            list(following.neighbours(self.users['c'].pk)), [])
+
+    def test_scores(self):
+        """Друзья друзей — по два очка, совместные подписки — по одному."""
+        following, readers, _ = suggestions.load_graph()
+        c, d, f = self.ids('c', 'd', 'f')
+        self.assertEqual(
+            suggestions.suggest(following, readers, self.users['reader'].pk),
+            [[c, 4], [d, 2], [f, 1]])
+
+    def test_memory_budget(self):
+        out_degrees = [0, 5, 1, 1]
+        in_degrees = [0, 1, 1, 5]
+        self.assertIsNone(
+            suggestions.degree_cap(out_degrees, in_degrees, 14))
+        self.assertEqual(
+            suggestions.degree_cap(out_degrees, in_degrees, 10), 3)
+        with self.assertRaises(suggestions.MemoryBudgetExceeded):
+            suggestions.degree_cap(out_degrees, in_degrees, 3)
+
+    def test_build_and_incremental_refresh(self):
+        summary = suggestions.build()
+        self.assertEqual(summary['suggested'], 3)
+        reader = self.users['reader']
+        self.assertEqual(
+            suggestions.suggested_ids(reader), self.ids('c', 'd', 'f'))
+
+        # Подписка на e даёт очко его подпискам, сам e не подсказывается.
+        Follow.objects.create(user=reader, author=self.users['e'])
+        self.assertEqual(
+            suggestions.suggested_ids(reader), self.ids('c', 'f', 'a', 'd'))
+        # Отписка от b забирает очки его подписок.
+        Follow.objects.filter(user=reader, author=self.users['b']).delete()
+        self.assertEqual(
+            suggestions.suggested_ids(reader), self.ids('f', 'a', 'c'))
+        # Уже читаемый a не показывается.
+        self.assertEqual(
+            [user.username for user in suggestions.suggested_users(
+                reader, suggestions.suggested_ids(reader))],
+            ['f', 'c'])
+
+    def test_users_without_follows_see_popular(self):
+        suggestions.build()
+        self.assertEqual(
+            suggestions.suggested_ids(self.users['c'])[:2],
+            self.ids('a', 'b'))
+
+    def test_pages(self):
+        suggestions.build()
+        reader = self.users['reader']
+        self.client.force_login(reader)
+        for url in (reverse('posts:follow_index'),
+                    reverse('posts:profile', args=['a'])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Кого почитать')
+                self.assertEqual(
+                    [user.username for user in response.context[
+                        'suggestions']],
+                    ['c', 'd', 'f'])
+        # Уже читаемый автор не показывается, даже пока кеш не обновлён.
+        Follow.objects.bulk_create(
+            [Follow(user=reader, author=self.users['c'])])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [user.username for user in response.context['suggestions']],
+            ['d', 'f'])
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command('build_suggestions', stdout=output)
+        self.assertIn('Подсказки готовы для 3 пользователей',
+                      output.getvalue())
+        with self.assertRaisesMessage(CommandError, 'SUGGESTIONS_MEMORY_MB'):
+            call_command(
+                'build_suggestions', '--memory-mb', '0', stdout=output)
@@ -0,0 +1,106 @@
+import io
+import tempfile
+from datetime import datetime
+from statistics import median
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import synthetic
+from ..models import Comment, Follow, Group, Post, PostThumbnail, User
+
+SIZES = {'users': 40, 'groups': 3, 'posts': 150, 'comments': 300,
+         'follows': 120}
+END = timezone.make_aware(datetime(2024, 6, 1))
+
+
+class SyntheticDataTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.media = tempfile.TemporaryDirectory()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media.name)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        cls.media.cleanup()
+
+    def generate(self, seed=0):
+        synthetic.generate(**SIZES, seed=seed, end=END, batch_size=50)
+
+    def snapshot(self):
+        return {
+            'users': list(User.objects.order_by('id').values_list(
+                'id', 'username')),
+            'groups': list(Group.objects.order_by('id').values_list(
+                'id', 'title', 'slug')),
+            'posts': list(Post.objects.order_by('id').values_list(
+                'id', 'text', 'pub_date', 'author_id', 'group_id', 'image',
+                'comments_count')),
+            'comments': list(Comment.objects.order_by('id').values_list(
+                'id', 'post_id', 'author_id', 'text', 'created')),
+            'follows': set(Follow.objects.values_list(
+                'user_id', 'author_id')),
+        }
+
+    def clear(self):
+        for model in (Comment, Follow, Post, Group, User):
+            model.objects.all().delete()
+
+    def test_same_seed_same_data(self):
+        """Одно зерно на пустой базе даёт те же записи с теми же id."""
+        self.generate(seed=1)
+        first = self.snapshot()
+        self.clear()
+        self.generate(seed=1)
+        self.assertEqual(self.snapshot(), first)
+        self.clear()
+        self.generate(seed=2)
+        self.assertNotEqual(self.snapshot()['posts'], first['posts'])
+
+    def test_distributions(self):
+        """Подписчики и обсуждения распределены с тяжёлым хвостом."""
+        self.generate()
+        self.assertEqual(User.objects.count(), SIZES['users'] + 1)
+        self.assertEqual(Post.objects.count(), SIZES['posts'])
+        self.assertFalse(Post.objects.filter(pub_date__gt=END).exists())
+        self.assertFalse(Comment.objects.filter(created__gt=END).exists())
+        # Счётчики комментариев проставлены сразу и сходятся.
+        for post in Post.objects.all():
+            self.assertEqual(post.comments_count, post.comments.count())
+
+        followers = sorted(
+            (user.stats.followers_count for user in User.objects.all()),
+            reverse=True)
+        self.assertGreater(followers[0], 4 * max(1, median(followers)))
+        self.assertGreaterEqual(
+            Follow.objects.filter(
+                user__username=synthetic.BENCH_USERNAME).count(),
+            synthetic.BENCH_FOLLOWING)
+
+        threads = sorted(
+            Post.objects.values_list('comments_count', flat=True),
+            reverse=True)
+        self.assertGreater(threads[0], 4 * max(1, median(threads)))
+
+        with_images = Post.objects.exclude(image='').count()
+        self.assertTrue(with_images)
+        self.assertEqual(
+            PostThumbnail.objects.count(),
+            with_images * len(settings.POST_THUMBNAIL_GEOMETRIES))
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command(
+            'generate_data', '--users', '10', '--posts', '20',
+            '--comments', '10', '--follows', '10', '--groups', '1',
+            '--end', '2024-06-01', stdout=output)
+        self.assertIn('Данные созданы.', output.getvalue())
+        self.assertEqual(Post.objects.count(), 20)
+        with self.assertRaisesMessage(CommandError, '--append'):
+            call_command('generate_data', stdout=io.StringIO())
@@ -0,0 +1,95 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail.kvstores.base import KVStoreBase
+
+from ..models import Post, PostThumbnail
+from ..thumbnails import generate
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def make_post(self):
+        return Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                'small.gif', SMALL_GIF, content_type='image/gif'),
+        )
+
+    def test_generate_stores_all_geometries(self):
+        """generate готовит миниатюры всех размеров."""
+        post = self.make_post()
+        generate(post)
+        self.assertEqual(
+            set(post.thumbnails.values_list('geometry', flat=True)),
+            set(settings.POST_THUMBNAIL_GEOMETRIES),
+        )
+
+    def test_feed_reads_precomputed_urls(self):
+        """Лента берёт готовые адреса, не обращаясь к хранилищу sorl."""
+        post = self.make_post()
+        generate(post)
+        url = PostThumbnail.objects.get(
+            post=post, geometry='960x339').url
+        with mock.patch.object(
+                KVStoreBase, 'get', side_effect=AssertionError('kvstore')):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, url)
+
+    def test_form_save_schedules_thumbnails(self):
+        """Сохранение формы с картинкой ставит миниатюры в очередь."""
+        with mock.patch('posts.forms.schedule_thumbnails') as schedule:
+            self.client.post(reverse('posts:post_create'), {
+                'text': 'Новый пост',
+                'image': SimpleUploadedFile(
+                    'small.gif', SMALL_GIF, content_type='image/gif'),
+            })
+            self.client.post(reverse('posts:post_create'), {
+                'text': 'Пост без картинки',
+            })
+        self.assertEqual(schedule.call_count, 1)
+
+    def test_missing_thumbnail_is_not_made_in_request(self):
+        """Пока миниатюры нет, страница показывает саму картинку."""
+        post = self.make_post()
+        with mock.patch.object(
+                KVStoreBase, 'get', side_effect=AssertionError('kvstore')):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.image.url)
+        self.assertFalse(PostThumbnail.objects.exists())
@@ -0,0 +1,131 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import counters, timeline
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def follow_feed(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка добавляет посты автора в ленту, отписка убирает."""
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'author'}))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertEqual(self.follow_feed(), [self.old_post])
+
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'author'}))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.follow_feed(), [])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков при записи."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=new_post).exists())
+        self.assertEqual(self.follow_feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_popular_author_is_read_on_demand(self):
+        """Посты популярного автора не раздаются, но видны в ленте."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.follow_feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_BACKFILL=2)
+    def test_posts_beyond_backfill_are_read_on_demand(self):
+        """Посты старше окна подписки не раскладываются, но видны."""
+        posts = [self.old_post] + [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(3)]
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('post', 'pub_date')),
+            {(post.pk, post.pub_date) for post in posts[2:]})
+        follow.refresh_from_db()
+        self.assertEqual(follow.timeline_horizon, posts[1].pub_date)
+
+        paginator = timeline.FollowFeedPaginator(self.reader, 3)
+        first = paginator.get_page()
+        self.assertEqual(list(first), posts[:0:-1])
+        second = paginator.get_page(cursor=first.next_cursor)
+        self.assertEqual(list(second), [self.old_post])
+        self.assertFalse(second.has_next())
+        self.assertEqual(
+            list(paginator.get_page(cursor=second.previous_cursor)),
+            posts[:0:-1])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_pulled_authors_share_one_query(self):
+        """Число запросов страницы не растёт с числом популярных авторов."""
+        def queries():
+            paginator = timeline.FollowFeedPaginator(self.reader, 10)
+            with CaptureQueriesContext(connection) as context:
+                list(paginator.get_page())
+            return len(context)
+
+        Follow.objects.create(user=self.reader, author=self.author)
+        single = queries()
+        for i in range(3):
+            author = User.objects.create_user(username=f'popular{i}')
+            Post.objects.create(author=author, text=f'Пост {i}')
+            Follow.objects.create(user=self.reader, author=author)
+        self.assertEqual(queries(), single)
+        self.assertEqual(
+            len(timeline.FollowFeedPaginator(self.reader, 10).get_page()), 4)
+
+    @override_settings(TIMELINE_BACKFILL=2, TIMELINE_FANOUT_LIMIT=2)
+    def test_rebuild_matches_backfill(self):
+        """Пересборка одним запросом равна backfill по каждой подписке."""
+        popular = User.objects.create_user(username='popular')
+        other = User.objects.create_user(username='other')
+        for author in (self.author, popular):
+            for i in range(3):
+                Post.objects.create(author=author, text=f'Пост {i}')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=popular)
+        Follow.objects.create(user=other, author=popular)
+        counters.rebuild(fix=True)
+
+        def entries():
+            return (
+                set(TimelineEntry.objects.values_list(
+                    'user', 'post', 'pub_date')),
+                set(Follow.objects.values_list(
+                    'user', 'author', 'timeline_horizon')),
+            )
+
+        with mock.patch.object(
+                timeline, '_window_functions', return_value=False):
+            timeline.rebuild()
+        expected = entries()
+        self.assertEqual(len(expected[0]), 2)
+        timeline.rebuild()
+        self.assertEqual(entries(), expected)
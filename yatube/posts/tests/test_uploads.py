@@ -0,0 +1,110 @@
+import io
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(size, image_format='PNG', mode='RGBA'):
+    content = io.BytesIO()
+    Image.new(mode, size, (255, 0, 0, 128)[:len(mode)]).save(
+        content, image_format)
+    return content.getvalue()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_THUMBNAIL_WORKERS=0,
+    POST_IMAGE_MAX_PIXELS=100 * 100,
+    POST_IMAGE_MAX_SIDE=40,
+)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def upload(self, name, content):
+        return self.client.post(reverse('posts:post_create'), {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(name, content),
+        })
+
+    def test_image_is_reencoded(self):
+        """Картинка уменьшается и сохраняется в POST_IMAGE_FORMAT."""
+        response = self.upload('big.png', make_image((80, 60)))
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('big.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (40, 30))
+
+    def test_too_many_pixels_rejected(self):
+        """Картинка с большим числом точек отвергается по заголовку."""
+        response = self.upload('huge.png', make_image((200, 200)))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            'слишком большая', response.context['form'].errors['image'][0])
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_too_large_file_rejected(self):
+        response = self.upload('big.png', make_image((90, 90)))
+        self.assertFormError(
+            response, 'form', 'image', 'Файл слишком большой.')
+
+    def test_unsupported_format_rejected(self):
+        response = self.upload(
+            'picture.bmp', make_image((10, 10), 'BMP', 'RGB'))
+        self.assertFormError(
+            response, 'form', 'image',
+            'Формат изображения не поддерживается.')
+
+    def test_not_an_image_rejected(self):
+        response = self.upload('notes.png', b'not an image' * 10)
+        self.assertFormError(
+            response, 'form', 'image', 'Загрузите правильное изображение.')
+
+    def test_csrf_is_checked_after_handlers_are_set(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse('posts:post_create'), {
+            'text': 'Без токена',
+            'image': SimpleUploadedFile('big.png', make_image((10, 10))),
+        })
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_api_uses_image_handler(self):
+        response = self.client.post(reverse('api:posts'), {
+            'text': 'Через API',
+            'image': SimpleUploadedFile('big.png', make_image((90, 90))),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['errors']['image'][0]['message'],
+            'Файл слишком большой.')
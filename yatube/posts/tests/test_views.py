@@ -1,8 +1,11 @@
 # deals/tests/test_views.py
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from ..models import Post, Group, User, Follow
+from core.querywatch import QueryWatchMixin
+from ..models import Comment, Post, Group, User, Follow
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
@@ -244,3 +247,130 @@ class TaskPagesTests(TestCase):
             user=self.user, author=self.other_user).exists()
         )
         self.assertEqual(Follow.objects.count(), follow_count - 1)
+
+
+class FeedQueriesTests(QueryWatchMixin, TestCase):
+    """Число запросов на страницу ленты не зависит от числа постов."""
+
+    # Сессия, пользователь, подписка/автор/группа и сама страница постов.
+    MAX_QUERIES = 6
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='feed-slug',
+            description='Тестовое описание',
+        )
+        for i in range(10):
+            author = User.objects.create_user(
+                username=f'author{i}', first_name='Имя', last_name='Фамилия')
+            Follow.objects.create(user=cls.user, author=author)
+            Post.objects.create(
+                author=author, text=f'Пост {i}', group=cls.group)
+        Post.objects.create(author=cls.user, text='Свой пост')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_feed_query_count(self):
+        """Ленты укладываются в ограничение по числу запросов."""
+        feeds = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author0'}),
+            reverse('posts:follow_index'),
+        ]
+        for url in feeds:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertLessEqual(
+                    len(queries), self.MAX_QUERIES,
+                    '\n'.join(query['sql'] for query in queries))
+
+    def test_no_repeated_queries(self):
+        """Страницы не повторяют запросы: связанные объекты загружены."""
+        post = Post.objects.filter(group=self.group).first()
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий'})
+        cache.clear()
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'author0'}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url), self.assertQueriesClean():
+                self.authorized_client.get(url)
+
+
+@override_settings(POST_COMMENTS_PER_PAGE=20)
+class CommentPagesTests(QueryWatchMixin, TestCase):
+    """Комментарии на странице поста идут страницами по курсору."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        readers = [
+            User.objects.create_user(username=f'reader{i}') for i in range(5)
+        ]
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=readers[i % 5], text=f'Ответ {i}')
+            for i in range(45)
+        ]
+        cls.detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': cls.post.pk})
+        cls.fragment_url = reverse(
+            'posts:post_comments', kwargs={'post_id': cls.post.pk})
+
+    def test_first_page_is_bounded(self):
+        """Страница поста показывает первые комментарии без N+1."""
+        with self.assertQueriesClean():
+            response = self.client.get(self.detail_url)
+        page = response.context['comments']
+        self.assertEqual(list(page), self.comments[:20])
+        self.assertTrue(page.next_cursor)
+        self.assertContains(response, 'data-comments-more')
+        self.assertNotContains(response, 'Ответ 20<')
+
+    def test_fragments_load_all_comments(self):
+        """Фрагменты по курсору по очереди отдают все комментарии."""
+        seen = list(self.client.get(self.detail_url).context['comments'])
+        cursor = self.client.get(
+            self.detail_url).context['comments'].next_cursor
+        while cursor:
+            # Пост и страница комментариев с авторами, без запросов на строку.
+            with self.assertNumQueries(2):
+                response = self.client.get(
+                    self.fragment_url, {'cursor': cursor})
+            self.assertTemplateUsed(
+                response, 'posts/includes/comment_list.html')
+            self.assertTemplateNotUsed(response, 'base.html')
+            page = response.context['comments']
+            seen.extend(page)
+            cursor = page.next_cursor
+        self.assertEqual(seen, self.comments)
+
+    def test_page_without_javascript(self):
+        """Ссылка «Показать ещё» без скриптов открывает следующую страницу."""
+        cursor = self.client.get(
+            self.detail_url).context['comments'].next_cursor
+        response = self.client.get(self.detail_url, {'comments': cursor})
+        self.assertEqual(
+            list(response.context['comments']), self.comments[20:40])
+
+    def test_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
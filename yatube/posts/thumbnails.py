@@ -0,0 +1,92 @@
+"""Предварительная подготовка миниатюр картинок постов.
+
+Раньше миниатюры создавались тегом ``{% thumbnail %}`` прямо во время
+отрисовки страницы, а каждая картинка требовала обращения к хранилищу
+ключей sorl-thumbnail. Теперь миниатюры всех размеров из
+``POST_THUMBNAIL_GEOMETRIES`` готовятся после сохранения ``PostForm``
+в пуле фоновых потоков, а их адреса хранятся в ``PostThumbnail``.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import get_thumbnail
+
+from .models import Post, PostThumbnail
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = Lock()
+
+
+def make_thumbnail_url(image, geometry):
+    """Создать миниатюру через sorl-thumbnail; при ошибке — пустой адрес."""
+    try:
+        return get_thumbnail(
+            image, geometry, **settings.POST_THUMBNAIL_OPTIONS).url
+    except Exception:
+        # Как и тег {% thumbnail %}: битая картинка не ломает страницу.
+        logger.exception('Не удалось создать миниатюру %s', image)
+        return ''
+
+
+def generate(post):
+    """Подготовить все миниатюры поста и сохранить их адреса."""
+    PostThumbnail.objects.filter(post=post).delete()
+    if not post.image:
+        return
+    thumbnails = []
+    for geometry in settings.POST_THUMBNAIL_GEOMETRIES:
+        url = make_thumbnail_url(post.image, geometry)
+        if url:
+            thumbnails.append(
+                PostThumbnail(post=post, geometry=geometry, url=url))
+    PostThumbnail.objects.bulk_create(thumbnails, ignore_conflicts=True)
+
+
+def generate_by_id(post_id):
+    try:
+        post = Post.objects.filter(pk=post_id).first()
+        if post is not None:
+            generate(post)
+    except Exception:
+        logger.exception('Не удалось подготовить миниатюры поста %s', post_id)
+    finally:
+        # У каждого потока своё соединение с базой: не оставляем его.
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.POST_THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
+
+
+def wait():
+    """Дождаться миниатюр, уже отданных пулу потоков."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def schedule(post):
+    """Подготовить миниатюры поста после фиксации транзакции."""
+    post_id = post.pk
+
+    def submit():
+        if settings.POST_THUMBNAIL_WORKERS:
+            _get_executor().submit(generate_by_id, post_id)
+        else:
+            generate(Post.objects.get(pk=post_id))
+
+    transaction.on_commit(submit)
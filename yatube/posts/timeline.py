@@ -0,0 +1,287 @@
+"""Лента подписок с раздачей постов при записи (fan-out-on-write).
+
+Новый пост сразу записывается в ``TimelineEntry`` каждого подписчика
+вместе с датой публикации, поэтому страница ``follow_index`` читается
+диапазоном индекса ``(user, pub_date, post)`` без сортировки и без
+соединения ``posts_follow`` с ``posts_post``.
+
+При чтении подтягиваются (fan-out-on-read):
+
+* посты популярных авторов (``TIMELINE_FANOUT_LIMIT`` подписчиков и
+  больше) — они не раздаются;
+* посты старше ``TIMELINE_BACKFILL`` последних, которые получила лента
+  при подписке: граница хранится в ``Follow.timeline_horizon``.
+
+Их читает один запрос на всех таких авторов (границы ``timeline_horizon``
+— условиями через OR); он и запрос к ``TimelineEntry`` отдают не больше
+записей, чем нужно странице, и сливаются по ключу ``(pub_date, id)``.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import (
+    F, OuterRef, Q, Subquery, prefetch_related_objects,
+)
+from django.utils.functional import cached_property
+
+from core.paginator import CursorPaginator
+
+from .models import Follow, Post, TimelineEntry, UserStats
+
+BATCH_SIZE = 500
+
+
+def is_popular(author_id):
+    # Тот же признак, что и при чтении в ``FollowFeedPaginator``.
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def _insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Разложить новый пост по лентам подписчиков автора."""
+    if is_popular(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id, user__isnull=False,
+    ).values_list('user_id', flat=True)
+    batch = []
+    for user_id in followers.iterator():
+        batch.append(TimelineEntry(
+            user_id=user_id, post_id=post.pk, pub_date=post.pub_date))
+        if len(batch) >= BATCH_SIZE:
+            _insert(batch)
+            batch = []
+    _insert(batch)
+
+
+def backfill(user_id, author_id):
+    """Добавить в ленту свежие посты автора после подписки."""
+    if user_id is None or author_id is None or is_popular(author_id):
+        return
+    posts = list(Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id',
+    ).values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL + 1])
+    _insert([
+        TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts[:settings.TIMELINE_BACKFILL]
+    ])
+    if len(posts) > settings.TIMELINE_BACKFILL:
+        Follow.objects.filter(user_id=user_id, author_id=author_id).update(
+            timeline_horizon=posts[-1][1])
+
+
+def refresh(author_ids):
+    """Заново разложить посты ``author_ids`` по лентам подписчиков.
+
+    Итог для каждой подписки на этих авторов тот же, что у ``rebuild``:
+    в ленте последние ``TIMELINE_BACKFILL`` постов автора, остальные
+    читаются при чтении по ``timeline_horizon``. Запускать после
+    пересчёта счётчиков: по ним видно популярных авторов.
+    """
+    popular = set(UserStats.objects.filter(
+        user_id__in=author_ids,
+        followers_count__gte=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True))
+    for author_id in author_ids:
+        posts = list(Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id',
+        ).values_list('id', 'pub_date')[:settings.TIMELINE_BACKFILL + 1])
+        horizon = (
+            posts[-1][1] if len(posts) > settings.TIMELINE_BACKFILL
+            else None)
+        Follow.objects.filter(author_id=author_id).update(
+            timeline_horizon=horizon)
+        stale = TimelineEntry.objects.filter(post__author_id=author_id)
+        if author_id in popular:
+            stale.delete()
+            continue
+        if horizon is not None:
+            stale.filter(pub_date__lte=horizon).delete()
+        followers = Follow.objects.filter(
+            author_id=author_id, user__isnull=False,
+        ).values_list('user_id', flat=True)
+        batch = []
+        for user_id in followers.iterator():
+            batch.extend(
+                TimelineEntry(user_id=user_id, post_id=post_id,
+                              pub_date=pub_date)
+                for post_id, pub_date in posts[:settings.TIMELINE_BACKFILL])
+            if len(batch) >= BATCH_SIZE:
+                _insert(batch)
+                batch = []
+        _insert(batch)
+
+
+def trim(user_id, author_id):
+    """Убрать посты автора из ленты после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+class FollowFeedPaginator(CursorPaginator):
+    """Курсорные страницы ленты подписок ``user``."""
+
+    # Поля ключа ленты в ``TimelineEntry``.
+    OWN_FIELDS = {
+        'pub_date': 'timeline_entries__pub_date',
+        'id': 'timeline_entries__post_id',
+    }
+
+    def __init__(self, user, per_page):
+        # Миниатюры загружаются один раз для готовой страницы, а не для
+        # каждого источника.
+        super().__init__(
+            Post.objects.for_feed().prefetch_related(None), per_page)
+        self.user = user
+
+    @cached_property
+    def pulled(self):
+        """Авторы, чьи посты читаются при чтении: ``[(id, граница)]``.
+
+        Граница ``None`` — все посты автора, иначе посты не новее её.
+        """
+        follows = Follow.objects.filter(
+            Q(author__stats__followers_count__gte=(
+                settings.TIMELINE_FANOUT_LIMIT))
+            | Q(timeline_horizon__isnull=False),
+            user=self.user,
+        ).values_list(
+            'author_id', 'timeline_horizon', 'author__stats__followers_count')
+        return [
+            (author_id, None
+             if (followers or 0) >= settings.TIMELINE_FANOUT_LIMIT
+             else horizon)
+            for author_id, horizon, followers in follows
+        ]
+
+    def _own(self, ordering, values, limit):
+        own_ordering = tuple(
+            name[:-len(name.lstrip('-'))] + self.OWN_FIELDS[name.lstrip('-')]
+            for name in ordering
+        )
+        # Условия в одном ``filter``: одно соединение с TimelineEntry.
+        condition = Q(timeline_entries__user=self.user)
+        if values is not None:
+            condition &= self._after(values, own_ordering)
+        # F, а не имя поля: по имени связи ``order_by`` взял бы порядок
+        # из Meta поста.
+        order = [
+            F(name.lstrip('-')).desc() if name.startswith('-')
+            else F(name).asc()
+            for name in own_ordering
+        ]
+        return list(self.object_list.filter(condition).order_by(
+            *order)[:limit])
+
+    def _pulled_posts(self, ordering, values, limit, edge):
+        """Посты всех подтягиваемых авторов одним запросом."""
+        descending = ordering[0].startswith('-')
+        whole, bounded = [], Q()
+        for author_id, horizon in self.pulled:
+            if horizon is None:
+                whole.append(author_id)
+            elif descending and edge is not None and horizon < edge:
+                # Все эти посты старше прочитанных из ленты: на страницу
+                # они не попадут.
+                continue
+            else:
+                bounded |= Q(author_id=author_id, pub_date__lte=horizon)
+        condition = bounded
+        if whole:
+            condition |= Q(author_id__in=whole)
+        if not condition:
+            return []
+        posts = self.object_list.filter(condition)
+        if values is not None:
+            posts = posts.filter(self._after(values, ordering))
+        return list(posts.order_by(*ordering)[:limit])
+
+    def _fetch(self, ordering, values=None, offset=0):
+        limit = offset + self.per_page + 1
+        descending = ordering[0].startswith('-')
+        own = self._own(ordering, values, limit)
+        edge = own[-1].pub_date if len(own) == limit else None
+        streams = [own, self._pulled_posts(ordering, values, limit, edge)]
+        merged = heapq.merge(*streams, key=self._key, reverse=descending)
+        items = list(islice(self._unique(merged), offset, limit))
+        page = items[:self.per_page]
+        prefetch_related_objects(page, 'thumbnails')
+        return page, len(items) > self.per_page
+
+    @staticmethod
+    def _unique(posts):
+        # Пост может прийти из двух источников: например, автор стал
+        # популярным, а старые посты остались в ленте.
+        last = None
+        for post in posts:
+            if post.pk != last:
+                last = post.pk
+                yield post
+
+
+def follow_page(request, per_page):
+    """Страница ленты подписок по параметрам ``cursor`` и ``page``."""
+    paginator = FollowFeedPaginator(request.user, per_page)
+    return paginator.get_page(
+        request.GET.get('page'), request.GET.get('cursor'))
+
+
+def _window_functions():
+    # Django 2.2 не отмечает их у SQLite, хотя они есть с 3.25.
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 25)
+    return connection.features.supports_over_clause
+
+
+def rebuild():
+    """Заново заполнить все ленты по текущим подпискам.
+
+    Итог тот же, что у ``backfill`` для каждой подписки, но одним
+    запросом: последние ``TIMELINE_BACKFILL`` постов каждого автора
+    нумеруются оконной функцией. Без неё — по подписке за раз: на каждую
+    три запроса. Границы ``timeline_horizon`` считает один ``UPDATE``.
+    """
+    TimelineEntry.objects.all().delete()
+    Follow.objects.update(timeline_horizon=Subquery(
+        Post.objects.filter(author_id=OuterRef('author_id')).order_by(
+            '-pub_date', '-id',
+        ).values('pub_date')[
+            settings.TIMELINE_BACKFILL:settings.TIMELINE_BACKFILL + 1]))
+    if not _window_functions():
+        follows = Follow.objects.values_list('user_id', 'author_id')
+        for user_id, author_id in follows.iterator():
+            backfill(user_id, author_id)
+        return
+    entry, follow, post, stats = (
+        connection.ops.quote_name(model._meta.db_table)
+        for model in (TimelineEntry, Follow, Post, UserStats)
+    )
+    # Вставка в порядке уникального индекса (user, post) идёт в конец
+    # B-дерева, а не вразброс.
+    sql = f"""
+        INSERT INTO {entry} (user_id, post_id, pub_date)
+        SELECT follow.user_id, recent.id, recent.pub_date
+        FROM {follow} follow JOIN (
+            SELECT id, author_id, pub_date, ROW_NUMBER() OVER (
+                PARTITION BY author_id ORDER BY pub_date DESC, id DESC
+            ) AS place
+            FROM {post}
+        ) recent ON recent.author_id = follow.author_id
+        WHERE follow.user_id IS NOT NULL AND recent.place <= %s
+            AND follow.author_id NOT IN (
+                SELECT user_id FROM {stats} WHERE followers_count >= %s)
+        ORDER BY follow.user_id, recent.id
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [
+            settings.TIMELINE_BACKFILL, settings.TIMELINE_FANOUT_LIMIT,
+        ])
@@ -0,0 +1,163 @@
+"""Потоковая загрузка картинок постов.
+
+``ImageUploadHandler`` пишет загружаемый файл частями во временный файл
+на диске, а по первым килобайтам проверяет формат и размер картинки в
+пикселях, не декодируя её. Отвергнутый файл дальше не записывается,
+форма показывает причину отказа. ``reencode`` пережимает принятую
+картинку до ``POST_IMAGE_MAX_SIDE`` точек в ``POST_IMAGE_FORMAT``.
+
+Обработчик ставят только view с картинками (``image_uploads``, для API —
+``api_view(upload_handlers=...)``); остальные запросы, включая админку,
+принимают файлы обработчиками Django по умолчанию.
+"""
+import io
+import os
+from functools import wraps
+from threading import BoundedSemaphore, Lock
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+# Заголовка такого размера хватает, чтобы Pillow определил формат и
+# размеры даже у JPEG с большим блоком EXIF.
+HEADER_LIMIT = 256 * 1024
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp', 'PNG': '.png'}
+
+_reencode_slots = None
+_reencode_slots_lock = Lock()
+
+
+class NeedMoreData(Exception):
+    """Заголовок картинки пришёл не целиком."""
+
+
+def inspect_header(header, complete=False):
+    """Вернуть текст ошибки для заголовка картинки или ``None``."""
+    try:
+        with Image.open(io.BytesIO(header)) as image:
+            image_format, (width, height) = image.format, image.size
+    except Image.DecompressionBombError:
+        return 'Картинка слишком большая.'
+    except Exception:
+        if not complete and len(header) < HEADER_LIMIT:
+            raise NeedMoreData
+        return 'Загрузите правильное изображение.'
+    if image_format not in ALLOWED_FORMATS:
+        return 'Формат изображения не поддерживается.'
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        return (
+            f'Картинка {width}×{height} слишком большая: не больше '
+            f'{settings.POST_IMAGE_MAX_PIXELS} точек.'
+        )
+    return None
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет файл на диск по частям, проверяя заголовок картинки."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.header = bytearray()
+        self.checked = False
+        self.error = None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.error = 'Файл слишком большой.'
+            return None
+        if not self.checked:
+            self.header += raw_data[:HEADER_LIMIT - len(self.header)]
+            self.check_header(complete=False)
+            if self.error:
+                return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def check_header(self, complete):
+        try:
+            self.error = inspect_header(bytes(self.header), complete)
+        except NeedMoreData:
+            return
+        self.checked = True
+
+    def file_complete(self, file_size):
+        # Пустой файл отклоняет сама форма с привычным сообщением.
+        if not self.checked and not self.error and self.header:
+            self.check_header(complete=True)
+        upload = super().file_complete(0 if self.error else file_size)
+        upload.upload_error = self.error
+        return upload
+
+
+def image_uploads(view):
+    """Принимать файлы view через ``ImageUploadHandler``.
+
+    Обработчики можно сменить только до чтения ``request.POST``, а его
+    читает проверка CSRF. Поэтому CsrfViewMiddleware view пропускает, а
+    CSRF проверяется здесь, уже после смены обработчиков.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
+
+
+def _get_reencode_slots():
+    global _reencode_slots
+    with _reencode_slots_lock:
+        if _reencode_slots is None:
+            _reencode_slots = BoundedSemaphore(
+                settings.POST_IMAGE_REENCODE_CONCURRENCY)
+        return _reencode_slots
+
+
+def reencode(upload):
+    """Пережать картинку, ограничив её размер и выбрав один формат."""
+    # Декодированная картинка занимает в памяти в разы больше файла,
+    # поэтому одновременно пережимается не больше нескольких картинок.
+    with _get_reencode_slots():
+        return _reencode(upload)
+
+
+def _reencode(upload):
+    image_format = settings.POST_IMAGE_FORMAT
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    upload.seek(0)
+    with Image.open(upload) as image:
+        # Для JPEG Pillow сразу декодирует уменьшенную копию.
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side))
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        name = os.path.splitext(os.path.basename(upload.name))[0]
+        result = TemporaryUploadedFile(
+            name + EXTENSIONS.get(image_format, '.img'),
+            Image.MIME.get(image_format, 'application/octet-stream'),
+            0,
+            None,
+        )
+        image.save(
+            result, image_format,
+            quality=settings.POST_IMAGE_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+    result.size = result.tell()
+    result.seek(0)
+    return result
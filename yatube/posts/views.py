@@ -1,71 +1,110 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import transaction
+from core.db import pin_to_primary
+from core.paginator import CursorPaginator, get_cursor_page
+from core.ratelimit import ratelimit
+from . import comment_queue, feed_cache, suggestions
+from . import search as post_search
+from .conditional import (
+    comments_etag, conditional, get_group, get_pending, get_post,
+    get_profile, get_suggested, group_etag, index_etag, popular_groups_etag,
+    post_etag, post_last_modified, profile_etag, trending_etag,
+)
+from .counters import user_stats
+from .timeline import follow_page
 from .forms import PostForm, CommentForm
 from .models import Post, Group, User, Follow
+from .uploads import image_uploads
 
 pagi = 10
 
 
+@conditional(index_etag)
 def index(request):
     """Главная страница."""
-    post_list = Post.objects.all().order_by('-pub_date')
-    paginator = Paginator(post_list, pagi)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = get_cursor_page(request, Post.objects.for_feed(), pagi)
     context = {
         'page_obj': page_obj,
+        **feed_cache.cache_context(request, 'index', [feed_cache.INDEX]),
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional(group_etag)
 def group_posts(request, slug):
     """Посты в группе."""
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, pagi)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group = get_group(request, slug)
+    page_obj = get_cursor_page(request, group.posts.for_feed(), pagi)
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache.cache_context(
+            request, 'group', [feed_cache.group_scope(group.pk)], group.pk),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional(trending_etag)
+def trending(request):
+    """Популярные посты: места считает posts.rankings."""
+    posts = Post.objects.for_feed().filter(
+        rank__place__isnull=False).order_by('rank__place')
+    context = {
+        'posts': posts,
+        **feed_cache.cache_context(
+            request, 'trending', [feed_cache.RANKINGS, feed_cache.INDEX]),
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+@conditional(popular_groups_etag)
+def popular_groups(request):
+    """Самые активные группы."""
+    groups = Group.objects.filter(
+        rank__place__isnull=False).order_by('rank__place')
+    context = {
+        'groups': groups,
+        **feed_cache.cache_context(
+            request, 'groups', [feed_cache.RANKINGS]),
+    }
+    return render(request, 'posts/popular_groups.html', context)
+
+
+@conditional(profile_etag)
 def profile(request, username):
     """Посты пользователя."""
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    posts_count = author.posts.count()
-    paginator = Paginator(posts, pagi)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    following = (request.user.is_authenticated
-                 and Follow.objects.filter(
-                     user=request.user,
-                     author=author).exists()
-                 )
+    author, stats, following = get_profile(request, username)
+    page_obj = get_cursor_page(request, author.posts.for_feed(), pagi)
     context = {
         'author': author,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'followers_count': stats.followers_count,
+        'following_count': stats.following_count,
         'page_obj': page_obj,
         'following': following,
+        'suggestions': suggestions.suggested_users(
+            request.user, get_suggested(request)),
+        **feed_cache.cache_context(
+            request, 'profile', [feed_cache.author_scope(author.pk)],
+            author.pk),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional(post_etag)
 def post_detail(request, post_id):
     """Открыть пост."""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_post(request, post_id)
     group = post.group
-    author = post.author
-    posts_count = author.posts.count()
-    comments = post.comments.all()
+    posts_count = user_stats(post.author).posts_count
     form = CommentForm(request.POST or None)
     context = {
         'post': post,
-        'comments': comments,
+        'comments': comment_page(post, request.GET.get('comments')),
+        'pending_comments': get_pending(request, post),
         'group': group,
         'form': form,
         'posts_count': posts_count,
@@ -73,7 +112,50 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def comment_page(post, cursor):
+    """Страница комментариев от старых к новым по курсору ``(created, id)``.
+
+    Страница поста показывает только первую; следующие подгружаются
+    фрагментами ``post_comments``, так что даже у поста с десятками
+    тысяч комментариев страница остаётся небольшой.
+    """
+    # ``post`` не откладывается: менеджер связи проставляет его каждому
+    # комментарию, и отложенное поле стоило бы запроса на строку.
+    comments = post.comments.select_related('author').only(
+        'post', 'text', 'created', 'author__username')
+    paginator = CursorPaginator(
+        comments, settings.POST_COMMENTS_PER_PAGE,
+        ordering=('created', 'id'))
+    return paginator.get_page(cursor=cursor)
+
+
+@conditional(comments_etag, post_last_modified)
+def post_comments(request, post_id):
+    """Следующая страница комментариев — фрагмент HTML."""
+    post = get_post(request, post_id)
+    context = {
+        'post': post,
+        'comments': comment_page(post, request.GET.get('cursor')),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+def search(request):
+    """Поиск по текстам постов."""
+    query = request.GET.get('q', '').strip()
+    results = post_search.search(query)
+    page_obj = Paginator(results, pagi).get_page(request.GET.get('page'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@image_uploads
 @login_required
+@ratelimit('post')
+@transaction.atomic
 def post_create(request):
     """Создание нового поста."""
     form = PostForm(
@@ -95,12 +177,14 @@ def post_create(request):
     return render(request, 'posts/create_post.html', context)
 
 
+@image_uploads
 @login_required
+@ratelimit('post')
 def post_edit(request, post_id):
     """Редактирование поста."""
     post = get_object_or_404(Post, id=post_id)
     # Если текущий пользователь не автор - ничего не делается
-    if post.author != request.user:
+    if post.author_id != request.user.pk:
         return redirect('posts:post_detail', post.id)
 
     form = PostForm(
@@ -124,6 +208,8 @@ def post_edit(request, post_id):
 
 
 @login_required
+@ratelimit('comment')
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -131,25 +217,32 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        if settings.COMMENT_WRITE_BEHIND:
+            comment_queue.enqueue(comment)
+        else:
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__following__user=request.user)
-    paginator = Paginator(posts, pagi)
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
+    page_obj = follow_page(request, pagi)
     context = {
-        'posts': posts,
         'page_obj': page_obj,
+        'suggestions': suggestions.suggested_users(
+            request.user, suggestions.suggested_ids(request.user)),
+        **feed_cache.cache_context(
+            request, 'follow',
+            [feed_cache.follow_scope(request.user.pk), feed_cache.INDEX],
+            per_user=True),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@ratelimit('follow', methods=None)
+@pin_to_primary
+@transaction.atomic
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
@@ -162,6 +255,9 @@ def profile_follow(request, username):
 
 
 @login_required
+@ratelimit('follow', methods=None)
+@pin_to_primary
+@transaction.atomic
 def profile_unfollow(request, username):
     get_object_or_404(
         Follow, user=request.user, author__username=username).delete()
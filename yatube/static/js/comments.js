@@ -0,0 +1,12 @@
+// «Показать ещё» подгружает следующую страницу комментариев фрагментом;
+// без JavaScript ссылка открывает её на странице поста.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('[data-comments-more]');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.dataset.commentsMore)
+    .then(function (response) { return response.text(); })
+    .then(function (html) { link.outerHTML = html; });
+});
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from .env import caches_from_env, databases_from_env, env_bool, env_int
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -23,7 +25,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = '0b%3#b84kk+y#dm$rs$4$&b5f%!^1y*1jqruunq@pkucsbgo=3'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = env_bool('DEBUG', True)
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -39,6 +41,7 @@ INSTALLED_APPS = [
     'about.apps.AboutConfig',
     'posts.apps.PostsConfig',
     'core.apps.CoreConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -50,7 +53,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.performance.PerformanceMiddleware',
+    'core.querywatch.QueryWatchMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.static.StaticFilesMiddleware',
+    'django.middleware.gzip.GZipMiddleware',
+    'core.db.PrimaryPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,12 +72,27 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 ROOT_URLCONF = 'yatube.urls'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Без DEBUG шаблоны разбираются один раз на процесс (кеширующий
+# загрузчик) и заранее, при запуске приложения (core/templating.py).
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
+# Разобрать все шаблоны при запуске веб-сервера (yatube/wsgi.py).
+TEMPLATES_PRELOAD = env_bool('TEMPLATES_PRELOAD', not DEBUG)
+# Время отрисовки {% include %} и миниатюр по местам в шаблонах; отчёт —
+# команда profile_templates.
+TEMPLATE_PROFILING = env_bool('TEMPLATE_PROFILING', False)
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -87,12 +110,13 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
-}
+# Основная база, реплики и постоянные соединения задаются переменными
+# окружения (см. yatube/env.py). По умолчанию — SQLite без реплик.
+DATABASES = databases_from_env('sqlite:///db.sqlite3', BASE_DIR)
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['core.db.PrimaryReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной базы.
+DATABASE_REPLICA_PIN_SECONDS = env_int('DATABASE_REPLICA_PIN_SECONDS', 5)
 
 
 # Password validation
@@ -132,14 +156,102 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+# Без DEBUG collectstatic добавляет к именам файлов хеш содержимого и
+# кладёт рядом сжатые копии (core/storage.py). Без nginx собранную
+# статику отдаёт core.static.StaticFilesMiddleware: файлы с хешем
+# кешируются на год, прочие — на STATIC_MAX_AGE секунд.
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+if not DEBUG:
+    STATICFILES_STORAGE = 'core.storage.CompressedManifestStaticFilesStorage'
+STATIC_SERVE = env_bool('STATIC_SERVE', not DEBUG)
+STATIC_MAX_AGE = 60 * 60
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+# По умолчанию кеш свой у каждого процесса. При нескольких процессах
+# gunicorn задайте общий: CACHE_URL=file:///var/tmp/yatube или
+# memcached://, redis:// (см. yatube/env.py).
+CACHES = caches_from_env('locmem://', BASE_DIR)
+
+# Замеры запросов (core/performance.py): заголовок Server-Timing для
+# сотрудников и гистограммы по представлениям в /admin/performance/.
+PERFORMANCE_MONITORING = env_bool('PERFORMANCE_MONITORING', False)
+# Как часто процесс публикует свои гистограммы в общий кеш.
+PERFORMANCE_PUBLISH_SECONDS = 10
+
+# Поиск медленных и повторяющихся запросов (core/querywatch.py): на
+# тестовом стенде проблемы пишутся в лог core.querywatch.
+QUERYWATCH = env_bool('QUERYWATCH', False)
+QUERYWATCH_SLOW_MS = env_int('QUERYWATCH_SLOW_MS', 100)
+# Со скольких одинаковых запросов за запрос к сайту это проблема.
+QUERYWATCH_DUPLICATES = 2
+
+# Фрагменты лент сбрасываются сменой версии при записи, поэтому живут долго.
+FEED_CACHE_TIMEOUT = 60 * 60
+
+# Комментарии на странице поста; следующие подгружаются по кнопке.
+POST_COMMENTS_PER_PAGE = 20
+
+# Ограничение частоты записей (core/ratelimit.py): ведро токенов на
+# пользователя и на IP-адрес, общее для процессов через кеш. Значения —
+# (токенов в минуту, ёмкость ведра).
+RATE_LIMITS_ENABLED = env_bool('RATE_LIMITS', not DEBUG)
+RATE_LIMITS = {
+    'comment': {'user': (10, 5), 'ip': (60, 30)},
+    'follow': {'user': (30, 20), 'ip': (120, 60)},
+    'post': {'user': (6, 5), 'ip': (30, 15)},
 }
+# Сколько доверенных прокси (nginx) стоит перед сайтом: адрес клиента
+# для лимитов берётся из X-Forwarded-For.
+RATE_LIMIT_PROXIES = env_int('RATE_LIMIT_PROXIES', 0)
+
+# Отложенная запись комментариев пачками (posts/comment_queue.py).
+COMMENT_WRITE_BEHIND = env_bool('COMMENT_WRITE_BEHIND', False)
+COMMENT_FLUSH_SECONDS = 1.0
+COMMENT_FLUSH_SIZE = 200
+
+# Рейтинги «Популярное» и «Популярные группы» (posts/rankings.py):
+# активность затухает вдвое за TRENDING_HALF_LIFE часов, подписчики
+# автора увеличивают оценку поста. Пересчитывает команда
+# refresh_rankings — например, раз в минуту из cron.
+TRENDING_HALF_LIFE = 6
+TRENDING_FOLLOWER_WEIGHT = 0.5
+TRENDING_SIZE = 20
+POPULAR_GROUPS_SIZE = 20
+
+# Лента подписок: авторы с таким числом подписчиков не раздают посты
+# при записи, их посты подмешиваются при чтении ленты.
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора попадает в ленту при подписке.
+TIMELINE_BACKFILL = 200
+
+# «Кого почитать» (posts/suggestions.py): подсказки считает команда
+# build_suggestions, например раз в сутки; граф подписок при этом
+# занимает не больше SUGGESTIONS_MEMORY_MB мегабайт.
+SUGGESTIONS_MEMORY_MB = env_int('SUGGESTIONS_MEMORY_MB', 256)
+SUGGESTIONS_SHOWN = 5
+SUGGESTIONS_TIMEOUT = 2 * 24 * 60 * 60
+
+# Миниатюры картинок постов готовятся при сохранении формы в фоновых
+# потоках; при 0 потоков — сразу после фиксации транзакции.
+POST_THUMBNAIL_GEOMETRIES = ('960x339', '960x520')
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+POST_THUMBNAIL_WORKERS = 2
+
+# Загрузка картинок постов (posts/uploads.py): файл пишется на диск по
+# частям, заголовок проверяется до декодирования, принятая картинка
+# пережимается. Обработчик ставят сами view с картинками.
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+POST_IMAGE_MAX_SIDE = 1920
+POST_IMAGE_FORMAT = 'JPEG'
+POST_IMAGE_QUALITY = 85
+POST_IMAGE_REENCODE_CONCURRENCY = 2
+
+# API (api/http.py): проверенный пароль Basic-аутентификации помнится
+# столько секунд, чтобы не считать PBKDF2 на каждый запрос. Смена
+# пароля сбрасывает запомненное сразу.
+API_BASIC_AUTH_CACHE_TIMEOUT = 60
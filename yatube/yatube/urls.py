@@ -18,12 +18,16 @@ from django.urls import include, path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import performance
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    path('admin/performance/', performance, name='performance'),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/v1/', include('api.urls', namespace='api')),
 ]
 
 handler404 = "core.views.page_not_found"